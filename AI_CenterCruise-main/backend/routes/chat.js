@@ -27,6 +27,11 @@ router.post("/", async (req, res) => {
 
     const data = await response.json();
 
+    // This message was answered together with a later one of the same chat
+    if (response.headers.get("X-Turn-Coalesced") === "1") {
+      return res.json({ reply: null, coalesced: true });
+    }
+
     // --- FIX: твой API возвращает массив сообщений ---
     let reply = "AI returned empty response";
 
@@ -530,7 +530,10 @@ function assignField(obj, field, value) {
 
         const data = await response.json();
         typingMsg.remove();
-        addMessage(data.reply || "Empty response", "bot");
+        // ответ придёт вместе со следующим сообщением
+        if (!data.coalesced) {
+          addMessage(data.reply || "Empty response", "bot");
+        }
 
       } catch (error) {
         typingMsg.remove();
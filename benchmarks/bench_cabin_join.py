@@ -0,0 +1,123 @@
+"""
+Benchmark the cabin/price join used when parsing batch-data records.
+
+Compares the previous per-price scan of cabinCategories against the indexed
+hash join over src.util.cruise_utils used by find_cruise_info; both sides do the
+same work (EUR prices joined to their category). By default it runs on synthetic
+records sized like the largest ships we sell (LARGEST_VESSELS: Icon, Wonder and
+Utopia of the Seas, 106-128 cabin categories, prices in 3 currencies for every
+category), pass --cruise-id to benchmark real batch-data payloads instead.
+
+Usage:
+    python -m benchmarks.bench_cabin_join
+    python -m benchmarks.bench_cabin_join --cruise-id 1249652 --cruise-id 1250001
+"""
+import argparse
+import os
+import timeit
+
+import requests
+
+from src.util.cruise_utils import EUR_CURRENCY_ID, index_cabin_categories, index_prices_by_currency
+
+# Cabin categories of the largest vessels in the catalog
+LARGEST_VESSELS = {
+    "Icon of the Seas": 128,
+    "Wonder of the Seas": 112,
+    "Utopia of the Seas": 106,
+}
+CURRENCIES = (1, 2, 3)
+
+
+def synthetic_record(categories_count: int) -> dict:
+    categories = [
+        {"category": {"cabin_category_id": i, "description": f"Category {i} " * 20}}
+        for i in range(categories_count)
+    ]
+    prices = [
+        {
+            "cabin_category_id": i,
+            "currency_id": currency,
+            "cruise_date_range_id": 1,
+            "location": "outside",
+            "price_value": 1000 + i,
+        }
+        for i in range(categories_count)
+        for currency in CURRENCIES
+    ]
+    return {
+        "cruiseDateRangeId": 1,
+        "ufl": "synthetic",
+        "cruiseInfoJson": {"cruise": {"cruise_id": 1, "name": "Synthetic"}, "itineraries": []},
+        "cruiseDateRangeInfoJson": {
+            "dateRange": {"begin_date": "2099-01-01"},
+            "minPrice": {"2": 1000},
+            "minPriceInfo": prices,
+        },
+        "vesselInfoJson": {"vessel": {"name": "Synthetic"}, "cabinCategories": categories},
+    }
+
+
+def fetch_records(cruise_ids: list[str]) -> dict:
+    base_url = os.getenv("CRUISE_API_BASE_URL", "https://center.cruises")
+    query = "&".join(f"cruiseId[]={cruise_id}" for cruise_id in cruise_ids)
+    response = requests.get(f"{base_url}/en/api/chatbot/cruises/batch-data?{query}")
+    response.raise_for_status()
+    records = {}
+    for record in response.json().get("data") or []:
+        vessel = record.get("vesselInfoJson", {}).get("vessel", {}).get("name", "unknown")
+        records.setdefault(vessel, record)
+    return records
+
+
+def baseline_cabin_join(record: dict) -> list:
+    """The pre-index implementation: scan every category for every price row."""
+    range_info = record["cruiseDateRangeInfoJson"]
+    cabins_info = record["vesselInfoJson"]["cabinCategories"]
+    cabin_prices = [item for item in range_info["minPriceInfo"] if item.get("currency_id") == EUR_CURRENCY_ID]
+    result = []
+    for c in cabin_prices:
+        id = c.get("cabin_category_id")
+        cabin_info = [info for info in cabins_info if info.get("category", {}).get("cabin_category_id") == id]
+        result.append({"cabin_id": id, "price": c.get("price_value"), "description": cabin_info[0]["category"]["description"]})
+    return result
+
+
+def indexed_cabin_join(record: dict) -> list:
+    """The join of find_cruise_info: hash lookups in the cruise_utils indexes."""
+    range_info = record["cruiseDateRangeInfoJson"]
+    categories_by_id = index_cabin_categories(record["vesselInfoJson"]["cabinCategories"])
+    cabin_prices = index_prices_by_currency(range_info["minPriceInfo"]).get(EUR_CURRENCY_ID, [])
+    result = []
+    for c in cabin_prices:
+        id = c.get("cabin_category_id")
+        description = categories_by_id[id]["description"]
+        result.append({"cabin_id": id, "price": c.get("price_value"), "description": description})
+    return result
+
+
+def run(records: dict, number: int) -> None:
+    print(f"{'vessel':<24}{'categories':>11}{'prices':>8}{'baseline ms':>13}{'indexed ms':>12}{'speedup':>9}")
+    for vessel, record in records.items():
+        categories = len(record["vesselInfoJson"]["cabinCategories"])
+        prices = len(record["cruiseDateRangeInfoJson"]["minPriceInfo"])
+        baseline = timeit.timeit(lambda: baseline_cabin_join(record), number=number) / number
+        indexed = timeit.timeit(lambda: indexed_cabin_join(record), number=number) / number
+        print(f"{vessel:<24}{categories:>11}{prices:>8}{baseline * 1000:>13.3f}{indexed * 1000:>12.3f}{baseline / indexed:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cruise-id", action="append", default=[], help="benchmark a real cruise payload")
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    if args.cruise_id:
+        records = fetch_records(args.cruise_id)
+    else:
+        records = {vessel: synthetic_record(count) for vessel, count in LARGEST_VESSELS.items()}
+    run(records, args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure the cold import time of the API process with `python -X importtime`.
+
+Every run imports the module in a fresh interpreter, the fastest run is reported
+(total, slowest top-level packages by self time, slowest modules by cumulative
+time). src.api must stay under API_IMPORT_BUDGET_MS, checked here rather than in the
+unit tests because wall-clock times are noisy on shared CI runners; that heavy
+dependencies are left to the startup warm-up is checked by
+tests/unit/test_import_budget.py.
+
+Usage:
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --module src.ai_agent --runs 5 --top 20
+    python -m benchmarks.bench_import_time --budget-ms 1000
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+from typing import List, NamedTuple
+
+# Cold import budget for src.api, it takes ~0.3s on a developer laptop
+API_IMPORT_BUDGET_MS = 1000
+
+# Imported by the warm-up, never by `import src.api`
+HEAVY_MODULES = (
+    "langchain", "langchain_core", "langchain_openai", "langgraph", "openai", "numpy", "psycopg", "psycopg2", "bs4"
+)
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class ImportRow(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure_import(module: str) -> List[ImportRow]:
+    """Import module in a fresh interpreter and return its -X importtime rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append(ImportRow(match[4], int(match[1]), int(match[2]), len(match[3]) // 2))
+    return rows
+
+
+def total_ms(rows: List[ImportRow]) -> float:
+    return sum(row.self_us for row in rows) / 1000
+
+
+def imported_packages(rows: List[ImportRow]) -> set:
+    return {row.module.split(".")[0] for row in rows}
+
+
+def print_report(module: str, rows: List[ImportRow], top: int) -> None:
+    print(f"import {module}: {total_ms(rows):.1f}ms, {len(rows)} modules")
+
+    packages = Counter()
+    for row in rows:
+        packages[row.module.split(".")[0]] += row.self_us
+    print("\nSlowest packages (self time):")
+    for package, self_us in packages.most_common(top):
+        print(f"  {self_us / 1000:8.1f}ms  {package}")
+
+    print("\nSlowest modules (cumulative):")
+    for row in sorted(rows, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"  {row.cumulative_us / 1000:8.1f}ms  {'  ' * row.depth}{row.module}")
+
+    heavy = sorted(imported_packages(rows) & set(HEAVY_MODULES))
+    print(f"\nHeavy dependencies imported: {', '.join(heavy) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.api", help="module to import")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters, the fastest one is reported")
+    parser.add_argument("--top", type=int, default=15, help="rows per section")
+    parser.add_argument("--budget-ms", type=float,
+                        help=f"exit with an error above this import time (src.api: {API_IMPORT_BUDGET_MS}ms)")
+    args = parser.parse_args()
+
+    rows = min((measure_import(args.module) for _ in range(args.runs)), key=total_ms)
+    print_report(args.module, rows, args.top)
+
+    budget_ms = args.budget_ms
+    if budget_ms is None and args.module == "src.api":
+        budget_ms = API_IMPORT_BUDGET_MS
+    if budget_ms is not None and total_ms(rows) > budget_ms:
+        raise SystemExit(f"\nimport {args.module} took {total_ms(rows):.1f}ms, budget is {budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Replay real conversations from messages_history against a running /ask.
+
+extract reads the user messages of recent threads from the messages_history table (written by
+MessageHistoryManager, POSTGRES_DB_URL) or from an export of it (CSV with a header or JSON lines,
+columns msg_type, thread_id, message, created_at), anonymises them (thread ids, emails, phone and
+card numbers, names) and writes one conversation per line with the time offsets of its turns.
+
+run replays that file: conversations start at their recorded offsets and send their turns with the
+recorded think time, both divided by --speedup (0 sends everything as fast as possible), at most
+--concurrency conversations at a time. Every conversation gets a fresh chat id and its own JWT
+(minted with JWT_SECRET, or --token for all of them). The report has throughput, latency
+percentiles and error rates per conversation step.
+
+serve starts the API with a stubbed LLM (a tool call for search turns, then a canned answer, with
+--llm-latency per call) and/or stubbed upstreams (empty results after --upstream-latency), so the
+replay measures this service and not OpenAI or center.cruises. For real payloads run it with
+UPSTREAM_MODE=replay instead of --stub-upstreams (see src.util.upstream_fixtures).
+
+Usage:
+    python -m benchmarks.replay extract --days 7 --limit 500 --out data/replay/conversations.jsonl
+    python -m benchmarks.replay extract --input messages_history.csv --out data/replay/conversations.jsonl
+    python -m benchmarks.replay serve --stub-llm --stub-upstreams --port 8000
+    UPSTREAM_MODE=replay python -m benchmarks.replay serve --stub-llm --port 8000
+    python -m benchmarks.replay run data/replay/conversations.jsonl --url http://localhost:8000 \\
+        --concurrency 20 --speedup 10
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+HUMAN = 1
+
+EXTRACT_SQL = """
+SELECT msg_type, thread_id, message, created_at FROM messages_history
+WHERE created_at >= now() - make_interval(days => %s)
+ORDER BY thread_id, created_at
+"""
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_CARD = re.compile(r"\b(?:\d[ -]?){12,18}\d\b")
+_PHONE = re.compile(r"(?<![\w-])\+?\d[\d\s().-]{7,}\d\b")
+_NAME = re.compile(
+    r"((?i:my name is|this is|меня зовут|мене звати)\s+)"
+    r"([A-ZА-ЯЁІЇЄҐ][\w'-]+)(\s+[A-ZА-ЯЁІЇЄҐ][\w'-]+)?"
+)
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def anonymise(text: str) -> str:
+    """Replace emails, card and phone numbers and self-introduced names with placeholders."""
+    text = _EMAIL.sub("user@example.com", text)
+    text = _CARD.sub("0000 0000 0000 0000", text)
+    # Dates and the card placeholder look like phone numbers too
+    text = _PHONE.sub(
+        lambda m: m.group(0) if _DATE.match(m.group(0)) or not m.group(0).strip("0 ") else "+000 000 0000", text
+    )
+    return _NAME.sub(lambda m: m.group(1) + "Alex", text)
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def read_rows(path: str) -> Iterable[dict]:
+    """Rows of a messages_history export, CSV with a header or JSON lines."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            yield from (json.loads(line) for line in f if line.strip())
+
+
+def query_rows(days: int) -> Iterable[dict]:
+    import psycopg2
+
+    conn = psycopg2.connect(os.getenv("POSTGRES_DB_URL"))
+    try:
+        with conn.cursor(name="replay_extract") as cursor:
+            cursor.execute(EXTRACT_SQL, (days,))
+            for msg_type, thread_id, message, created_at in cursor:
+                yield {"msg_type": msg_type, "thread_id": thread_id, "message": message, "created_at": created_at}
+    finally:
+        conn.close()
+
+
+def build_conversations(rows: Iterable[dict], min_turns: int = 1, limit: Optional[int] = None) -> List[dict]:
+    """Anonymised conversations, one per thread, with turn and start offsets in seconds."""
+    threads: Dict[str, List[tuple]] = defaultdict(list)
+    for row in rows:
+        if int(row["msg_type"]) == HUMAN and row["message"]:
+            threads[str(row["thread_id"])].append((_timestamp(row["created_at"]), row["message"]))
+
+    threads = {thread: sorted(turns) for thread, turns in threads.items() if len(turns) >= min_turns}
+    # Keep the most recent conversations, ordered by start time
+    ordered = sorted(threads.values(), key=lambda turns: turns[0][0])
+    if limit:
+        ordered = ordered[-limit:]
+    if not ordered:
+        return []
+
+    first = ordered[0][0][0]
+    return [
+        {
+            "conversation": f"conv-{index:05d}",
+            "start": round(turns[0][0] - first, 3),
+            "turns": [{"offset": round(at - turns[0][0], 3), "message": anonymise(message)} for at, message in turns],
+        }
+        for index, turns in enumerate(ordered)
+    ]
+
+
+def load_conversations(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class Replay:
+    """Replays conversations against /ask and collects one result per turn."""
+
+    def __init__(self, url: str, concurrency: int = 10, speedup: float = 1.0, token: Optional[str] = None,
+                 timeout: float = 120.0):
+        self.url = url.rstrip("/") + "/ask"
+        self.concurrency = concurrency
+        self.speedup = speedup
+        self.token = token
+        self.timeout = timeout
+        self.run_id = secrets.token_hex(4)
+        self.results: List[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _token(self, conversation: str) -> str:
+        if self.token:
+            return self.token
+        from src.util.jwt_utils import create_jwt_token
+
+        return create_jwt_token(user_id=f"replay-{conversation}")
+
+    def _wait_until(self, started: float, offset: float) -> None:
+        if self.speedup > 0:
+            delay = started + offset / self.speedup - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _conversation(self, conversation: dict, started: float) -> None:
+        self._wait_until(started, conversation.get("start", 0.0))
+        chat_id = f"replay-{self.run_id}-{conversation['conversation']}"
+        headers = {"Authorization": f"Bearer {self._token(conversation['conversation'])}"}
+        begun = time.perf_counter()
+        for step, turn in enumerate(conversation["turns"], start=1):
+            self._wait_until(begun, turn.get("offset", 0.0))
+            sent = time.perf_counter()
+            try:
+                response = self._session().post(
+                    self.url, json={"question": turn["message"], "chat_id": chat_id}, headers=headers,
+                    timeout=self.timeout
+                )
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            result = {"conversation": conversation["conversation"], "step": step, "status": status,
+                      "latency": time.perf_counter() - sent}
+            with self._lock:
+                self.results.append(result)
+
+    def run(self, conversations: List[dict]) -> float:
+        """Replay every conversation, returns the wall time in seconds."""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="replay") as executor:
+            for future in [executor.submit(self._conversation, c, started) for c in conversations]:
+                future.result()
+        return time.perf_counter() - started
+
+
+def render_report(results: List[dict], wall_time: float) -> str:
+    """Throughput, then latency percentiles and error rates per conversation step."""
+    by_step: Dict[object, List[dict]] = defaultdict(list)
+    for result in results:
+        by_step[result["step"]].append(result)
+    by_step["all"] = results
+
+    lines = [
+        f"{len(results)} turns in {wall_time:.1f}s, {len(results) / max(wall_time, 1e-9):.2f} turns/s",
+        f"{'step':>5} {'turns':>6} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} {'max':>7} {'errors':>7} {'shed':>6}",
+    ]
+    for step, step_results in sorted(by_step.items(), key=lambda item: (item[0] == "all", str(item[0]).zfill(5))):
+        latencies = [r["latency"] for r in step_results]
+        errors = sum(1 for r in step_results if r["status"] != 200)
+        shed = sum(1 for r in step_results if r["status"] == 429)
+        lines.append(
+            f"{step:>5} {len(step_results):>6} " + " ".join(
+                f"{percentile(latencies, q):>6.2f}s" for q in (0.5, 0.9, 0.95, 0.99)
+            ) + f" {max(latencies, default=0):>6.2f}s {errors / max(len(step_results), 1):>7.1%} {shed:>6}"
+        )
+
+    statuses = defaultdict(int)
+    for result in results:
+        statuses[str(result["status"])] += 1
+    lines.append("statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items())))
+    return "\n".join(lines)
+
+
+def _usage(messages, text: str) -> dict:
+    input_tokens = sum(len(str(m.content)) for m in messages) // 4
+    return {"input_tokens": input_tokens, "output_tokens": max(1, len(text) // 4), "total_tokens": input_tokens}
+
+
+def stub_llm(latency: float):
+    """Chat model class standing in for ChatOpenAI: searches on search turns, then answers."""
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    from src.util.model_routing import COMPARISON, SEARCH, classify_step
+
+    class StubChatModel(BaseChatModel):
+        model_name: str = "stub"
+
+        def __init__(self, model: str = "stub", **kwargs):
+            super().__init__(model_name=model, **kwargs)
+
+        @property
+        def _llm_type(self) -> str:
+            return "replay-stub"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            if latency:
+                time.sleep(random.expovariate(1 / latency))
+            if isinstance(messages[-1], HumanMessage) and classify_step(messages) in (SEARCH, COMPARISON):
+                tool_call = {"name": "search_cruises", "args": {}, "id": f"call_{secrets.token_hex(6)}"}
+                message = AIMessage(content="", tool_calls=[tool_call], usage_metadata=_usage(messages, ""))
+            else:
+                text = "Here are a few cruises that match your request."
+                message = AIMessage(content=text, usage_metadata=_usage(messages, text))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    return StubChatModel
+
+
+def stub_upstream_get(latency: float):
+    """requests.get standing in for center.cruises and Google Translate: empty results."""
+
+    def get(url, **kwargs):
+        if latency:
+            time.sleep(random.expovariate(1 / latency))
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        if "translate" in url:
+            text = requests.utils.unquote(url.rsplit("q=", 1)[-1])
+            body = [[[text, text]]]
+        else:
+            body = {"data": []}
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    return get
+
+
+def serve(args) -> None:
+    import uvicorn
+    from unittest.mock import patch
+
+    from src import api
+
+    patches = []
+    if args.stub_llm:
+        patches.append(patch("src.ai_agent.ChatOpenAI", stub_llm(args.llm_latency)))
+    if args.stub_upstreams:
+        patches.append(patch("src.util.upstream.requests.get", stub_upstream_get(args.upstream_latency)))
+    for p in patches:
+        p.start()
+    try:
+        uvicorn.run(api.app, host=args.host, port=args.port)
+    finally:
+        for p in patches:
+            p.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="anonymised conversations from messages_history")
+    extract.add_argument("--input", help="messages_history export (.csv or JSON lines), default: query POSTGRES_DB_URL")
+    extract.add_argument("--days", type=int, default=7, help="threads active in the last N days")
+    extract.add_argument("--limit", type=int, help="keep the N most recent conversations")
+    extract.add_argument("--min-turns", type=int, default=1)
+    extract.add_argument("--out", default="data/replay/conversations.jsonl")
+
+    run = commands.add_parser("run", help="replay conversations against /ask")
+    run.add_argument("conversations")
+    run.add_argument("--url", default="http://localhost:8000")
+    run.add_argument("--concurrency", type=int, default=10, help="conversations in flight")
+    run.add_argument("--speedup", type=float, default=1.0, help="divide recorded delays, 0 for no delays")
+    run.add_argument("--token", help="JWT for every conversation, default: mint one per conversation")
+    run.add_argument("--timeout", type=float, default=120.0)
+    run.add_argument("--results", help="write one JSON line per turn to this file")
+
+    stub = commands.add_parser("serve", help="run the API with stubbed LLM and/or upstreams")
+    stub.add_argument("--stub-llm", action="store_true")
+    stub.add_argument("--stub-upstreams", action="store_true")
+    stub.add_argument("--llm-latency", type=float, default=1.0, help="mean seconds per stubbed LLM call")
+    stub.add_argument("--upstream-latency", type=float, default=0.2, help="mean seconds per stubbed upstream call")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=8000)
+
+    args = parser.parse_args()
+    if args.command == "extract":
+        rows = read_rows(args.input) if args.input else query_rows(args.days)
+        conversations = build_conversations(rows, args.min_turns, args.limit)
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            for conversation in conversations:
+                f.write(json.dumps(conversation, ensure_ascii=False) + "\n")
+        turns = sum(len(c["turns"]) for c in conversations)
+        print(f"Wrote {len(conversations)} conversations ({turns} turns) to {args.out}")
+    elif args.command == "run":
+        conversations = load_conversations(args.conversations)
+        replay = Replay(args.url, args.concurrency, args.speedup, args.token, args.timeout)
+        wall_time = replay.run(conversations)
+        if args.results:
+            with open(args.results, "w", encoding="utf-8") as f:
+                for result in replay.results:
+                    f.write(json.dumps(result) + "\n")
+        print(render_report(replay.results, wall_time))
+    else:
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 #!/bin/bash
 
 # Build Docker image
-docker build -f DockerfileApi -t cruise-ai-agent-api ..
+# BAKE_CATALOGS=0 skips the reference catalog snapshot (see src/util/catalogs.py),
+# BAKE_CRUISE_INDEX=0 the cruise retrieval index (see src/agent_tools/cruise_retrieval_tool.py)
+docker build -f DockerfileApi --build-arg BAKE_CATALOGS=${BAKE_CATALOGS:-1} \
+    --build-arg BAKE_CRUISE_INDEX=${BAKE_CRUISE_INDEX:-1} -t cruise-ai-agent-api ..
 
 echo "Docker image 'cruise-ai-agent-api' built successfully"
@@ -1,6 +1,8 @@
-from datetime import datetime
-
-import requests
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 from src.agent_tools.city_tool import get_city_id
 from src.agent_tools.country_tool import get_country_id
@@ -10,8 +12,24 @@ from src.agent_tools.response_parser import extract_cruise_summary
 from src.agent_tools.rivers_tool import get_river_id
 from src.agent_tools.vessel_tool import get_vessel_id
 from src.agent_tools.company_tool import get_company_id
+from src.util import upstream
+from src.util.cache import TTLCache
+from src.util.tracing import in_current_context
 import os
 
+logger = logging.getLogger(__name__)
+
+# (bucket name, max distance in days from the requested departure date), narrowest first
+DATE_WINDOWS = [("exact", 0), ("within_3_days", 3), ("within_7_days", 7)]
+
+MAX_BATCH_QUERIES = 5
+MAX_EXPAND_PAGES = 10
+MAX_RESULTS_PER_QUERY = 10
+MAX_BATCH_RESULTS = 30
+
+# Summaries of search responses by search URL
+_search_cache = TTLCache(ttl_seconds=int(os.getenv("SEARCH_CACHE_TTL", "300")), max_entries=256, name="search")
+
 
 def search_cruises(
         cruise_type: str = None,
@@ -27,7 +45,8 @@ def search_cruises(
         price_min: int = None,
         price_max: int = None,
         vessel_name: str = None,
-        company_name: str = None
+        company_name: str = None,
+        expand_dates: bool = False
 ):
     """
     Search for cruises using advanced filtering criteria.
@@ -60,8 +79,74 @@ def search_cruises(
     :param price_max: Maximum price in specified currency
     :param vessel_name: The cruise vessel name
     :param company_name: The company name
-    :return Formatted cruise search results
+    :param expand_dates: Search around the exact departure date given in time_from_date
+        - Fetches ±7 days once and returns {"exact": [...], "within_3_days": [...], "within_7_days": [...]}
+        - Each cruise is tagged with its closest departure and days_from_requested
+        - Requires time_from_date, without it a regular search from today is run
+    :return Formatted cruise search results, or a message naming a date that is not "YYYY-MM-DD"
+    """
+    try:
+        search_url, requested_date = _search_url(
+            cruise_type, rivers, port_from, port_to, cities_to_visit, country_from, country_to, time_duration,
+            time_from_date, time_to_date, price_min, price_max, vessel_name, company_name, expand_dates
+        )
+    except InvalidDateError as e:
+        return str(e)
+    cruises = _search_cache.get(search_url)
+    if cruises is None:
+        cruises = _fetch_search(search_url, paginate=requested_date is not None)
+    if requested_date is not None:
+        return _partition_by_date_window(cruises, requested_date)
+    return cruises
+
+
+class InvalidDateError(ValueError):
+    """A search date the upstream API cannot take, its message is meant for the model."""
+
+
+def _parse_date(name: str, value: Optional[str]) -> Optional[date]:
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise InvalidDateError(
+            f"Invalid {name} {value!r}: expected a full date in YYYY-MM-DD format, e.g. \"2025-07-01\". "
+            f"For a whole month use its first and last day as time_from_date and time_to_date."
+        )
+
+
+def _search_url(
+        cruise_type: str = None,
+        rivers: list[str] = None,
+        port_from: str = None,
+        port_to: str = None,
+        cities_to_visit: list[str] = None,
+        country_from: str = None,
+        country_to: str = None,
+        time_duration: int = None,
+        time_from_date: str = None,
+        time_to_date: str = None,
+        price_min: int = None,
+        price_max: int = None,
+        vessel_name: str = None,
+        company_name: str = None,
+        expand_dates: bool = False
+):
     """
+    Search URL of search_cruises arguments, and the requested date of an expand_dates search.
+
+    Raises InvalidDateError for dates that are not "YYYY-MM-DD".
+    """
+    _parse_date("time_from_date", time_from_date)
+    _parse_date("time_to_date", time_to_date)
+    requested_date = None
+    if expand_dates and time_from_date is not None:
+        requested_date = _parse_date("time_from_date", time_from_date)
+        window_from = max(requested_date - timedelta(days=DATE_WINDOWS[-1][1]), datetime.now().date())
+        time_from_date = window_from.strftime("%Y-%m-%d")
+        time_to_date = (requested_date + timedelta(days=DATE_WINDOWS[-1][1])).strftime("%Y-%m-%d")
+
     search_parameters = []
     if cruise_type is not None:
         search_parameters.append(_convert_to_request_params("cruiseType[]", get_type_id(cruise_type)))
@@ -111,10 +196,120 @@ def search_cruises(
 
     base_url = 'https://center.cruises/api/chatbot/cruises/batch-data?'
     search_url = base_url + '&'.join(search_parameters)
-    print(search_url)
+    logger.debug(f"Search URL: {search_url}")
+    return search_url, requested_date
+
+
+def _fetch_search(search_url: str, hedge: bool = True, paginate: bool = False):
+    if paginate:
+        # The exact date sits in the middle of the window, every page is needed to fill its bucket
+        records = upstream.get_pages(search_url, MAX_EXPAND_PAGES, hedge=hedge)
+    else:
+        records = upstream.get(search_url, hedge=hedge).json()['data']
+    cruises = extract_cruise_summary(records)
+    if cruises:
+        _search_cache.set(search_url, cruises)
+    return cruises
+
+
+def refresh_search(**arguments) -> int:
+    """Fetch a search_cruises search into the search cache, returns the number of cruises found."""
+    search_url, requested_date = _search_url(**arguments)
+    return len(_fetch_search(search_url, hedge=False, paginate=requested_date is not None))
+
+
+_SEARCH_PARAMETERS = frozenset(inspect.signature(search_cruises).parameters)
+
+
+def search_cruises_batch(queries: list[dict]):
+    """
+    Run several cruise searches at once, use it to compare destinations, dates or ships.
+    :param queries: list of filter sets, each one accepts the same keys as search_cruises
+        - Example: [{"country_to": "Italy", "time_from_date": "2025-07-01", "time_to_date": "2025-07-31"},
+                    {"country_to": "Norway", "time_from_date": "2025-07-01", "time_to_date": "2025-07-31"}]
+    :return: {"queries": [{"query", "cruise_ids", "total", "ignored_filters"?}], "cruises": [...],
+        "truncated": bool, "skipped": [...]}
+        - every cruise is listed once, matched_queries holds the indexes of the queries it matched
+        - at most MAX_BATCH_QUERIES queries run per call, the rest are listed in skipped
+        - ignored_filters lists keys search_cruises does not accept, the query ran without them
+    """
+    requested = [query or {} for query in queries or []]
+    skipped = requested[MAX_BATCH_QUERIES:]
+    queries = [{k: v for k, v in query.items() if k in _SEARCH_PARAMETERS} for query in requested[:MAX_BATCH_QUERIES]]
+    ignored = [sorted(k for k in query if k not in _SEARCH_PARAMETERS) for query in requested[:MAX_BATCH_QUERIES]]
+    if not queries:
+        return {"queries": [], "cruises": [], "truncated": bool(skipped), "skipped": skipped}
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        results = list(executor.map(in_current_context(_run_batch_query), queries))
+
+    merged = {}
+    summary = []
+    truncated = bool(skipped)
+    for index, (query, cruises) in enumerate(zip(queries, results)):
+        entry = {"query": query, "ignored_filters": ignored[index]} if ignored[index] else {"query": query}
+        if cruises is None or isinstance(cruises, str):
+            summary.append({**entry, "cruise_ids": [], "total": 0, "error": cruises or "search failed"})
+            continue
+
+        truncated = truncated or len(cruises) > MAX_RESULTS_PER_QUERY
+        cruise_ids = []
+        for cruise in cruises[:MAX_RESULTS_PER_QUERY]:
+            cruise_id = cruise["cruise_id"]
+            if cruise_id not in merged:
+                if len(merged) >= MAX_BATCH_RESULTS:
+                    truncated = True
+                    continue
+                merged[cruise_id] = {**cruise, "matched_queries": []}
+            merged[cruise_id]["matched_queries"].append(index)
+            cruise_ids.append(cruise_id)
+        summary.append({**entry, "cruise_ids": cruise_ids, "total": len(cruises)})
+
+    return {"queries": summary, "cruises": list(merged.values()), "truncated": truncated, "skipped": skipped}
+
+
+def _run_batch_query(query):
+    """Run a single batch search, flattening date buckets into tagged cruises, None or a message on errors."""
+    try:
+        result = search_cruises(**query)
+    except Exception as e:
+        logger.error(f"Error in batch search {query}: {e}")
+        return None
+
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        return [
+            {**cruise, "date_bucket": name}
+            for name, _ in DATE_WINDOWS
+            for cruise in result.get(name, [])
+        ]
+    return [cruise for cruise in result or [] if cruise]
+
+
+def _partition_by_date_window(cruises, requested_date):
+    """Split cruises into exact/±3/±7 day buckets by their departure closest to requested_date."""
+    buckets = {"requested_date": requested_date.strftime("%Y-%m-%d")}
+    buckets.update({name: [] for name, _ in DATE_WINDOWS})
+
+    for cruise in cruises or []:
+        if not cruise:
+            continue
+        closest = None
+        for date_range in cruise.get("metadata", {}).get("date_ranges", []):
+            begin_date = datetime.strptime(date_range["beginDate"], "%Y-%m-%d").date()
+            distance = abs((begin_date - requested_date).days)
+            if closest is None or distance < closest[0]:
+                closest = (distance, date_range["beginDate"])
+
+        if closest is None:
+            continue
+        for name, max_days in DATE_WINDOWS:
+            if closest[0] <= max_days:
+                buckets[name].append({**cruise, "closest_departure": closest[1], "days_from_requested": closest[0]})
+                break
 
-    response = requests.get(search_url).json()
-    return extract_cruise_summary(response['data'])
+    return buckets
 
 
 def _convert_to_request_params(param_name: str, values):
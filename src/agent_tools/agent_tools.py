@@ -1,14 +1,20 @@
 import logging
-import time
-import requests
 import os
 from datetime import date
 
 from dotenv import load_dotenv
 from src.agent_tools.packages_knowledge_tool import get_packages_knowledge
+from src.util import upstream
+from src.util.cache import TTLCache
+from src.util.cruise_utils import EUR_CURRENCY_ID, index_cabin_categories, index_prices_by_currency
 
 logger = logging.getLogger(__name__)
 
+# batch-data accepts several cruiseId[] values; keep URLs well below server limits
+CRUISE_INFO_CHUNK_SIZE = 20
+
+_cruise_info_cache = TTLCache(ttl_seconds=int(os.getenv("CRUISE_INFO_CACHE_TTL", "600")), name="cruise_info")
+
 
 def get_current_date() -> str:
     """Get current date in ISO format."""
@@ -28,90 +34,139 @@ def find_cruise_info(cruise_id: str, desired_date: date = date.today()):
     :param cruise_id: cruise unique identifier
     :param desired_date: desired date to search cruise info, all info will be found only after this specified date
     """
-    start_time = time.time()
-    
+    return find_cruises_info([cruise_id], desired_date)[str(cruise_id)]
+
+
+def find_cruises_info(cruise_ids: list[str], desired_date: date = None):
+    """
+    Get detailed information for several cruises at once, use it to compare cruises.
+    :param cruise_ids: list of cruise unique identifiers
+    :param desired_date: desired date to search cruise info, all info will be found only after this specified date
+    :return: mapping of cruise id to its detailed information or "no data"
+    """
+    desired_date = desired_date or date.today()
+    date_bucket = desired_date.isoformat()
+    ids = list(dict.fromkeys(str(cruise_id) for cruise_id in cruise_ids))
+
+    results = {}
+    missing = []
+    for cruise_id in ids:
+        cached = _cruise_info_cache.get((cruise_id, date_bucket))
+        if cached is not None:
+            results[cruise_id] = cached
+        else:
+            missing.append(cruise_id)
+
+    for i in range(0, len(missing), CRUISE_INFO_CHUNK_SIZE):
+        chunk = missing[i:i + CRUISE_INFO_CHUNK_SIZE]
+        records_by_id = _fetch_cruise_records(chunk)
+        for cruise_id in chunk:
+            records = records_by_id.get(cruise_id)
+            if not records:
+                results[cruise_id] = "no data"
+                continue
+            try:
+                result = _parse_cruise_info(records, desired_date)
+            except Exception as e:
+                logger.error(f"❌ Error finding cruise info for ID {cruise_id}: {str(e)}")
+                results[cruise_id] = "no data"
+                continue
+            _cruise_info_cache.set((cruise_id, date_bucket), result)
+            results[cruise_id] = result
+
+    return {cruise_id: results[cruise_id] for cruise_id in ids}
+
+
+def _fetch_cruise_records(cruise_ids: list[str]) -> dict:
+    """Fetch batch-data for several cruises in one request and group records by cruise id."""
     try:
         base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
-        url = f"{base_url}/en/api/chatbot/cruises/batch-data?cruiseId[]={cruise_id}"
-        response = requests.get(url)
+        query = "&".join(f"cruiseId[]={cruise_id}" for cruise_id in cruise_ids)
+        url = f"{base_url}/en/api/chatbot/cruises/batch-data?{query}"
+        response = upstream.get(url)
         response.raise_for_status()
-        
-        data = response.json()
-        if not data.get('data'):
-            return "no data"
-        
-        # Find first cruise with date after desired_date
-        cruise_data = None
-        desired_date_str = desired_date.strftime('%Y-%m-%d') if desired_date else None
-        
-        if desired_date_str:
-            for cruise in data['data']:
-                begin_date = cruise.get('cruiseDateRangeInfoJson', {}).get('dateRange', {}).get('begin_date')
-                if begin_date and begin_date >= desired_date_str:
-                    cruise_data = cruise
-                    break
-        
-        if not cruise_data:
-            cruise_data = data['data'][0]
-        cruise_info = cruise_data.get('cruiseInfoJson', {}).get('cruise', {})
-        range_info = cruise_data.get('cruiseDateRangeInfoJson', {})
-        vessel_info = cruise_data.get('vesselInfoJson', {}).get('vessel', {})
-        cabins_info = cruise_data.get('vesselInfoJson', {}).get('cabinCategories', {})
-
-        min_price_info = range_info.get('minPriceInfo', [])
-        cabin_prices = [item for item in min_price_info if item.get('currency_id') == 2]
-
-        cabins_info_result = []
-        for c in cabin_prices:
-            try:
-                id = c.get('cabin_category_id')
-                cabin_info = [info for info in cabins_info if info.get('category', {}).get('cabin_category_id') == id]
-                cabins_info_result.append({
-                    'cabin_id': id,
-                    'price': c.get('price_value'),
-                    'description': cabin_info[0].get('category', {}).get('description')
-                })
-            except Exception:
-                cabins_info_result.append({
-                    'cabin_id': 'none',
-                    'minimal_price': 'none',
-                    'description': 'none'
-                })
-
-        # Extract relevant information
-        result = {
-            'cruise_name': cruise_info.get('name_i18n', {}).get('en', cruise_info.get('name', '')),
-            'vessel_name': vessel_info.get('name', ''),
-            'vessel_dressing': vessel_info.get('dress', ''),
-            'vessel_food': vessel_info.get('food', ''),
-            'vessel_activities': vessel_info.get('activities', ''),
-            'vessel_for_children': vessel_info.get('for_children', ''),
-            'cabins_info': cabins_info_result,
-            'min_price': range_info.get('minPrice').get('2'),
-            'website': build_cruise_url(cruise_data.get('cruiseDateRangeId'), cruise_data.get('ufl')),
-            'itineraries': []
-        }
-        
-        # Extract itinerary information
-        for itinerary in cruise_data.get('cruiseInfoJson', {}).get('itineraries', []):
-            city = itinerary.get('city', {})
-            itinerary_info = itinerary.get('itinerary', {})
-            result['itineraries'].append({
-                'day': itinerary_info.get('day'),
-                'city_name': city.get('name_i18n', {}).get('en', city.get('name', '')),
-                'country_name': city.get('country_name_i18n', {}).get('en', city.get('country_name', '')),
-                'arrival_time': itinerary_info.get('arrival_time'),
-                'departure_time': itinerary_info.get('departure_time')
-            })
-        
-        elapsed = time.time() - start_time
-        print(f"⏱️ API cruise info: {elapsed:.2f}s")
-        
-        return result
-        
+
+        grouped = {}
+        for record in response.json().get('data') or []:
+            cruise_id = record.get('cruiseInfoJson', {}).get('cruise', {}).get('cruise_id')
+            if cruise_id is None and len(cruise_ids) == 1:
+                cruise_id = cruise_ids[0]
+            grouped.setdefault(str(cruise_id), []).append(record)
+
+        return grouped
+
     except Exception as e:
-        logger.error(f"❌ Error finding cruise info for ID {cruise_id}: {str(e)}")
-        return "no data"
+        logger.error(f"❌ Error fetching cruise info for IDs {cruise_ids}: {str(e)}")
+        return {}
+
+
+def _parse_cruise_info(records: list, desired_date: date) -> dict:
+    """Build the cruise info answer from the batch-data records of a single cruise."""
+    # Find first cruise with date after desired_date
+    cruise_data = None
+    desired_date_str = desired_date.strftime('%Y-%m-%d') if desired_date else None
+
+    if desired_date_str:
+        for cruise in records:
+            begin_date = cruise.get('cruiseDateRangeInfoJson', {}).get('dateRange', {}).get('begin_date')
+            if begin_date and begin_date >= desired_date_str:
+                cruise_data = cruise
+                break
+
+    if not cruise_data:
+        cruise_data = records[0]
+    cruise_info = cruise_data.get('cruiseInfoJson', {}).get('cruise', {})
+    range_info = cruise_data.get('cruiseDateRangeInfoJson', {})
+    vessel_info = cruise_data.get('vesselInfoJson', {}).get('vessel', {})
+    cabins_info = cruise_data.get('vesselInfoJson', {}).get('cabinCategories', {})
+
+    categories_by_id = index_cabin_categories(cabins_info)
+    cabin_prices = index_prices_by_currency(range_info.get('minPriceInfo', [])).get(EUR_CURRENCY_ID, [])
+
+    cabins_info_result = []
+    for c in cabin_prices:
+        id = c.get('cabin_category_id')
+        category = categories_by_id.get(id)
+        if category is None:
+            cabins_info_result.append({
+                'cabin_id': 'none',
+                'minimal_price': 'none',
+                'description': 'none'
+            })
+            continue
+        cabins_info_result.append({
+            'cabin_id': id,
+            'price': c.get('price_value'),
+            'description': category.get('description')
+        })
+
+    # Extract relevant information
+    result = {
+        'cruise_name': cruise_info.get('name_i18n', {}).get('en', cruise_info.get('name', '')),
+        'vessel_name': vessel_info.get('name', ''),
+        'vessel_dressing': vessel_info.get('dress', ''),
+        'vessel_food': vessel_info.get('food', ''),
+        'vessel_activities': vessel_info.get('activities', ''),
+        'vessel_for_children': vessel_info.get('for_children', ''),
+        'cabins_info': cabins_info_result,
+        'min_price': range_info.get('minPrice').get('2'),
+        'website': build_cruise_url(cruise_data.get('cruiseDateRangeId'), cruise_data.get('ufl')),
+        'itineraries': []
+    }
+    
+    # Extract itinerary information
+    for itinerary in cruise_data.get('cruiseInfoJson', {}).get('itineraries', []):
+        city = itinerary.get('city', {})
+        itinerary_info = itinerary.get('itinerary', {})
+        result['itineraries'].append({
+            'day': itinerary_info.get('day'),
+            'city_name': city.get('name_i18n', {}).get('en', city.get('name', '')),
+            'country_name': city.get('country_name_i18n', {}).get('en', city.get('country_name', '')),
+            'arrival_time': itinerary_info.get('arrival_time'),
+            'departure_time': itinerary_info.get('departure_time')
+        })
+
+    return result
 
 def get_package_info(query: str, cruise_line: str | None = None) -> str:
     """
@@ -0,0 +1,218 @@
+"""
+Free-text cruise retrieval over a local mirror of upcoming cruises.
+
+The index is persisted under CRUISE_INDEX_DIR and can be baked into the image (devops/DockerfileApi,
+BAKE_CRUISE_INDEX=1) so that new instances answer from the first request:
+    python -m src.agent_tools.cruise_retrieval_tool build
+While no index exists yet, find_cruises_by_description ranks a plain search_cruises page instead.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Optional
+
+from src.agent_tools.response_parser import extract_cruise_summary
+from src.util import upstream
+from src.util.embeddings import HashingEmbedder, get_embedder
+from src.util.text_index import BM25Index, tokenize
+from src.util.vector_index import load_vector_index, write_vector_index
+
+logger = logging.getLogger(__name__)
+
+# src/agent_tools -> repository root
+BASE_DIR = Path(__file__).resolve().parents[2]
+INDEX_DIR = Path(os.getenv("CRUISE_INDEX_DIR", str(BASE_DIR / "data" / "cruise_index")))
+INDEX_MAX_AGE = int(os.getenv("CRUISE_INDEX_MAX_AGE", str(24 * 3600)))
+# 100 records per page, enough for every upcoming departure
+INDEX_MAX_PAGES = int(os.getenv("CRUISE_INDEX_MAX_PAGES", "500"))
+
+# candidates taken from each ranking before reciprocal rank fusion
+CANDIDATES = 50
+RRF_K = 60
+MAX_LIMIT = 10
+
+
+class CruiseRetriever:
+    """
+    BM25 + embedding retrieval over mirrored cruise text_chunk records.
+
+    Only semantic with CRUISE_EMBEDDING_MODEL set: the default HashingEmbedder is lexical, so both
+    rankings then match words and word forms.
+    """
+
+    def __init__(self, directory: Path = INDEX_DIR, embedder=None, max_age: int = INDEX_MAX_AGE):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        if isinstance(self.embedder, HashingEmbedder):
+            logger.warning("Cruise retrieval uses the non-semantic hashing embedder, "
+                           "set CRUISE_EMBEDDING_MODEL for semantic matches")
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._index = None
+        self._bm25: Optional[BM25Index] = None
+        self._open()
+
+    def _open(self) -> None:
+        index = load_vector_index(self.directory)
+        if index is not None and index.manifest.get("embedder") != self.embedder.name:
+            logger.info("Cruise index was built with another embedder, it will be rebuilt")
+            index = None
+        bm25 = BM25Index(tokenize(p["text_chunk"]) for p in index.payloads) if index is not None else None
+        self._index, self._bm25 = index, bm25
+
+    @property
+    def size(self) -> int:
+        return self._index.count if self._index is not None else 0
+
+    def is_stale(self) -> bool:
+        if self._index is None:
+            return True
+        return time.time() - self._index.manifest.get("built_at", 0) > self.max_age
+
+    def build(self, cruises: list) -> int:
+        """Embed and persist cruise chunks, replacing the current index."""
+        payloads = {}
+        for cruise in cruises or []:
+            if cruise and cruise.get("text_chunk"):
+                payloads.setdefault(cruise["cruise_id"], cruise)
+        payloads = list(payloads.values())
+        if not payloads:
+            return 0
+
+        vectors = self.embedder.embed([p["text_chunk"] for p in payloads])
+        write_vector_index(self.directory, vectors, payloads, {"embedder": self.embedder.name})
+        with self._lock:
+            self._open()
+        return len(payloads)
+
+    def refresh(self) -> int:
+        """Mirror all upcoming cruises from center.cruises and rebuild the index."""
+        start_time = time.time()
+        base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
+        url = f"{base_url}/api/chatbot/cruises/batch-data?time.fromDate={date.today().isoformat()}"
+        records = upstream.get_pages(url, INDEX_MAX_PAGES, hedge=False)
+
+        count = self.build(extract_cruise_summary(records))
+        logger.info(f"Cruise index refreshed with {count} cruises in {time.time() - start_time:.2f}s")
+        return count
+
+    def refresh_in_background(self) -> None:
+        """Start a refresh thread unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing cruise index: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="cruise-index-refresh", daemon=True).start()
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """Return payloads of the best matching cruises, fused from lexical and vector rankings."""
+        index, bm25 = self._index, self._bm25
+        if index is None or not query:
+            return []
+
+        lexical = bm25.search({token: 1.0 for token in tokenize(query)}, limit=CANDIDATES)
+        semantic = index.search(self.embedder.embed([query])[0], limit=CANDIDATES)
+
+        fused = {}
+        for ranking in (lexical, semantic):
+            for rank, (row, _) in enumerate(ranking):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [index.payloads[row] for row, _ in best]
+
+
+_retriever: Optional[CruiseRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_cruise_retriever() -> CruiseRetriever:
+    """Return the process-wide retriever, opening the on-disk index on first use."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = CruiseRetriever()
+    return _retriever
+
+
+def find_cruises_by_description(description: str, limit: int = 5):
+    """
+    Find cruises matching a free-text description of what the user wants.
+    Use it for vague requests without concrete filters, e.g. "relaxing cruise with lots of culture",
+    then confirm current dates and prices with find_cruises_info.
+    :param description: what the user is looking for, in English
+    :param limit: maximum number of cruises to return (1-10)
+    :return: list of matching cruises with their description and upcoming dates, or "no data"
+    """
+    retriever = get_cruise_retriever()
+    if retriever.is_stale():
+        retriever.refresh_in_background()
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    candidates = retriever.search(description, limit=limit * 2) if retriever.size else _rank_upcoming(
+        description, limit * 2
+    )
+    today = date.today().isoformat()
+    results = []
+    for payload in candidates:
+        metadata = payload.get("metadata", {})
+        date_ranges = [dr for dr in metadata.get("date_ranges", []) if dr.get("beginDate", "") >= today]
+        if not date_ranges:
+            continue
+        results.append({**payload, "metadata": {**metadata, "date_ranges": date_ranges}})
+        if len(results) >= limit:
+            break
+
+    return results or "no data"
+
+
+def _rank_upcoming(description: str, limit: int) -> list:
+    """Fallback while the index is being built: BM25 ranking of one page of upcoming cruises."""
+    from src.agent_tools.advanced_api_search import search_cruises
+
+    try:
+        cruises = [c for c in search_cruises() or [] if c and c.get("text_chunk")]
+    except Exception as e:
+        logger.error(f"Error searching cruises for the description fallback: {e}")
+        return []
+    if not cruises:
+        return []
+    bm25 = BM25Index(tokenize(c["text_chunk"]) for c in cruises)
+    return [cruises[row] for row, _ in bm25.search({token: 1.0 for token in tokenize(description)}, limit=limit)]
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build or query the cruise retrieval index")
+    parser.add_argument("command", choices=["build", "search"])
+    parser.add_argument("query", nargs="?", default="relaxing cruise with lots of culture")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = get_cruise_retriever().refresh()
+        if not count:
+            raise SystemExit("No cruises were indexed")
+        print(f"Wrote {INDEX_DIR} with {count} cruises")
+    else:
+        print(find_cruises_by_description(args.query))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-import requests
 import logging
-import os
+
+from src.util.catalogs import get_catalog_store
+from src.util.translation import translate_to_russian
 
 logger = logging.getLogger(__name__)
 
@@ -74,7 +75,7 @@ def get_direction_id(direction_name: str):
                     return direction['id']
         
         # Fallback: translate input and try matching
-        direction_ru = _translate_to_russian(direction_name)
+        direction_ru = translate_to_russian(direction_name)
         for direction in directions:
             if direction_ru.lower() in direction['text'].lower():
                 return direction['id']
@@ -85,30 +86,10 @@ def get_direction_id(direction_name: str):
         logger.error(f"Error in get_direction_id: {e}")
         return None
 
-def _translate_to_russian(text: str) -> str:
-    """Translate text to Russian using Google Translate API."""
-    try:
-        import urllib.parse
-        encoded_text = urllib.parse.quote(text)
-        url = f"https://translate.googleapis.com/translate_a/single?client=gtx&sl=auto&tl=ru&dt=t&q={encoded_text}"
-        
-        response = requests.get(url)
-        if response.status_code == 200:
-            result = response.json()
-            return result[0][0][0] if result and result[0] and result[0][0] else text
-        return text
-    except:
-        return text
-
 def _get_directions_data():
-    """Load directions data from API or cache."""
-    try:
-        base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
-        response = requests.get(base_url + "/api/filter/cruise-categories.json")
-        return response.json() if response.status_code == 200 else []
-    except Exception as e:
-        logger.error(f"Error in _get_directions_data: {e}")
-        return []
+    """Load directions from the catalog snapshot or API."""
+    return get_catalog_store().get("directions") or []
+
 
 if __name__ == "__main__":
     print(get_direction_id("Mediterranean"))
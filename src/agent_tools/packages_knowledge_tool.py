@@ -2,8 +2,12 @@ from __future__ import annotations
 
 from pathlib import Path
 import re
+import threading
+import time
 from typing import Optional
 
+from src.util.text_index import BM25Index, tokenize
+
 # src/agent_tools -> src
 BASE_DIR = Path(__file__).resolve().parents[1]
 KNOWLEDGE_DIR = BASE_DIR / "knowledge" / "packages"
@@ -17,40 +21,131 @@ LINE_TO_FILE = {
     "norwegian cruise line": "ncl.md",
     "costa": "costa.md",
     "costa cruises": "costa.md",
+    "роял карибиан": "royal_caribbean.md",
+    "роял карибіан": "royal_caribbean.md",
+    "селебрити": "celebrity.md",
+    "селебріті": "celebrity.md",
+    "норвегиан": "ncl.md",
+    "норведжиан": "ncl.md",
+    "коста": "costa.md",
 }
 
 
 # intent keywords
 TOPIC_KEYWORDS = {
     "included": ["included", "what is included", "included in", "base fare", "fare includes"],
-    "drinks": ["drink", "drinks", "beverage", "alcohol", "cocktail", "beer", "wine", "soft drink", "package"],
+    "drinks": ["drink", "drinks", "beverage", "alcohol", "cocktail", "beer", "wine", "soft drink", "soda", "coffee", "water", "package"],
     "wifi": ["wifi", "wi-fi", "internet", "streaming", "voom"],
     "gratuities": ["gratuity", "gratuities", "tips", "service charge", "service charges"],
-    "dining": ["dining", "restaurants", "specialty dining", "speciality dining"],
+    "dining": ["dining", "restaurant", "restaurants", "specialty dining", "speciality dining"],
+}
+# whole-word match, so that e.g. "water" does not match "waterslides"
+TOPIC_PATTERNS = {
+    topic: re.compile(r"\b(" + "|".join(re.escape(k) for k in keys) + r")\b")
+    for topic, keys in TOPIC_KEYWORDS.items()
 }
 
+# Russian / Ukrainian word prefixes -> English terms used in the knowledge files
+MULTILINGUAL_KEYWORDS = {
+    "напит": ["drinks", "beverage"],
+    "напо": ["drinks", "beverage"],
+    "безалкогол": ["non", "alcoholic", "soda", "refreshment"],
+    "алкогол": ["alcohol", "alcoholic", "drinks"],
+    "пив": ["beer"],
+    "вино": ["wine"],
+    "вина": ["wine"],
+    "вину": ["wine"],
+    "винн": ["wine"],
+    "коктейл": ["cocktail"],
+    "вода": ["water"],
+    "воды": ["water"],
+    "воду": ["water"],
+    "водой": ["water"],
+    "воді": ["water"],
+    "кофе": ["coffee"],
+    "кав": ["coffee"],
+    "газировк": ["soda"],
+    "интернет": ["internet", "wifi"],
+    "інтернет": ["internet", "wifi"],
+    "вайфай": ["wifi", "internet"],
+    "вай": ["wifi", "internet"],
+    "стрим": ["streaming"],
+    "стрім": ["streaming"],
+    "чаев": ["gratuities", "tips"],
+    "чайов": ["gratuities", "tips"],
+    "сервисн": ["service", "charge"],
+    "сервісн": ["service", "charge"],
+    "включ": ["included"],
+    "входит": ["included"],
+    "входить": ["included"],
+    "тариф": ["fare", "rate"],
+    "стоимост": ["fare", "price"],
+    "вартіст": ["fare", "price"],
+    "ресторан": ["restaurants", "dining"],
+    "пакет": ["package"],
+}
+
+STOPWORDS = set(tokenize(
+    "a an the is are was be do does did i we you it to of in on for with and or what which how much "
+    "can there any my our about cruise line per day "
+    "что какие какой как сколько есть ли на в и или по для у меня мы это "
+    "що які який як скільки чи є на в і або по для у мене ми це"
+))
+
+RELOAD_CHECK_INTERVAL = 1.0
+
 def _normalize(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip().lower())
 
+# whole-word match, so that e.g. "ncl" does not match "included"
+LINE_PATTERNS = {k: re.compile(rf"\b{re.escape(k)}\b") for k in LINE_TO_FILE}
+
 def _detect_line(user_text: str, cruise_line: Optional[str]) -> Optional[str]:
     if cruise_line:
         cl = _normalize(cruise_line)
-        for k in LINE_TO_FILE:
-            if k in cl:
+        for k, pattern in LINE_PATTERNS.items():
+            if pattern.search(cl):
                 return k
     t = _normalize(user_text)
-    for k in LINE_TO_FILE:
-        if k in t:
+    for k, pattern in LINE_PATTERNS.items():
+        if pattern.search(t):
             return k
     return None
 
 def _detect_topic(user_text: str) -> Optional[str]:
     t = _normalize(user_text)
-    for topic, keys in TOPIC_KEYWORDS.items():
-        if any(k in t for k in keys):
+    for topic, pattern in TOPIC_PATTERNS.items():
+        if pattern.search(t):
             return topic
     return None
 
+# words that mean the user is (also) looking for a sailing, not just asking about packages
+SEARCH_HINTS = re.compile(
+    r"\b(search|find|looking for|cruises|cruise to|from|depart\w*|sail\w*|itinerar\w*|route|port"
+    r"|cabin\w*|book\w*|available|cheapest|when|trip)\b"
+)
+
+FAST_PATH_MAX_LENGTH = 200
+
+
+def classify_package_question(user_text: str) -> Optional[tuple[str, str]]:
+    """
+    Detect a standalone package/inclusion question with high confidence.
+    Returns (line_key, topic) when both the cruise line and the topic are explicit
+    and the message does not look like a cruise search, otherwise None.
+    """
+    t = _normalize(user_text)
+    if not t or len(t) > FAST_PATH_MAX_LENGTH or any(ch.isdigit() for ch in t):
+        return None
+    if SEARCH_HINTS.search(t):
+        return None
+
+    line_key = _detect_line(t, None)
+    topic = _detect_topic(t)
+    if not line_key or not topic:
+        return None
+    return line_key, topic
+
 def _extract_sections(md: str) -> list[tuple[str, str]]:
     """
     Split markdown into sections by headings.
@@ -68,6 +163,115 @@ def _extract_sections(md: str) -> list[tuple[str, str]]:
         out.append((heading, p))
     return out
 
+class PackageKnowledgeBase:
+    """
+    Package markdown files pre-parsed into sections with a BM25 index over them.
+    Files are re-read when their mtime changes (checked at most every reload_interval seconds).
+    """
+
+    def __init__(self, directory: Path = KNOWLEDGE_DIR, reload_interval: float = RELOAD_CHECK_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._mtimes: dict[str, float] = {}
+        self.documents: dict[str, str] = {}
+        self.sections: list[tuple[str, str, str]] = []
+        self._sections_by_file: dict[str, set[int]] = {}
+        self.index = BM25Index([])
+        self._maybe_reload(force=True)
+
+    def _current_mtimes(self) -> dict[str, float]:
+        if not self.directory.exists():
+            return {}
+        return {p.name: p.stat().st_mtime for p in self.directory.glob("*.md")}
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            self._next_check = now + self.reload_interval
+            mtimes = self._current_mtimes()
+            if not force and mtimes == self._mtimes:
+                return
+            self._load(mtimes)
+
+    def _load(self, mtimes: dict[str, float]) -> None:
+        documents = {}
+        sections = []
+        sections_by_file: dict[str, set[int]] = {}
+        for file_name in sorted(mtimes):
+            md = (self.directory / file_name).read_text(encoding="utf-8")
+            documents[file_name] = md
+            for heading, content in _extract_sections(md):
+                if content == heading:
+                    # document title without a body
+                    continue
+                sections_by_file.setdefault(file_name, set()).add(len(sections))
+                sections.append((file_name, heading, content))
+
+        # headings are short and precise, weight them three times
+        index = BM25Index(tokenize(f"{heading} {heading} {heading} {content}") for _, heading, content in sections)
+
+        self.documents, self.sections, self._sections_by_file, self.index = documents, sections, sections_by_file, index
+        self._mtimes = mtimes
+
+    def document(self, file_name: str) -> Optional[str]:
+        self._maybe_reload()
+        return self.documents.get(file_name)
+
+    def search(self, query_weights: dict[str, float], file_name: str, limit: int = 2) -> list[tuple[str, float]]:
+        """Return (section content, score) of the best sections of file_name for the query."""
+        self._maybe_reload()
+        doc_filter = self._sections_by_file.get(file_name)
+        if not doc_filter:
+            return []
+        hits = self.index.search(query_weights, limit=limit, doc_filter=doc_filter)
+        return [(self.sections[doc_id][2], score) for doc_id, score in hits]
+
+
+_knowledge_base: Optional[PackageKnowledgeBase] = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base() -> PackageKnowledgeBase:
+    """Return the process-wide knowledge base, loading it on first use."""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                _knowledge_base = PackageKnowledgeBase()
+    return _knowledge_base
+
+
+def _expand_query(q: str) -> list[str]:
+    """English terms for Russian/Ukrainian query words."""
+    expansion = []
+    for token in tokenize(q):
+        for prefix, terms in MULTILINGUAL_KEYWORDS.items():
+            if token.startswith(prefix):
+                expansion.extend(terms)
+                break
+    return expansion
+
+
+def _query_weights(q: str, expansion: list[str], topic: Optional[str], line_key: str) -> dict[str, float]:
+    """BM25 query terms: user words 1.0, translated words 0.8, topic keywords 0.15."""
+    ignored = STOPWORDS | set(tokenize(line_key))
+    weights: dict[str, float] = {}
+
+    def add(terms, weight):
+        for term in terms:
+            if term not in ignored:
+                weights[term] = max(weights.get(term, 0.0), weight)
+
+    add(tokenize(" ".join(TOPIC_KEYWORDS.get(topic, []))), 0.15)
+    add(tokenize(" ".join(expansion)), 0.8)
+    add(tokenize(q), 1.0)
+    return weights
+
+
 def get_packages_knowledge(query: str, cruise_line: Optional[str] = None) -> str:
     """
     Returns relevant knowledge snippet about packages/inclusions.
@@ -82,12 +286,13 @@ def get_packages_knowledge(query: str, cruise_line: Optional[str] = None) -> str
         )
 
     file_name = LINE_TO_FILE[line_key]
-    file_path = KNOWLEDGE_DIR / file_name
-    if not file_path.exists():
+    knowledge_base = get_knowledge_base()
+    md = knowledge_base.document(file_name)
+    if md is None:
         return "Package information is currently unavailable for this cruise line."
 
-    md = file_path.read_text(encoding="utf-8")
-    topic = _detect_topic(q)
+    expansion = _expand_query(q)
+    topic = _detect_topic(" ".join([q, *expansion]))
 
     # If no topic detected, return a compact “menu” of what can be answered
     if not topic:
@@ -96,25 +301,14 @@ def get_packages_knowledge(query: str, cruise_line: Optional[str] = None) -> str
             "What exactly would you like to know?"
         )
 
-    sections = _extract_sections(md)
-
-    # Score sections by keyword overlap
-    keys = TOPIC_KEYWORDS.get(topic, [])
-    scored: list[tuple[int, str]] = []
-    for _, content in sections:
-        c_low = content.lower()
-        score = sum(1 for k in keys if k in c_low)
-        if score > 0:
-            scored.append((score, content))
+    scored = knowledge_base.search(_query_weights(q, expansion, topic, line_key), file_name, limit=2)
 
     if not scored:
         # fallback: return top of doc (usually has “included/not included”)
         head = "\n".join(md.splitlines()[:80]).strip()
         return head if head else "No relevant package information found."
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-
     # Return up to 2 best sections, capped
-    snippet = "\n\n".join(s for _, s in scored[:2]).strip()
+    snippet = "\n\n".join(s for s, _ in scored).strip()
     lines = snippet.splitlines()
     return "\n".join(lines[:140]).strip()
@@ -1,6 +1,7 @@
-import requests
 import logging
-import os
+
+from src.util.catalogs import get_catalog_store
+from src.util.translation import translate_to_russian
 
 logger = logging.getLogger(__name__)
 
@@ -11,18 +12,7 @@ def get_port_id(city_name: str):
         if not cities:
             return None
 
-        # Try direct translation using requests to Google Translate API
-        import urllib.parse
-
-        encoded_text = urllib.parse.quote(city_name)
-        url = f"https://translate.googleapis.com/translate_a/single?client=gtx&sl=auto&tl=ru&dt=t&q={encoded_text}"
-
-        response = requests.get(url)
-        if response.status_code == 200:
-            result = response.json()
-            city_ru = result[0][0][0] if result and result[0] and result[0][0] else city_name
-        else:
-            city_ru = city_name
+        city_ru = translate_to_russian(city_name)
 
         # Search in cities
         for city in cities:
@@ -37,15 +27,9 @@ def get_port_id(city_name: str):
 
 
 def _get_ports_data():
-    """Load cities data from API or cache."""
-    try:
-        base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
-        response = requests.get(base_url + "/api/filter/cruise-ports.json")
+    """Load ports from the catalog snapshot or API."""
+    return get_catalog_store().get("ports")
 
-        data = response.json()
-        return data
-    except Exception as e:
-        logger.error(f"Error in _get_ports_data: {e}")
 
 
 if __name__ == "__main__":
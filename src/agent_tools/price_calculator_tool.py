@@ -1,5 +1,20 @@
+import logging
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from src.util import upstream
+from src.util.cache import TTLCache
+from src.util.tracing import in_current_context
+
+logger = logging.getLogger(__name__)
+
+# Prices change rarely within a conversation, but quotes must not outlive a booking session
+_quote_cache = TTLCache(ttl_seconds=int(os.getenv("PRICE_QUOTE_CACHE_TTL", "120")), name="price_quote")
+
+PRICE_MAX_WORKERS = 8
+MAX_PRICE_QUOTES = 24
+INVALID_PASSENGERS = "adults_count (at least 1) and children_count must be whole numbers"
 
 
 def calculate_price(
@@ -16,17 +31,91 @@ def calculate_price(
     if range_id is None:
         return -1
 
+    key = (str(range_id), int(adults_count), int(children_count))
+    cached = _quote_cache.get(key)
+    if cached is not None:
+        return cached
+
+    price = _fetch_price(range_id, adults_count, children_count)
+    if price != -1:
+        _quote_cache.set(key, price)
+    return price
+
+
+def calculate_prices(
+        range_ids: list[int],
+        passenger_configs: list[dict]
+):
+    """
+    Calculate exact cruise prices for several date ranges and passenger configurations in one call.
+    Use it when the user asks to compare prices for different dates or group compositions.
+    :param range_ids: cruise date range ids
+    :param passenger_configs: passenger configurations to price
+        - Example: [{"adults_count": 2, "children_count": 1}, {"adults_count": 3, "children_count": 0}]
+    :return: {"prices": {range id: {"<adults>A+<children>C": price data or -1}}, "truncated": bool,
+        "skipped": [{"range_id", "passengers"} or {"passenger_config", "error"}]}
+        - at most MAX_PRICE_QUOTES quotes are priced per call, the rest are listed in skipped
+        - passenger configurations without whole counts and at least one adult are listed in skipped
+    """
+    configs = []
+    invalid = []
+    for config in passenger_configs or []:
+        passengers = _passengers(config)
+        if passengers is None:
+            invalid.append({"passenger_config": config, "error": INVALID_PASSENGERS})
+        elif passengers not in configs:
+            configs.append(passengers)
+
+    requested = [
+        (range_id, adults, children)
+        for range_id in dict.fromkeys(range_ids or [])
+        for adults, children in configs
+    ]
+    quotes, capped = requested[:MAX_PRICE_QUOTES], requested[MAX_PRICE_QUOTES:]
+    skipped = invalid + [{"range_id": str(range_id), "passengers": f"{adults}A+{children}C"}
+                         for range_id, adults, children in capped]
+
+    if not quotes:
+        return {"prices": {}, "truncated": False, "skipped": skipped}
+
+    with ThreadPoolExecutor(max_workers=min(PRICE_MAX_WORKERS, len(quotes))) as executor:
+        prices = list(executor.map(in_current_context(lambda quote: calculate_price(*quote)), quotes))
+
+    matrix = {}
+    for (range_id, adults, children), price in zip(quotes, prices):
+        matrix.setdefault(str(range_id), {})[f"{adults}A+{children}C"] = price
+    return {"prices": matrix, "truncated": bool(capped), "skipped": skipped}
+
+
+def _passengers(config) -> Optional[Tuple[int, int]]:
+    """(adults, children) of a passenger configuration, None unless both are whole counts with an adult."""
+    if not isinstance(config, dict):
+        return None
+    adults, children = config.get("adults_count", 2), config.get("children_count", 0)
+    if adults is None or children is None or isinstance(adults, bool) or isinstance(children, bool):
+        return None
+    try:
+        adults, children = int(adults), int(children)
+    except (TypeError, ValueError):
+        return None
+    if adults < 1 or children < 0:
+        return None
+    return adults, children
+
+
+def _fetch_price(range_id, adults_count, children_count):
     try:
         base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
         price_url = base_url + f"/api/chatbot/cruises/prices?cruiseDateRangeId={range_id}&adultCount={adults_count}&childCount={children_count}"
-        response = requests.get(price_url)
+        response = upstream.get(price_url)
 
         data = response.json()
         return data['data']
     except Exception as e:
-        print(e)
+        logger.error(f"Error calculating price for range {range_id}: {e}")
         return -1
 
 
 if __name__ == "__main__":
-    print(calculate_price(30891534, 3, 0))
\ No newline at end of file
+    print(calculate_price(30891534, 3, 0))
+    print(calculate_prices([30891534], [{"adults_count": 2, "children_count": 1}, {"adults_count": 3}]))
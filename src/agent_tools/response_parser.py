@@ -2,6 +2,7 @@ from datetime import datetime
 
 from src.agent_tools.agent_tools import build_cruise_url
 from src.util.cleaner import remove_html_tags
+from src.util.cruise_utils import EUR_CURRENCY_ID
 
 
 def extract_cruise_summary(data):
@@ -41,16 +42,15 @@ def get_cabins_info(data):
     try:
         cabins_info = []
         for row in data:
-            if row.get("minPriceInfo") is not None:
-                info_list = row.get("minPriceInfo")
-                for info in info_list:
-                    if info['currency_id'] == 2:
-                        cabins_info.append({
-                            'cabin_id': info['cabin_category_id'],
-                            'range_id': info['cruise_date_range_id'],
-                            'location': info['location'],
-                            'price': info['price_value']
-                        })
+            # every row is visited once, a single filtering pass is cheaper than indexing
+            for info in row.get("minPriceInfo") or []:
+                if info['currency_id'] == EUR_CURRENCY_ID:
+                    cabins_info.append({
+                        'cabin_id': info['cabin_category_id'],
+                        'range_id': info['cruise_date_range_id'],
+                        'location': info['location'],
+                        'price': info['price_value']
+                    })
         return cabins_info
     except:
         return []
@@ -1,21 +1,31 @@
-from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain.agents import create_agent
-from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.checkpoint.postgres import PostgresSaver
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from contextlib import ExitStack, contextmanager
 from typing import List, Any, Optional
 import os
 import logging
 
-from src.agent_tools.advanced_api_search import search_cruises
-from src.agent_tools.agent_tools import find_cruise_info, get_current_date, get_package_info
-from src.agent_tools.price_calculator_tool import calculate_price
-from src.util.agent_utils import AgentTimer, MessageHistoryManager, ConversationSummarizer
+from src.agent_tools.advanced_api_search import search_cruises, search_cruises_batch
+from src.agent_tools.agent_tools import find_cruise_info, find_cruises_info, get_current_date, get_package_info
+from src.agent_tools.cruise_retrieval_tool import find_cruises_by_description
+from src.agent_tools.packages_knowledge_tool import classify_package_question, get_packages_knowledge
+from src.agent_tools.price_calculator_tool import calculate_price, calculate_prices
+from src.util.agent_tracing import TracedPostgresSaver, TracingMiddleware, traced_invoke
+from src.util.agent_utils import MessageHistoryManager, ConversationSummarizer
+from src.util.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+from src.util.model_routing import PACKAGE, ModelRouter, ModelRoutingMiddleware
+from src.util.prompt_layout import PromptLayoutMiddleware
+from src.util.tool_execution import ToolExecutionMiddleware, TOOL_MAX_CONCURRENCY
+from src.util.tracing import KIND_CLIENT, span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+
 
 class CruiseAgent:
     """AI agent for cruise-related queries with conversation management."""
@@ -26,15 +36,72 @@ class CruiseAgent:
         tools: Optional[List[Any]] = None,
         system_prompt: Optional[str] = None
     ):
-        load_dotenv()
-        
         self.llm = ChatOpenAI(model=model_name)
-        self.tools = tools or [search_cruises, find_cruise_info, get_current_date, calculate_price, get_package_info]
+        # The standard tier is self.llm, other tiers get their own client on first use
+        self.router = ModelRouter(
+            lambda name: self.llm if name == model_name else ChatOpenAI(model=name), standard_model=model_name
+        )
+        self.tools = tools or [
+            search_cruises, search_cruises_batch, find_cruise_info, find_cruises_info, get_current_date,
+            calculate_price, calculate_prices, get_package_info, find_cruises_by_description
+        ]
         self.system_prompt = system_prompt or self._default_system_prompt()
         
         self.history_manager = MessageHistoryManager()
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
         self.summarizer = ConversationSummarizer(self.llm)
 
+        # Set by warm-up, until then every request opens its own connection and compiles the graph
+        self.pool = None
+        self.checkpointer = None
+        self.agent = None
+
+    def open_pool(self):
+        """Open the Postgres connection pool shared by the checkpointer and the message history."""
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        pool = ConnectionPool(
+            os.getenv("POSTGRES_DB_URL", ""),
+            min_size=POSTGRES_POOL_MIN_SIZE,
+            max_size=POSTGRES_POOL_MAX_SIZE,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False
+        )
+        pool.open(wait=True)
+        self.pool = pool
+        self.checkpointer = TracedPostgresSaver(pool)
+        self.history_manager.pool = pool
+
+    def compile_agent(self):
+        """Compile the agent graph once against the pooled checkpointer."""
+        if self.checkpointer is None:
+            raise RuntimeError("Connection pool is not open")
+        self.agent = self._create_agent(self.checkpointer)
+
+    def preconnect(self):
+        """Open the keep-alive connection to the LLM API so the first request skips the TLS handshake."""
+        self.llm.root_client.models.retrieve(self.llm.model_name)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = self.checkpointer = self.agent = None
+        self.history_manager.pool = None
+
+    @contextmanager
+    def _checkpointer_session(self):
+        if self.checkpointer is not None:
+            yield self.checkpointer
+            return
+
+        with ExitStack() as stack:
+            with span("db.connect", kind=KIND_CLIENT, **{"db.system": "postgresql"}):
+                checkpointer = stack.enter_context(
+                    TracedPostgresSaver.from_conn_string(os.getenv("POSTGRES_DB_URL", ""))
+                )
+            yield checkpointer
+
     def _default_system_prompt(self) -> str:
         return (
             """
@@ -76,6 +143,8 @@ Ask no more than 2–3 clarifying questions in one message.
 BOOKING-READY PHASE
 When the number of adults and children is confirmed:
 ALWAYS use the pricing tool to calculate the final cabin price.
+To price several dates or passenger configurations, use calculate_prices once instead of repeated calculate_price calls.
+If its result is truncated, price the skipped quotes with another calculate_prices call.
 Never calculate prices manually.
 Do NOT show cabin_id to the user.
 If the price cannot be calculated:
@@ -117,6 +186,10 @@ FLOW RULES
 Internally translate the user query to English.
 Present cruise information in a user-friendly, conversational way.
 Never expose internal metadata or system logic.
+When details of several cruises are needed (e.g. a comparison), request them all in one find_cruises_info call.
+When the user compares several destinations, dates or ships, run all searches in one search_cruises_batch call.
+If its result lists skipped queries, run them in another call; ignored_filters are filters the search did not apply.
+For vague wishes without concrete filters (e.g. "a relaxing cruise with lots of culture"), use find_cruises_by_description first, then confirm dates and prices with find_cruises_info.
 If the user wants to book, explain that booking is not available in chat and redirect them to the cruise website.
 
 RESPONSE LIMITS
@@ -125,6 +198,7 @@ Keep responses under ~2000 characters when possible.
 
 DATE SEARCH PRIORITY
 If the user requests a specific departure date:
+Call search_cruises once with time_from_date set to that date and expand_dates=True. The result contains "exact", "within_3_days" and "within_7_days" buckets; apply the rules below to them instead of searching again.
 1) You MUST first check for cruises departing on that exact date only.
 2) You MUST NOT conclude that no cruises exist unless this exact-date search returns no results.
 3) Only if no exact-date cruises are found, you MAY expand the search range (e.g. ±3 or ±7 days).
@@ -168,30 +242,44 @@ If the user requests a specific cabin category and that category is not availabl
         )
 
     def ask(self, user_message: str, thread_id: str = "default") -> List[Any]:
-        timer = AgentTimer()
-        config = {"configurable": {"thread_id": thread_id}}
+        config = {"configurable": {"thread_id": thread_id}, "max_concurrency": TOOL_MAX_CONCURRENCY}
         responses = []
 
         try:
-            with timer.time("postgres_init"):
-                with PostgresSaver.from_conn_string(os.getenv("POSTGRES_DB_URL", "")) as checkpointer:
-                    
-                    with timer.time("agent_creation"):
-                        agent = self._create_agent(checkpointer)
-                    
-                    with timer.time("history_processing"):
-                        input_messages = self._process_conversation_history(
-                            checkpointer, config, thread_id, user_message, agent
+            with self._checkpointer_session() as checkpointer:
+                with span("agent.compile", cached=self.agent is not None):
+                    agent = self.agent or self._create_agent(checkpointer)
+
+                package_route = classify_package_question(user_message)
+                if package_route:
+                    with span("agent.package_fast_path"):
+                        responses = self._answer_package_question(
+                            checkpointer, agent, config, user_message, package_route
                         )
-                    
-                    with timer.time("stream_processing"):
-                        responses = self._stream_agent_response(agent, input_messages, config)
-
-                    self.history_manager.save_messages([
-                        HumanMessage(user_message),
-                        responses[-1]
-                    ], thread_id)
-                    timer.print_summary()
+                else:
+                    state = checkpointer.get(config)
+                    cached = self.answer_cache.get(user_message) if self.answer_cache and state is None else None
+
+                    if cached:
+                        with span("agent.answer_cache"):
+                            agent.update_state(config, {"messages": cached}, as_node="model")
+                            responses = cached
+                    else:
+                        with span("agent.history"):
+                            input_messages = self._process_conversation_history(
+                                checkpointer, config, thread_id, user_message, agent, state
+                            )
+
+                        with span("agent.stream"):
+                            responses = self._stream_agent_response(agent, input_messages, config)
+
+                        if self.answer_cache and state is None:
+                            self.answer_cache.put(user_message, agent.get_state(config).values.get("messages", []))
+
+                self.history_manager.save_messages([
+                    HumanMessage(user_message),
+                    responses[-1]
+                ], thread_id)
                     
         except Exception as e:
             logger.error(f"❌ AI Agent error: {str(e)}")
@@ -204,14 +292,16 @@ If the user requests a specific cabin category and that category is not availabl
             self.llm,
             tools=self.tools,
             checkpointer=checkpointer,
-            system_prompt=self.system_prompt
+            system_prompt=self.system_prompt,
+            middleware=[
+                TracingMiddleware(), ModelRoutingMiddleware(self.router), PromptLayoutMiddleware(self.system_prompt),
+                ToolExecutionMiddleware()
+            ]
         )
 
-    def _process_conversation_history(self, checkpointer, config, thread_id, user_message, agent):
-        state = checkpointer.get(config)
-        
+    def _process_conversation_history(self, checkpointer, config, thread_id, user_message, agent, state):
         if state and len(state['channel_values']['messages']) > 50:
-            print("Summarizing chat history")
+            logger.info(f"Summarizing chat history of thread {thread_id}")
 
             summary_content = self.summarizer.summarize_conversation(agent, config)
             checkpointer.delete_thread(thread_id=thread_id)
@@ -223,6 +313,33 @@ If the user requests a specific cabin category and that category is not availabl
         
         return [HumanMessage(content=user_message)]
 
+    def _answer_package_question(self, checkpointer, agent, config, user_message, package_route):
+        """Answer a standalone package question with one formatting call instead of the agent loop."""
+        line_key, _ = package_route
+        first_turn = checkpointer.get(config) is None
+        knowledge = get_packages_knowledge(query=user_message, cruise_line=line_key)
+
+        answer = traced_invoke(self.router.model(PACKAGE), [
+            SystemMessage(content=self._package_answer_prompt(first_turn)),
+            HumanMessage(content=f"Question: {user_message}\n\nPackage information:\n{knowledge}")
+        ])
+
+        # Record the turn in the thread so follow-up questions keep the context
+        messages = [HumanMessage(content=user_message), AIMessage(content=answer.content)]
+        agent.update_state(config, {"messages": messages}, as_node="model")
+        return messages
+
+    def _package_answer_prompt(self, first_turn: bool) -> str:
+        # The per-turn sentence goes last so the rest stays a cacheable prompt prefix
+        greeting = " This is the first message of the conversation, greet the user warmly." if first_turn else ""
+        return (
+            "You are a friendly Cruise Travel Assistant. "
+            "Answer the user's question about cruise packages using ONLY the package information provided. "
+            "Reply in the user's language, keep the answer short and practical, use minimal Markdown and no emojis. "
+            "Do NOT invent package rules and do NOT mention files, tools, databases or data sources."
+            f"{greeting}"
+        )
+
     def _stream_agent_response(self, agent, input_messages, config):
         responses = []
         for step in agent.stream({"messages": input_messages}, config, stream_mode="values"):
@@ -231,5 +348,8 @@ If the user requests a specific cabin category and that category is not availabl
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     agent = CruiseAgent()
     agent.ask("Cruise to barcelona")
@@ -1,17 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from dotenv import load_dotenv
+
+# Load .env before src modules read their settings at import time
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import jwt
+import asyncio
 import os
 import logging
+import threading
+import uuid
+from contextlib import asynccontextmanager
 
-from src.ai_agent import CruiseAgent
-from dotenv import load_dotenv
-
+from src.util import metrics, profiling
+from src.util.admission import AdmissionRejected, get_admission_controller, retry_after_header
 from src.util.jwt_utils import create_jwt_token
-
-load_dotenv()
+from src.util.startup import StartupState
+from src.util.tracing import start_trace
+from src.util.turn_scheduler import COALESCED, get_turn_scheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,10 +31,72 @@ JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:8000").split(" ")
 
-app = FastAPI()
-security = HTTPBearer()
+# LangChain, LangGraph, the OpenAI client and the tools are imported by the warm-up, after the
+# server started listening, so liveness and the port bind do not wait for them
+agent = None
+_agent_lock = threading.Lock()
+startup = StartupState()
+
+
+def get_agent():
+    """Return the CruiseAgent, importing and creating it on first use."""
+    global agent
+    if agent is None:
+        with _agent_lock:
+            if agent is None:
+                from src.ai_agent import CruiseAgent
+
+                agent = CruiseAgent()
+    return agent
+
+
+def preload_knowledge():
+    from src.agent_tools.packages_knowledge_tool import get_knowledge_base
+
+    get_knowledge_base()
+
+
+def preload_cruise_index():
+    from src.agent_tools.cruise_retrieval_tool import get_cruise_retriever
+
+    get_cruise_retriever()
+
 
-agent = CruiseAgent()
+def start_popular_searches():
+    from src.util.popular_searches import POPULAR_SEARCH_ENABLED, PopularSearchWarmer
+
+    if POPULAR_SEARCH_ENABLED:
+        PopularSearchWarmer(lambda: get_agent().checkpointer).start_background_refresh()
+
+
+def warm_up():
+    from src.util.catalogs import get_catalog_store
+
+    startup.run([
+        ("agent_import", get_agent, True),
+        ("db_pool", lambda: get_agent().open_pool(), True),
+        ("graph_compile", lambda: get_agent().compile_agent(), True),
+        ("catalogs", get_catalog_store().preload, False),
+        ("package_knowledge", preload_knowledge, False),
+        ("cruise_index", preload_cruise_index, False),
+        ("llm_connection", lambda: get_agent().preconnect(), False),
+    ])
+    get_catalog_store().start_background_refresh()
+    start_popular_searches()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /healthz answers right away and /readyz flips once warm
+    warmup_task = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    yield
+    await warmup_task
+    if agent is not None:
+        agent.close()
+
+
+app = FastAPI(lifespan=lifespan)
+security = HTTPBearer()
 
 # CORS middleware
 app.add_middleware(
@@ -33,6 +105,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST"],
     allow_headers=["*"],
+    expose_headers=["X-Turn-Coalesced"],
 )
 
 # JWT verification
@@ -61,12 +134,54 @@ class AgentRequest(BaseModel):
     chat_id: str
 
 @app.post("/ask")
-async def ask_agent(request: AgentRequest, user: dict = Depends(verify_jwt)):
+async def ask_agent(
+    request: AgentRequest,
+    http_request: Request,
+    response: Response,
+    user: dict = Depends(verify_jwt)
+):
     """
     Call the Cruise AI agent with a user's question and chat ID.
+
+    Answers the agent's list of messages. Messages of a chat sent while its previous turn is still
+    running are answered together by one turn (TURN_COALESCE): the last of them gets the messages,
+    the earlier ones get an empty list with the header X-Turn-Coalesced: 1, meaning "answered with
+    the next message", so that the client shows the answer once.
     """
+    # Client request ids end up in logs and traces, only well-formed ones are kept
+    request_id = http_request.headers.get("X-Request-ID") or ""
+    if not profiling.PROFILE_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    response.headers["X-Request-ID"] = request_id
+
+    try:
+        async with get_admission_controller().admit(user.get("user_id") or "anonymous"):
+            return await _answer(request, http_request, response, request_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests: {e.reason}",
+            headers={"Retry-After": retry_after_header(e.retry_after), "X-Request-ID": request_id}
+        )
+
+
+async def _answer(request: AgentRequest, http_request: Request, response: Response, request_id: str):
+    metrics.ASK_IN_FLIGHT.inc()
     try:
-        responses = agent.ask(user_message=request.question, thread_id=request.chat_id)
+        trigger = profiling.should_profile(http_request.headers.get("X-Profile"))
+
+        def run_turn(message: str):
+            with profiling.profile_request(request_id, trigger, chat_id=request.chat_id) as profile_id:
+                if profile_id:
+                    response.headers["X-Profile-Id"] = profile_id
+                return get_agent().ask(user_message=message, thread_id=request.chat_id)
+
+        # The agent runs on the ask executor, one turn per chat at a time
+        with start_trace("POST /ask", request_id=request_id, chat_id=request.chat_id):
+            responses = await get_turn_scheduler().submit(request.chat_id, request.question, run_turn)
+        if responses is COALESCED:
+            response.headers["X-Turn-Coalesced"] = "1"
+            return []
         if not responses:
             raise HTTPException(status_code=404, detail="No response from agent")
 
@@ -74,6 +189,27 @@ async def ask_agent(request: AgentRequest, user: dict = Depends(verify_jwt)):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.ASK_IN_FLIGHT.dec()
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics of this instance."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up, it may still be warming up."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once warm-up finished, 503 with the warm-up progress before that."""
+    report = startup.report()
+    return JSONResponse(report, status_code=200 if startup.ready else 503)
 
 
 @app.get("/debug-token")
@@ -0,0 +1,195 @@
+"""
+Admission control for /ask.
+
+Every request of a JWT user_id takes a token from the user's token bucket (rate limit), then a
+slot under the global and the per-user in-flight limits. Requests that find no free slot wait in a
+bounded FIFO queue; when the queue is full, or the wait exceeds ADMISSION_QUEUE_TIMEOUT, they are
+shed with AdmissionRejected, which /ask turns into a 429 with Retry-After. Runs on the event loop,
+so the state needs no locks.
+
+Quotas are per integration token, not per end user: a JWT user_id names a client such as the
+widget backend ("cruise_client"), whose whole traffic arrives under one token. By default one
+integration may therefore use the whole global limit and is not rate limited; set
+ADMISSION_MAX_PER_USER and ADMISSION_USER_RATE (requests per second, 0 for none) to share the
+service between several integrations.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from src.util.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REQUESTS, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", str(ADMISSION_MAX_IN_FLIGHT)))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "0"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "50"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Full, idle buckets are dropped once this many users are tracked
+MAX_TRACKED_USERS = 10000
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, otherwise the seconds until one is available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.burst
+
+
+@dataclass
+class _Waiter:
+    user_id: str
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_per_user: int = ADMISSION_MAX_PER_USER,
+                 user_rate: float = ADMISSION_USER_RATE, user_burst: float = ADMISSION_USER_BURST,
+                 max_queue: int = ADMISSION_MAX_QUEUE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queue: Deque[_Waiter] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    def _has_slot(self, user_id: str) -> bool:
+        return self.in_flight < self.max_in_flight and self._user_in_flight.get(user_id, 0) < self.max_per_user
+
+    def _acquire(self, user_id: str) -> None:
+        self.in_flight += 1
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+
+    def _release(self, user_id: str) -> None:
+        self.in_flight -= 1
+        remaining = self._user_in_flight[user_id] - 1
+        if remaining:
+            self._user_in_flight[user_id] = remaining
+        else:
+            del self._user_in_flight[user_id]
+
+        # Hand the slot to the oldest waiter that fits, a user at its limit does not block the others
+        for waiter in list(self._queue):
+            if waiter.future.done():
+                self._queue.remove(waiter)
+            elif self._has_slot(waiter.user_id):
+                self._queue.remove(waiter)
+                self._acquire(waiter.user_id)
+                waiter.future.set_result(None)
+                if self.in_flight >= self.max_in_flight:
+                    break
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._buckets = {user: b for user, b in self._buckets.items() if not b.full}
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        ADMISSION_REQUESTS.labels("shed", reason).inc()
+        return AdmissionRejected(reason, retry_after)
+
+    async def _enter(self, user_id: str) -> None:
+        wait = self._bucket(user_id).take() if self.user_rate > 0 else 0.0
+        if wait:
+            raise self._reject("rate_limited", wait)
+
+        # Waiters are handed free slots on release, so a free slot here is not owed to any of them
+        if self._has_slot(user_id):
+            self._acquire(user_id)
+            ADMISSION_REQUESTS.labels("admitted", "").inc()
+            return
+
+        if len(self._queue) >= self.max_queue:
+            raise self._reject("queue_full", 1.0)
+
+        waiter = _Waiter(user_id, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        ADMISSION_REQUESTS.labels("queued", "").inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait timed out
+            if not waiter.future.done():
+                waiter.future.cancel()
+                raise self._reject("queue_timeout", self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(user_id)
+            else:
+                waiter.future.cancel()
+            raise
+        finally:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+        ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - waiter.enqueued_at)
+        ADMISSION_REQUESTS.labels("admitted", "").inc()
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        """Hold an /ask slot of user_id for the block; raises AdmissionRejected when shed."""
+        await self._enter(user_id)
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+        QUEUE_DEPTH.labels("admission").set_function(lambda: _controller.waiting)
+    return _controller
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,92 @@
+from typing import Any, List, Tuple
+
+from langchain.agents.middleware import AgentMiddleware
+from langgraph.checkpoint.postgres import PostgresSaver
+
+from src.util.tracing import KIND_CLIENT, span
+
+DB_ATTRIBUTES = {"db.system": "postgresql"}
+
+# Writes are the per-step deltas of a channel, the timestamp comes from the checkpoint they follow
+RECENT_WRITES_SQL = """
+SELECT cw.thread_id, c.checkpoint ->> 'ts' AS ts, cw.type, cw.blob
+FROM checkpoint_writes cw
+JOIN checkpoints c
+  ON c.thread_id = cw.thread_id AND c.checkpoint_ns = cw.checkpoint_ns AND c.checkpoint_id = cw.checkpoint_id
+WHERE cw.channel = %s
+ORDER BY cw.checkpoint_id DESC
+LIMIT %s
+"""
+
+
+def record_token_usage(current, message) -> None:
+    """Copy token counts of an AIMessage to a span."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens")
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+    current.set_attributes(**{
+        "llm.usage.input_tokens": input_tokens,
+        "llm.usage.output_tokens": usage.get("output_tokens"),
+        "llm.usage.cached_tokens": cached_tokens,
+        "llm.usage.uncached_input_tokens": input_tokens - (cached_tokens or 0) if input_tokens is not None else None,
+    })
+
+
+def model_name(model) -> str:
+    return getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__
+
+
+def traced_invoke(llm, messages):
+    """Invoke a chat model outside the agent graph inside an llm.chat span."""
+    with span("llm.chat", **{"llm.model": model_name(llm), "llm.messages": len(messages)}) as current:
+        response = llm.invoke(messages)
+        record_token_usage(current, response)
+        return response
+
+
+class TracingMiddleware(AgentMiddleware):
+    """Records an llm.chat span per model call (with token counts) and a tool span per tool call."""
+
+    def wrap_model_call(self, request, handler):
+        attributes = {"llm.model": model_name(request.model), "llm.messages": len(request.messages)}
+        with span("llm.chat", **attributes) as current:
+            response = handler(request)
+            messages = getattr(response, "result", None) or [response]
+            record_token_usage(current, messages[-1])
+            current.set_attribute("llm.tool_calls", len(getattr(messages[-1], "tool_calls", None) or []))
+            return response
+
+    def wrap_tool_call(self, request, handler):
+        name = request.tool_call["name"]
+        with span(f"tool.{name}", **{"tool.name": name}) as current:
+            result = handler(request)
+            current.set_attribute("tool.status", getattr(result, "status", None))
+            return result
+
+
+class TracedPostgresSaver(PostgresSaver):
+    """PostgresSaver that records a db span per checkpoint query."""
+
+    def get_tuple(self, config):
+        with span("db.checkpoint.get", kind=KIND_CLIENT, **DB_ATTRIBUTES):
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with span("db.checkpoint.put", kind=KIND_CLIENT, **DB_ATTRIBUTES):
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with span("db.checkpoint.put_writes", kind=KIND_CLIENT, **DB_ATTRIBUTES):
+            return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        with span("db.checkpoint.delete_thread", kind=KIND_CLIENT, **DB_ATTRIBUTES):
+            return super().delete_thread(thread_id)
+
+    def recent_writes(self, channel: str, limit: int) -> List[Tuple[str, str, Any]]:
+        """(thread_id, ts, value) of the newest writes to a channel across threads, without loading checkpoints."""
+        with span("db.checkpoint.recent_writes", kind=KIND_CLIENT, **DB_ATTRIBUTES):
+            with self._cursor() as cur:
+                cur.execute(RECENT_WRITES_SQL, (channel, limit))
+                rows = cur.fetchall()
+        return [(row["thread_id"], row["ts"], self.serde.loads_typed((row["type"], row["blob"]))) for row in rows]
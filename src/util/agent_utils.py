@@ -1,9 +1,9 @@
 import time
 import logging
-import psycopg2
 from contextlib import contextmanager
 from typing import List, Any
-from langchain_core.messages import SystemMessage
+
+from src.util.tracing import KIND_CLIENT, span
 
 logger = logging.getLogger(__name__)
 
@@ -21,39 +21,45 @@ class AgentTimer:
             yield
         finally:
             self.timings[operation_name] = time.time() - start
-    
-    def print_summary(self):
-        total = sum(self.timings.values())
-        print(f"⏱️ Total time: {total:.2f}s")
-        for operation, duration in self.timings.items():
-            print(f"⏱️ {operation.replace('_', ' ').title()}: {duration:.2f}s")
 
 
 class MessageHistoryManager:
     """Manages conversation history persistence."""
-    
+
+    INSERT_SQL = "INSERT INTO messages_history(msg_type, thread_id, message, created_at) VALUES (%s, %s, %s, now())"
+
+    def __init__(self, pool=None):
+        # psycopg connection pool, a new connection per save is opened without one
+        self.pool = pool
+
     def save_messages(self, messages: List[Any], thread_id: str):
         """Save messages to PostgreSQL history table."""
+        rows = [(1 if msg.type == 'human' else 2, thread_id, msg.content) for msg in messages]
         try:
-            import os
-            conn = psycopg2.connect(os.getenv("POSTGRES_DB_URL"))
-            cursor = conn.cursor()
-            
-            for msg in messages:
-                msg_type = 1 if msg.type == 'human' else 2
-                cursor.execute(
-                    "INSERT INTO messages_history(msg_type, thread_id, message, created_at) VALUES (%s, %s, %s, now())",
-                    (msg_type, thread_id, msg.content)
-                )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with span("db.save_history", kind=KIND_CLIENT, **{"db.system": "postgresql"}):
+                self._insert(rows)
             logger.info(f"Saved {len(messages)} messages to history for thread {thread_id}")
             
         except Exception as e:
             logger.error(f"Failed to save messages to history: {str(e)}")
 
+    def _insert(self, rows):
+        if self.pool is not None:
+            with self.pool.connection() as conn, conn.transaction():
+                with conn.cursor() as cursor:
+                    cursor.executemany(self.INSERT_SQL, rows)
+            return
+
+        import os
+        import psycopg2
+
+        conn = psycopg2.connect(os.getenv("POSTGRES_DB_URL"))
+        cursor = conn.cursor()
+        cursor.executemany(self.INSERT_SQL, rows)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
 
 class ConversationSummarizer:
     """Handles conversation summarization."""
@@ -63,6 +69,8 @@ class ConversationSummarizer:
     
     def summarize_conversation(self, agent, config) -> str:
         """Generate conversation summary using the agent."""
+        from langchain_core.messages import SystemMessage
+
         summary_prompt = (
             "Summarize this conversation in 500-1000 symbols, "
             "the summary should include basic cruise information(name, ids, itinerary, prices, dates), "
@@ -0,0 +1,79 @@
+"""
+Answer cache for the first turn of a conversation.
+
+Many conversations open with near-identical questions ("cruises from Barcelona"). The messages of a
+fresh thread's first turn (question, tool calls, tool results, answer) are cached by normalised
+question, language, day and catalog version; the same first question on another fresh thread
+replays them into its checkpoint instead of running the agent loop. Entries live as long as the
+search results they were built from (ANSWER_CACHE_TTL, default SEARCH_CACHE_TTL), and a new
+catalog snapshot changes the key. Hit rate: cache_requests_total{cache="answer"}.
+"""
+import os
+import re
+import unicodedata
+from datetime import date
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+from src.util.cache import TTLCache
+from src.util.catalogs import get_catalog_store
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", os.getenv("SEARCH_CACHE_TTL", "300")))
+# Long first messages are specific enough to never repeat
+MAX_QUESTION_LENGTH = 300
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+_UKRAINIAN_LETTERS = set("іїєґ")
+
+
+def normalize_question(text: str) -> str:
+    """Case, punctuation, whitespace and ё-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", text).lower().replace("ё", "е")
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def detect_language(text: str) -> str:
+    lowered = text.lower()
+    if any(char in _UKRAINIAN_LETTERS for char in lowered):
+        return "uk"
+    if any("а" <= char <= "я" for char in lowered):
+        return "ru"
+    return "en"
+
+
+class AnswerCache:
+    def __init__(self, ttl_seconds: float = ANSWER_CACHE_TTL):
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_entries=512, name="answer")
+
+    def key(self, question: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        if not normalized or len(normalized) > MAX_QUESTION_LENGTH:
+            return None
+        catalog_version = get_catalog_store().version or "live"
+        return f"{detect_language(question)}|{date.today().isoformat()}|{catalog_version}|{normalized}"
+
+    def get(self, question: str) -> Optional[List[BaseMessage]]:
+        """Messages of a cached first turn, with the question as asked this time."""
+        key = self.key(question)
+        data = self._cache.get(key) if key else None
+        if not data:
+            return None
+        messages = messages_from_dict(data)
+        messages[0] = HumanMessage(content=question)
+        return messages
+
+    def put(self, question: str, messages: List[BaseMessage]) -> None:
+        """Cache the messages of a first turn that ended with a final answer."""
+        key = self.key(question)
+        if not key or not messages or not isinstance(messages[0], HumanMessage):
+            return
+        answer = messages[-1]
+        if not isinstance(answer, AIMessage) or answer.tool_calls or not answer.content:
+            return
+        self._cache.set(key, messages_to_dict(messages))
+
+    def clear(self) -> None:
+        self._cache.clear()
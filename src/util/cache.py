@@ -0,0 +1,366 @@
+"""
+Caches shared by the tools.
+
+TTLCache keeps entries in an in-process LRU (the near tier). Named caches also read through to and
+write to the shared CACHE_BACKEND (the far tier): "sqlite" shares entries between the workers of a
+host through a local database file, "redis" between all instances through any Redis-protocol
+server, and "memory" (the default) has no far tier. Far keys are namespaced as
+{CACHE_NAMESPACE}:{name}:v{version}:{key}; bump a cache's version when the shape of its values
+changes. Values of named caches must be JSON-serialisable.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.util.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# src/util -> repository root
+BASE_DIR = Path(__file__).resolve().parents[2]
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "cruises")
+CACHE_SQLITE_PATH = Path(os.getenv("CACHE_SQLITE_PATH", str(BASE_DIR / "data" / "cache" / "cache.sqlite3")))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.5"))
+# After a far tier error the far tier is skipped for this long, a cache outage must not slow requests
+FAR_RETRY_SECONDS = 30
+MAX_KEY_LENGTH = 200
+
+_MISSING = object()
+_DEFAULT = object()
+
+
+class CacheBackend:
+    """Byte store with per-key expiry, shared beyond this process."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], Optional[float]]:
+        """Value and seconds left before it expires, None for an unknown expiry."""
+        return self.get(key), None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self, prefix: str) -> None:
+        """Delete every key starting with prefix."""
+        raise NotImplementedError
+
+    def acquire(self, key: str, owner: bytes, ttl_seconds: float) -> bool:
+        """Take or renew a lease: set key to owner unless another owner holds it, True if owner holds it."""
+        raise NotImplementedError
+
+
+class SQLiteBackend(CacheBackend):
+    """Database file shared by the workers of one host, one connection per thread."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: Path = CACHE_SQLITE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], Optional[float]]:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return (row[0], row[1] - now) if row else (None, None)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, time.time() + ttl_seconds))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self, prefix: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def acquire(self, key: str, owner: bytes, ttl_seconds: float) -> bool:
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache.value = excluded.value OR cache.expires_at <= ?",
+            (key, owner, now + ttl_seconds, now)
+        )
+        return cursor.rowcount == 1
+
+
+class RedisError(Exception):
+    pass
+
+
+# Renew the lease if owner holds it, take it if nobody does, in one atomic step
+ACQUIRE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Minimal RESP client (GET, PTTL, SET, DEL, SCAN, EVAL) for Redis or any server speaking its protocol."""
+
+    def __init__(self, url: str = CACHE_REDIS_URL, timeout: float = CACHE_REDIS_TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock, self._local.reader = sock, sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(payload)
+
+    def _send(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read() for _ in range(count)]
+        raise RedisError(f"Unexpected reply {line!r}")
+
+    def command(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands) -> list:
+        """Send several commands in one round trip, return their replies in order."""
+        if getattr(self._local, "sock", None) is None:
+            self._connect()
+        try:
+            self._local.sock.sendall(b"".join(self._encode(args) for args in commands))
+            return [self._read() for _ in commands]
+        except (OSError, ConnectionError):
+            self._local.sock.close()
+            self._local.sock = None
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.command("GET", key)
+
+    def get_with_ttl(self, key: str) -> Tuple[Optional[bytes], Optional[float]]:
+        value, ttl_ms = self.pipeline([("GET", key), ("PTTL", key)])
+        if value is None:
+            return None, None
+        return value, ttl_ms / 1000 if ttl_ms >= 0 else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self.command("SET", key, value, "PX", max(1, int(ttl_seconds * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.command("DEL", key)
+
+    def clear(self, prefix: str) -> None:
+        pattern = "".join("\\" + c if c in "*?[]\\" else c for c in prefix) + "*"
+        cursor = "0"
+        while True:
+            cursor, keys = self.command("SCAN", cursor, "MATCH", pattern, "COUNT", 500)
+            if keys:
+                self.command("DEL", *keys)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if cursor == "0":
+                return
+
+    def acquire(self, key: str, owner: bytes, ttl_seconds: float) -> bool:
+        return self.command("EVAL", ACQUIRE_SCRIPT, 1, key, owner, max(1, int(ttl_seconds * 1000))) == 1
+
+
+_shared_backend: Optional[CacheBackend] = None
+_shared_backend_lock = threading.Lock()
+
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """The far tier selected by CACHE_BACKEND, None for "memory"."""
+    global _shared_backend
+    if _shared_backend is None and CACHE_BACKEND != "memory":
+        with _shared_backend_lock:
+            if _shared_backend is None:
+                if CACHE_BACKEND == "sqlite":
+                    _shared_backend = SQLiteBackend()
+                elif CACHE_BACKEND == "redis":
+                    _shared_backend = RedisBackend()
+                else:
+                    raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}")
+    return _shared_backend
+
+
+def _key_text(key: Hashable) -> str:
+    text = key if isinstance(key, str) else json.dumps(key, default=str, separators=(",", ":"), ensure_ascii=False)
+    if len(text) > MAX_KEY_LENGTH:
+        return hashlib.sha1(text.encode()).hexdigest()
+    return text
+
+
+class TTLCache:
+    """Thread-safe cache with per-entry expiry: an LRU near tier in front of the shared far tier."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024, name: Optional[str] = None,
+                 version: int = 1, far: Optional[CacheBackend] = _DEFAULT):
+        self.ttl_seconds = ttl_seconds
+        # named caches record a cache.get span per lookup and use the far tier
+        self.name = name
+        self.version = version
+        # max_entries=0 keeps entries in the far tier only
+        self.max_entries = max_entries
+        self._far = far
+        self._far_skip_until = 0.0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def far(self) -> Optional[CacheBackend]:
+        if self._far is _DEFAULT:
+            self._far = get_shared_backend() if self.name else None
+        return self._far
+
+    @property
+    def prefix(self) -> str:
+        return f"{CACHE_NAMESPACE}:{self.name}:v{self.version}:"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        if self.name is None:
+            return self._get(key, default)
+        with span("cache.get", **{"cache.name": self.name}) as current:
+            value = self._get(key, _MISSING)
+            tier = "near"
+            if value is _MISSING:
+                value, ttl_seconds = self._far_get(key)
+                tier = "far"
+                if value is not _MISSING:
+                    # The near copy expires with the far entry, not a full ttl after this read
+                    self._set(key, value, ttl_seconds)
+            current.set_attribute("cache.hit", value is not _MISSING)
+            if value is not _MISSING:
+                current.set_attribute("cache.tier", tier)
+            return default if value is _MISSING else value
+
+    def _get(self, key: Hashable, default: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key for ttl_seconds."""
+        self._set(key, value)
+        if self.name is not None:
+            self._far_call(lambda far: far.set(
+                self.prefix + _key_text(key), json.dumps(value, ensure_ascii=False).encode(), self.ttl_seconds
+            ))
+
+    def _set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _far_get(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        data, ttl_seconds = self._far_call(lambda far: far.get_with_ttl(self.prefix + _key_text(key))) or (None, None)
+        return (_MISSING, None) if data is None else (json.loads(data), ttl_seconds)
+
+    def _far_call(self, fn):
+        far = self.far
+        if far is None or time.monotonic() < self._far_skip_until:
+            return None
+        try:
+            return fn(far)
+        except Exception as e:
+            logger.warning(f"Cache {self.name} far tier unavailable for {FAR_RETRY_SECONDS}s: {e}")
+            self._far_skip_until = time.monotonic() + FAR_RETRY_SECONDS
+            return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.name is not None:
+            self._far_call(lambda far: far.clear(self.prefix))
+
+    def __len__(self) -> int:
+        return len(self._entries)
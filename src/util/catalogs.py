@@ -0,0 +1,254 @@
+"""
+Reference catalogs (cities, ports, countries, rivers, vessels, companies, directions).
+
+Catalogs are served from memory. On a cold start they come from a binary snapshot file that is
+memory-mapped and decoded per catalog on first use, so no catalog is downloaded before the first
+answer; catalogs missing from the snapshot are read from the shared cache tier or fetched from
+center.cruises. A background thread refreshes all catalogs, rewrites the snapshot and publishes
+them to the shared cache tier for other workers and instances.
+
+Build a snapshot (devops/build.sh bakes one into the image):
+    python -m src.util.catalogs build [--output PATH]
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.util import upstream
+from src.util.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ENDPOINTS = {
+    "cities": "/api/filter/cruise-cities.json",
+    "ports": "/api/filter/cruise-ports.json",
+    "countries": "/api/filter/cruise-countries.json",
+    "rivers": "/api/filter/cruise-rivers.json",
+    "vessels": "/api/filter/cruise-vessels.json",
+    "companies": "/api/filter/cruise-companies.json",
+    "directions": "/api/filter/cruise-categories.json",
+}
+
+# src/util -> repository root
+BASE_DIR = Path(__file__).resolve().parents[2]
+SNAPSHOT_PATH = Path(os.getenv("CATALOG_SNAPSHOT_PATH", str(BASE_DIR / "data" / "catalogs" / "catalogs.snapshot")))
+REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", str(6 * 3600)))
+
+# Snapshot layout: header, table of contents, then one zlib-compressed JSON blob per catalog
+_MAGIC = b"CCAT"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHd")  # magic, format version, catalog count, created_at
+_ENTRY = struct.Struct("<16sQQ")  # catalog name, blob offset, blob length
+
+
+def build_catalog(items: List[dict]) -> dict:
+    """Catalog record stored in memory and in snapshots: raw items plus a lowercase text -> id index."""
+    index = {}
+    for item in items:
+        text = str(item.get("text", "")).lower().strip()
+        if text and text not in index:
+            index[text] = item.get("id")
+    return {"items": items, "index": index}
+
+
+class CatalogSnapshot:
+    """Read-only view of a snapshot file, catalogs are decoded from the memory map on first access."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, self.created_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot {path}")
+
+        self._entries = {}
+        for i in range(count):
+            name, offset, length = _ENTRY.unpack_from(self._mm, _HEADER.size + i * _ENTRY.size)
+            self._entries[name.rstrip(b"\0").decode()] = (offset, length)
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def load(self, name: str) -> Optional[dict]:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(zlib.decompress(self._mm[offset:offset + length]))
+
+
+def write_snapshot(path: Path, catalogs: Dict[str, dict]) -> None:
+    """Atomically write catalogs (name -> build_catalog record) to a snapshot file."""
+    blobs = [
+        (name, zlib.compress(json.dumps(catalog, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6))
+        for name, catalog in sorted(catalogs.items())
+    ]
+
+    offset = _HEADER.size + _ENTRY.size * len(blobs)
+    table = bytearray(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(blobs), time.time()))
+    for name, blob in blobs:
+        table += _ENTRY.pack(name.encode(), offset, len(blob))
+        offset += len(blob)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(table)
+        for _, blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+
+class CatalogStore:
+    """Reference catalogs served from memory, the snapshot file, the shared cache or the upstream API, in that order."""
+
+    def __init__(self, snapshot_path: Path = SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self._catalogs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self.version: Optional[str] = None
+        # Far tier only, the decoded catalogs are already kept in _catalogs
+        self._shared = TTLCache(ttl_seconds=REFRESH_INTERVAL * 2, max_entries=0, name="catalogs")
+        self._open_snapshot()
+
+    def _open_snapshot(self) -> None:
+        try:
+            self._snapshot = CatalogSnapshot(self.snapshot_path)
+            self.version = f"{self._snapshot.created_at:.0f}"
+        except FileNotFoundError:
+            self._snapshot = None
+        except Exception as e:
+            logger.error(f"Error opening catalog snapshot {self.snapshot_path}: {e}")
+            self._snapshot = None
+
+    @property
+    def snapshot_age(self) -> Optional[float]:
+        return time.time() - self._snapshot.created_at if self._snapshot else None
+
+    def preload(self) -> Dict[str, int]:
+        """Decode every catalog into memory, returns item counts of the available ones."""
+        return {name: len(self.get(name)) for name in CATALOG_ENDPOINTS if self.get(name) is not None}
+
+    def get(self, name: str) -> Optional[List[dict]]:
+        """Return catalog items, or None if the catalog is unavailable."""
+        catalog = self._catalog(name)
+        return catalog["items"] if catalog else None
+
+    def lookup(self, name: str, text: str):
+        """Exact case-insensitive lookup of an item id by its text."""
+        catalog = self._catalog(name)
+        if not catalog or not text:
+            return None
+        return catalog["index"].get(text.lower().strip())
+
+    def _catalog(self, name: str) -> Optional[dict]:
+        catalog = self._catalogs.get(name)
+        if catalog is not None:
+            return catalog
+
+        if self._snapshot is not None:
+            catalog = self._snapshot.load(name)
+        if catalog is None:
+            catalog = self._shared.get(name)
+        if catalog is None:
+            catalog = self._fetch(name)
+            if catalog is not None:
+                self._shared.set(name, catalog)
+        if catalog is not None:
+            self._catalogs[name] = catalog
+        return catalog
+
+    def _fetch(self, name: str) -> Optional[dict]:
+        try:
+            base_url = os.getenv('CRUISE_API_BASE_URL', 'https://center.cruises')
+            response = upstream.get(base_url + CATALOG_ENDPOINTS[name], hedge=False)
+            if response.status_code != 200:
+                return None
+            return build_catalog(response.json())
+        except Exception as e:
+            logger.error(f"Error loading catalog {name}: {e}")
+            return None
+
+    def refresh(self, write: bool = True) -> Dict[str, int]:
+        """Download every catalog, swap them in and rewrite the snapshot."""
+        fetched = {}
+        for name in CATALOG_ENDPOINTS:
+            catalog = self._fetch(name)
+            if catalog is not None:
+                fetched[name] = catalog
+                self._shared.set(name, catalog)
+
+        with self._lock:
+            self._catalogs.update(fetched)
+            if write and fetched:
+                # keep catalogs that failed to download from the previous snapshot
+                merged = {name: self._catalog(name) for name in CATALOG_ENDPOINTS}
+                write_snapshot(self.snapshot_path, {k: v for k, v in merged.items() if v is not None})
+                self._open_snapshot()
+
+        return {name: len(catalog["items"]) for name, catalog in fetched.items()}
+
+    def start_background_refresh(self, interval: int = REFRESH_INTERVAL) -> None:
+        """Refresh catalogs every interval seconds, right away if the snapshot is missing or stale."""
+        if self._refresh_thread is not None:
+            return
+
+        def run():
+            delay = 0 if self.snapshot_age is None or self.snapshot_age > interval else interval - self.snapshot_age
+            while True:
+                time.sleep(delay)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing catalogs: {e}")
+                delay = interval
+
+        self._refresh_thread = threading.Thread(target=run, name="catalog-refresh", daemon=True)
+        self._refresh_thread.start()
+
+
+_store: Optional[CatalogStore] = None
+_store_lock = threading.Lock()
+
+
+def get_catalog_store() -> CatalogStore:
+    """Return the process-wide catalog store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CatalogStore()
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the reference catalog snapshot")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", type=Path, default=SNAPSHOT_PATH, help="snapshot file path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = CatalogStore(args.output).refresh()
+        if len(counts) != len(CATALOG_ENDPOINTS):
+            raise SystemExit(f"Some catalogs failed to download: {sorted(set(CATALOG_ENDPOINTS) - set(counts))}")
+        print(f"Wrote {args.output}: {counts}")
+    else:
+        snapshot = CatalogSnapshot(args.output)
+        print(f"{args.output}: created {time.ctime(snapshot.created_at)}")
+        for name in snapshot.names():
+            print(f"  {name}: {len(snapshot.load(name)['items'])} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from typing import Any, Dict, List
+
+EUR_CURRENCY_ID = 2
+
+
+def index_cabin_categories(cabin_categories: List[dict]) -> Dict[Any, dict]:
+    """
+    Index vessel cabin categories by cabin_category_id.
+
+    :param cabin_categories: vesselInfoJson.cabinCategories list
+    :return: dict cabin_category_id -> category details
+    """
+    index = {}
+    for item in cabin_categories or []:
+        category = item.get('category') or {}
+        category_id = category.get('cabin_category_id')
+        if category_id is not None and category_id not in index:
+            index[category_id] = category
+    return index
+
+
+def index_prices_by_currency(price_info: List[dict]) -> Dict[Any, List[dict]]:
+    """
+    Group minPriceInfo rows by currency_id, preserving their order.
+
+    :param price_info: cruiseDateRangeInfoJson.minPriceInfo list
+    :return: dict currency_id -> price rows
+    """
+    index = {}
+    for row in price_info or []:
+        index.setdefault(row.get('currency_id'), []).append(row)
+    return index
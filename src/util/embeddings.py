@@ -0,0 +1,66 @@
+import logging
+import os
+import zlib
+from typing import List
+
+import numpy as np
+
+from src.util.text_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free CPU embedder: hashed word, word-bigram and character-trigram features.
+    Captures lexical and morphological similarity (e.g. "culture" ~ "cultural"), not synonyms.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        tokens = tokenize(text)
+        for token in tokens:
+            yield token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.3
+        for first, second in zip(tokens, tokens[1:]):
+            yield f"{first} {second}", 0.5
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += weight if (h >> 16) & 1 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEmbedder:
+    """CPU sentence-transformers model, used when CRUISE_EMBEDDING_MODEL is set and the package is installed."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+def get_embedder():
+    """Return the configured embedder, falling back to HashingEmbedder."""
+    model_name = os.getenv("CRUISE_EMBEDDING_MODEL")
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, using hashing embeddings")
+    return HashingEmbedder()
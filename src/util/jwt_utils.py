@@ -1,9 +1,6 @@
 import jwt
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-
-load_dotenv()
 
 def create_jwt_token(user_id: str = "test_user", expires_in_hours: int = 24) -> str:
     """
@@ -25,5 +22,8 @@ def create_jwt_token(user_id: str = "test_user", expires_in_hours: int = 24) ->
     return jwt.encode(payload, secret, algorithm=algorithm)
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     token = create_jwt_token(user_id="cruise_client", expires_in_hours=24*365)
     print(f"JWT Token: {token}")
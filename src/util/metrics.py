@@ -0,0 +1,286 @@
+"""
+In-process Prometheus metrics rendered by the /metrics endpoint.
+
+Counters, gauges and histograms are plain locked numbers, recording costs a dict lookup and an
+addition. Latency and token metrics are fed from finished tracing spans (see observe_span), so every
+instrumented operation reports both a span and a metric without touching call sites twice.
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from src.util import tracing
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self) -> Iterable[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value", "_lock", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function at scrape time (e.g. a queue size)."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.get())}"
+                for key, child in self._items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+ASK_DURATION = Histogram("ask_request_duration_seconds", "Latency of /ask requests", ["status"])
+ASK_IN_FLIGHT = Gauge("ask_requests_in_flight", "/ask requests being processed")
+ADMISSION_REQUESTS = Counter(
+    "admission_requests_total", "/ask admission decisions (admitted, queued, shed) and shed reasons",
+    ["outcome", "reason"]
+)
+ADMISSION_QUEUE_WAIT = Histogram("admission_queue_wait_seconds", "Time an /ask request waited for admission")
+TURN_QUEUE_WAIT = Histogram("turn_queue_wait_seconds", "Time an /ask turn waited for the previous turn of its chat")
+TURNS_COALESCED = Counter("turns_coalesced_total", "Messages answered together with an earlier queued message")
+TOOL_DURATION = Histogram("tool_call_duration_seconds", "Latency of agent tool calls", ["tool", "status"])
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Latency of upstream HTTP requests", ["host", "path", "status"]
+)
+UPSTREAM_EVENTS = Counter(
+    "upstream_resilience_events_total",
+    "Upstream retries, hedges, skipped hedges, hedge wins, short circuits, deadline stops and fixture misses",
+    ["host", "path", "event"]
+)
+UPSTREAM_BREAKER_STATE = Gauge(
+    "upstream_circuit_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", ["host", "path"]
+)
+LLM_DURATION = Histogram("llm_request_duration_seconds", "Latency of LLM calls", ["model"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by kind (input, output, cached)", ["model", "kind"])
+LLM_REQUEST_TOKENS = Histogram(
+    "llm_request_input_tokens", "Input tokens per LLM call", ["model"], buckets=TOKEN_BUCKETS
+)
+LLM_PROMPT_CACHE_RATIO = Histogram(
+    "llm_prompt_cache_ratio", "Share of input tokens served from the provider prompt cache per LLM call", ["model"],
+    buckets=RATIO_BUCKETS
+)
+MODEL_ROUTES = Counter("llm_routed_calls_total", "Agent model calls by route and model tier", ["route", "tier"])
+LLM_TIER_DURATION = Histogram("llm_tier_request_duration_seconds", "Latency of LLM calls by model tier", ["tier"])
+LLM_TIER_TOKENS = Counter("llm_tier_tokens_total", "LLM tokens by model tier and kind", ["tier", "kind"])
+DB_DURATION = Histogram("db_operation_duration_seconds", "Latency of checkpoint and history queries", ["operation"])
+POPULAR_SEARCH_REFRESHES = Counter(
+    "popular_search_refreshes_total", "Background refreshes of popular searches by outcome", ["outcome"]
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+QUEUE_DEPTH = Gauge("queue_depth", "Work waiting in a queue", ["queue"])
+
+
+def _upstream_labels(span: "tracing.Span") -> Tuple[str, str, str]:
+    url = urlsplit(span.attributes.get("url.full", ""))
+    status = span.attributes.get("http.response.status_code", "error")
+    return url.hostname or "", url.path, str(status)
+
+
+def observe_span(span: "tracing.Span") -> None:
+    """Update metrics from a finished span."""
+    name = span.name
+    duration = span.duration
+    attributes = span.attributes
+
+    if span.parent_id is None:
+        if name == "POST /ask":
+            ASK_DURATION.labels("error" if span.error else "ok").observe(duration)
+    elif name == "http.get":
+        UPSTREAM_DURATION.labels(*_upstream_labels(span)).observe(duration)
+    elif name == "llm.chat":
+        model = str(attributes.get("llm.model", ""))
+        LLM_DURATION.labels(model).observe(duration)
+        for kind in ("input", "output", "cached"):
+            tokens = attributes.get(f"llm.usage.{kind}_tokens")
+            if tokens:
+                LLM_TOKENS.labels(model, kind).inc(tokens)
+        if attributes.get("llm.usage.input_tokens"):
+            LLM_REQUEST_TOKENS.labels(model).observe(attributes["llm.usage.input_tokens"])
+            LLM_PROMPT_CACHE_RATIO.labels(model).observe(
+                (attributes.get("llm.usage.cached_tokens") or 0) / attributes["llm.usage.input_tokens"]
+            )
+        tier = attributes.get("llm.tier")
+        if tier:
+            LLM_TIER_DURATION.labels(tier).observe(duration)
+            for kind in ("input", "output", "cached"):
+                tokens = attributes.get(f"llm.usage.{kind}_tokens")
+                if tokens:
+                    LLM_TIER_TOKENS.labels(tier, kind).inc(tokens)
+    elif name == "cache.get":
+        CACHE_REQUESTS.labels(attributes.get("cache.name", ""), "hit" if attributes.get("cache.hit") else "miss").inc()
+    elif name.startswith("tool."):
+        status = "error" if span.error or attributes.get("tool.status") == "error" else "ok"
+        TOOL_DURATION.labels(attributes.get("tool.name", name[5:]), status).observe(duration)
+    elif name.startswith("db."):
+        DB_DURATION.labels(name[3:]).observe(duration)
+
+
+tracing.add_span_listener(observe_span)
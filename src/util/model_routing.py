@@ -0,0 +1,149 @@
+"""
+Routes each model call of the agent to a model tier.
+
+A step is classified from its messages (small talk, package answer, structured search,
+comparison, summarisation) and sent to the tier configured for that route: by default the fast
+tier answers small talk, package questions and summaries, the standard tier (the agent's model)
+searches and compares. Tiers and routes are configured with MODEL_TIER_<TIER>=<model> and
+MODEL_ROUTES="comparison=large,small_talk=fast".
+"""
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from src.util.agent_tracing import model_name
+from src.util.metrics import MODEL_ROUTES
+from src.util.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+SMALL_TALK = "small_talk"
+PACKAGE = "package"
+SEARCH = "structured_search"
+COMPARISON = "comparison"
+SUMMARISATION = "summarisation"
+
+DEFAULT_ROUTE_TIERS = {
+    SMALL_TALK: "fast",
+    PACKAGE: "fast",
+    SUMMARISATION: "fast",
+    SEARCH: "standard",
+    COMPARISON: "standard",
+}
+DEFAULT_TIER_MODELS = {"fast": "gpt-5-nano", "large": "gpt-5"}
+
+SMALL_TALK_MAX_LENGTH = 40
+# The whole message must be greetings and thanks. Confirmations ("yes", "да", "ok") are left out:
+# they usually answer "shall I check prices?" and the step that follows plans the tool calls
+SMALL_TALK_PATTERN = re.compile(
+    r"^(?:(?:hi|hello|hey|good (?:morning|afternoon|evening)|thanks?(?: you)?|thx|bye|goodbye"
+    r"|great|cool|привет|здравствуйте|добрый (?:день|вечер)|спасибо|благодарю|пока|отлично"
+    r"|привіт|вітаю|дякую|чудово)[\s!.,?)]*)+$"
+)
+PACKAGE_TOOLS = frozenset({"get_package_info"})
+COMPARISON_PATTERN = re.compile(
+    r"\b(compare|comparison|versus|vs|difference|better|cheaper)\b|сравн|разниц|лучше|дешевле|порівня|різниц|краще"
+)
+
+
+def _route_tiers() -> Dict[str, str]:
+    routes = dict(DEFAULT_ROUTE_TIERS)
+    for pair in filter(None, os.getenv("MODEL_ROUTES", "").split(",")):
+        route, _, tier = pair.partition("=")
+        routes[route.strip()] = tier.strip()
+    return routes
+
+
+def _tool_results(messages: List[BaseMessage]) -> List[ToolMessage]:
+    """Tool results the model is about to read, those after its last tool-calling message."""
+    results = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        results.append(message)
+    return results
+
+
+def classify_step(messages: List[BaseMessage]) -> str:
+    """Route of a model call from the messages it is about to see."""
+    if not messages:
+        return SEARCH
+    if isinstance(messages[-1], SystemMessage):
+        return SUMMARISATION
+    # Standalone package questions are answered before the agent loop (see CruiseAgent.ask), inside
+    # it the package tier writes answers from package information the model asked for
+    results = _tool_results(messages)
+    if results and all(result.name in PACKAGE_TOOLS for result in results):
+        return PACKAGE
+
+    asked = len(messages)
+    while asked and not isinstance(messages[asked - 1], HumanMessage):
+        asked -= 1
+    question = messages[asked - 1].content if asked else ""
+    text = question.lower().strip() if isinstance(question, str) else ""
+    if COMPARISON_PATTERN.search(text):
+        return COMPARISON
+    # A "small talk" turn that made the model call tools is not small talk, nor is a reply to a question
+    if len(text) <= SMALL_TALK_MAX_LENGTH and SMALL_TALK_PATTERN.match(text) \
+            and not isinstance(messages[-1], ToolMessage) and not _answers_question(messages[:asked - 1]):
+        return SMALL_TALK
+    return SEARCH
+
+
+def _answers_question(history: List[BaseMessage]) -> bool:
+    """Whether the assistant message before the user's one asked something or called tools."""
+    previous = next((m for m in reversed(history) if isinstance(m, AIMessage)), None)
+    if previous is None:
+        return False
+    content = previous.content if isinstance(previous.content, str) else ""
+    return bool(previous.tool_calls) or "?" in content
+
+
+class ModelRouter:
+    """Maps routes to tiers and tiers to chat models, created once per model name."""
+
+    def __init__(self, factory: Callable[[str], object], standard_model: str):
+        self.factory = factory
+        self.route_tiers = _route_tiers()
+        self.tier_models = {
+            **DEFAULT_TIER_MODELS,
+            "standard": standard_model,
+            **{tier: os.getenv(f"MODEL_TIER_{tier.upper()}") for tier in ("fast", "standard", "large")
+               if os.getenv(f"MODEL_TIER_{tier.upper()}")},
+        }
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def tier(self, route: str) -> str:
+        return self.route_tiers.get(route, "standard")
+
+    def model(self, route: str):
+        name = self.tier_models.get(self.tier(route), self.tier_models["standard"])
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = self.factory(name)
+        return model
+
+
+class ModelRoutingMiddleware(AgentMiddleware):
+    """Sends each model call to the model of its route's tier, place it inside TracingMiddleware."""
+
+    def __init__(self, router: ModelRouter):
+        super().__init__()
+        self.router = router
+
+    def wrap_model_call(self, request, handler):
+        route = classify_step(request.messages)
+        tier = self.router.tier(route)
+        model = self.router.model(route)
+        MODEL_ROUTES.labels(route, tier).inc()
+        current_span().set_attributes(**{"llm.model": model_name(model), "llm.route": route, "llm.tier": tier})
+        return handler(request.override(model=model))
@@ -0,0 +1,197 @@
+"""
+Keeps the most popular cruise searches warm in the search cache.
+
+Traffic is skewed toward a few search shapes (top departure ports, Mediterranean/Caribbean, the
+next 1-3 months). The warmer mines the search_cruises and search_cruises_batch tool calls of the
+newest message writes in the checkpointer (only the per-step deltas, not whole checkpoints),
+counts their filter combinations with dates taken relative to the day of the call ("from today to
+today+90"), and re-runs the top POPULAR_SEARCH_TOP_N shapes for today's dates every
+POPULAR_SEARCH_REFRESH_INTERVAL seconds, before their search cache entries expire.
+
+Results go through the two-tier search cache. With a shared cache backend one instance warms
+every instance, so only the holder of a lease in the far tier mines and refreshes; without one
+each process warms its own near tier. POPULAR_SEARCH_ENABLED=0 keeps an instance out entirely.
+
+Show the current top shapes (POSTGRES_DB_URL), --refresh also warms them:
+    python -m src.util.popular_searches [--top 20] [--refresh]
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from src.util.cache import CACHE_NAMESPACE, get_shared_backend
+from src.util.metrics import POPULAR_SEARCH_REFRESHES
+
+logger = logging.getLogger(__name__)
+
+POPULAR_SEARCH_ENABLED = os.getenv("POPULAR_SEARCH_ENABLED", "1") == "1"
+POPULAR_SEARCH_TOP_N = int(os.getenv("POPULAR_SEARCH_TOP_N", "20"))
+# Message writes (one per agent step) read per mining run, newest first
+POPULAR_SEARCH_SCAN = int(os.getenv("POPULAR_SEARCH_SCAN", "2000"))
+POPULAR_SEARCH_MINE_INTERVAL = int(os.getenv("POPULAR_SEARCH_MINE_INTERVAL", "3600"))
+# Shorter than the search cache TTL so popular entries never expire
+POPULAR_SEARCH_REFRESH_INTERVAL = int(os.getenv(
+    "POPULAR_SEARCH_REFRESH_INTERVAL", str(int(os.getenv("SEARCH_CACHE_TTL", "300")) * 4 // 5)
+))
+
+DATE_ARGUMENTS = ("time_from_date", "time_to_date")
+LEASE_KEY = f"{CACHE_NAMESPACE}:popular_searches:lease"
+
+
+def _search_calls(message) -> Iterable[dict]:
+    """search_cruises arguments of the tool calls of a message, batch queries one by one."""
+    for call in getattr(message, "tool_calls", None) or []:
+        if call["name"] == "search_cruises":
+            yield call.get("args") or {}
+        elif call["name"] == "search_cruises_batch":
+            yield from ((call.get("args") or {}).get("queries") or [])
+
+
+def search_shape(arguments: dict, day: date) -> Optional[str]:
+    """Key of a search, dates as day offsets from the day it was made, None for searches of the past."""
+    from src.agent_tools.advanced_api_search import _SEARCH_PARAMETERS
+
+    shape = {}
+    for name, value in (arguments or {}).items():
+        if name not in _SEARCH_PARAMETERS or value is None:
+            continue
+        if name in DATE_ARGUMENTS:
+            try:
+                value = {"days": (date.fromisoformat(value) - day).days}
+            except (TypeError, ValueError):
+                return None
+            if value["days"] < 0:
+                return None
+        shape[name] = value
+    return json.dumps(shape, sort_keys=True, ensure_ascii=False)
+
+
+def search_arguments(shape: str, day: date) -> dict:
+    """search_cruises arguments of a shape for searches made on day."""
+    arguments = json.loads(shape)
+    for name in DATE_ARGUMENTS:
+        if name in arguments:
+            arguments[name] = (day + timedelta(days=arguments[name]["days"])).isoformat()
+    return arguments
+
+
+def mine_search_shapes(checkpointer, scan: int = POPULAR_SEARCH_SCAN) -> Counter:
+    """Search shapes of the newest message writes, counted once per tool call."""
+    counts: Counter = Counter()
+    for _, ts, messages in checkpointer.recent_writes("messages", scan):
+        day = datetime.fromisoformat(ts).date()
+        for message in messages if isinstance(messages, list) else [messages]:
+            for arguments in _search_calls(message):
+                shape = search_shape(arguments, day)
+                if shape is not None:
+                    counts[shape] += 1
+    return counts
+
+
+class PopularSearchWarmer:
+    """Mines popular search shapes and keeps their results in the search cache."""
+
+    def __init__(self, checkpointer: Callable[[], object], top_n: int = POPULAR_SEARCH_TOP_N,
+                 scan: int = POPULAR_SEARCH_SCAN, mine_interval: int = POPULAR_SEARCH_MINE_INTERVAL):
+        self.checkpointer = checkpointer
+        self.top_n = top_n
+        self.scan = scan
+        self.mine_interval = mine_interval
+        self.shapes: List[str] = []
+        self.mined_at: Optional[float] = None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}".encode()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    def is_refresher(self, ttl_seconds: float) -> bool:
+        """Take or renew the refresher lease of the shared cache backend, always True without one."""
+        backend = get_shared_backend()
+        if backend is None:
+            return True
+        try:
+            return backend.acquire(LEASE_KEY, self.owner, ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Error taking the popular search lease: {e}")
+            return False
+
+    def mine(self) -> List[str]:
+        """Re-read the top shapes, keeps the previous ones while the checkpointer is not available."""
+        checkpointer = self.checkpointer()
+        if checkpointer is None:
+            return self.shapes
+        counts = mine_search_shapes(checkpointer, self.scan)
+        self.shapes = [shape for shape, _ in counts.most_common(self.top_n)]
+        self.mined_at = time.monotonic()
+        logger.info(f"Mined {len(counts)} search shapes, keeping the top {len(self.shapes)} warm")
+        return self.shapes
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-run every popular search for today's dates, returns the cruises found per shape."""
+        from src.agent_tools.advanced_api_search import refresh_search
+
+        if self.mined_at is None or time.monotonic() - self.mined_at >= self.mine_interval:
+            self.mine()
+
+        today = date.today()
+        found = {}
+        for shape in self.shapes:
+            try:
+                found[shape] = refresh_search(**search_arguments(shape, today))
+                POPULAR_SEARCH_REFRESHES.labels("ok").inc()
+            except Exception as e:
+                logger.warning(f"Error refreshing popular search {shape}: {e}")
+                POPULAR_SEARCH_REFRESHES.labels("error").inc()
+        return found
+
+    def start_background_refresh(self, interval: int = POPULAR_SEARCH_REFRESH_INTERVAL) -> None:
+        """Refresh popular searches right away, then every interval seconds."""
+        if self._refresh_thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    # Held across two intervals, another instance takes over once the refresher stops
+                    if self.is_refresher(2 * interval):
+                        self.refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing popular searches: {e}")
+                time.sleep(interval)
+
+        self._refresh_thread = threading.Thread(target=run, name="popular-search-refresh", daemon=True)
+        self._refresh_thread.start()
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from src.util.agent_tracing import TracedPostgresSaver
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Most popular search shapes of recent conversations")
+    parser.add_argument("--top", type=int, default=POPULAR_SEARCH_TOP_N)
+    parser.add_argument("--scan", type=int, default=POPULAR_SEARCH_SCAN)
+    parser.add_argument("--refresh", action="store_true", help="also warm the search cache with them")
+    args = parser.parse_args()
+
+    with TracedPostgresSaver.from_conn_string(os.getenv("POSTGRES_DB_URL", "")) as checkpointer:
+        counts = mine_search_shapes(checkpointer, args.scan)
+    for shape, count in counts.most_common(args.top):
+        print(f"{count:>6} {shape}")
+    if args.refresh:
+        warmer = PopularSearchWarmer(lambda: None, top_n=args.top)
+        warmer.shapes = [shape for shape, _ in counts.most_common(args.top)]
+        warmer.mined_at = time.monotonic()
+        for shape, found in warmer.refresh().items():
+            print(f"refreshed {found:>4} cruises {shape}")
+
+
+if __name__ == "__main__":
+    main()
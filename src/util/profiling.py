@@ -0,0 +1,204 @@
+"""
+Opt-in per-request profiling.
+
+A /ask request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is picked by
+PROFILE_SAMPLE_RATE. It records a CPU profile (cProfile of the request thread and of the tool
+threads it runs on) and a tracemalloc allocation snapshot, stored under PROFILE_DIR by a profile id
+generated on the server (returned in X-Profile-Id). tracemalloc is process-wide: the snapshot holds
+every allocation made while the request ran, including those of concurrent requests.
+Only one request is profiled at a time; when disabled the cost is one random() call per request.
+
+    python -m src.util.profiling list
+    python -m src.util.profiling show <profile_id> [--sort cumulative] [--limit 30] [--allocations 15]
+"""
+import argparse
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# src/util -> repository root
+BASE_DIR = Path(__file__).resolve().parents[2]
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "data" / "profiles")))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+TRACEMALLOC_FRAMES = 10
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_active: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("active_profile", default=None)
+_profiling_lock = threading.Lock()
+
+
+class RequestProfile:
+    """CPU profiles of every thread that worked on one request."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Run fn under a cProfile of the current thread, merged into this request's profile."""
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def should_profile(header: Optional[str]) -> Optional[str]:
+    """Return the trigger ("header" or "sample") if this request should be profiled."""
+    if header and PROFILE_TOKEN and hmac.compare_digest(header.encode(), PROFILE_TOKEN.encode()):
+        return "header"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def run_profiled(fn: Callable, *args, **kwargs):
+    """Run fn in a worker thread of the current request, profiled if the request is."""
+    profile = _active.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    return profile.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def profile_request(request_id: str, trigger: Optional[str], **metadata):
+    """Profile the block if trigger is set and no other request is being profiled; yields the profile id or None."""
+    if not trigger or not _profiling_lock.acquire(blocking=False):
+        yield None
+        return
+
+    profile_id = uuid.uuid4().hex
+    profile = RequestProfile(request_id)
+    token = _active.set(profile)
+    started_at = time.time()
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    main = cProfile.Profile()
+    profile._profiles.append(main)
+    main.enable()
+    try:
+        yield profile_id
+    finally:
+        main.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        _active.reset(token)
+        _profiling_lock.release()
+        try:
+            _save(profile, snapshot, {
+                "profile_id": profile_id,
+                "request_id": request_id,
+                "trigger": trigger,
+                "started_at": started_at,
+                "duration_seconds": round(time.time() - started_at, 3),
+                "tracemalloc_scope": "process",
+                **metadata,
+            })
+        except Exception as e:
+            logger.error(f"Failed to save profile of request {request_id}: {e}")
+
+
+def _save(profile: RequestProfile, snapshot: tracemalloc.Snapshot, metadata: dict) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile_id = metadata["profile_id"]
+    profile.stats().dump_stats(_profile_path(profile_id, ".prof"))
+    snapshot.dump(str(_profile_path(profile_id, ".tracemalloc")))
+    _profile_path(profile_id, ".json").write_text(json.dumps(metadata), encoding="utf-8")
+    logger.info(f"Saved profile {profile_id} of request {metadata['request_id']} to {PROFILE_DIR}")
+
+    for old in list_profiles()[PROFILE_MAX_FILES:]:
+        for suffix in (".json", ".prof", ".tracemalloc"):
+            _profile_path(old["profile_id"], suffix).unlink(missing_ok=True)
+
+
+def _profile_path(profile_id: str, suffix: str) -> Path:
+    """File of a profile, profile ids never contain path separators."""
+    if not PROFILE_ID_PATTERN.match(profile_id or ""):
+        raise ValueError(f"Invalid profile id {profile_id!r}")
+    return PROFILE_DIR / f"{profile_id}{suffix}"
+
+
+def list_profiles() -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    profiles = []
+    for path in PROFILE_DIR.glob("*.json"):
+        try:
+            metadata = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if PROFILE_ID_PATTERN.match(str(metadata.get("profile_id", ""))):
+            profiles.append(metadata)
+    return sorted(profiles, key=lambda p: p.get("started_at", 0), reverse=True)
+
+
+def render_profile(profile_id: str, sort: str = "cumulative", limit: int = 30, allocations: int = 15) -> str:
+    """Text report of a stored profile: top functions and top allocation sites."""
+    out = io.StringIO()
+    metadata = json.loads(_profile_path(profile_id, ".json").read_text(encoding="utf-8"))
+    out.write(" ".join(f"{key}={value}" for key, value in metadata.items()) + "\n\n")
+
+    stats = pstats.Stats(str(_profile_path(profile_id, ".prof")), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+    snapshot = tracemalloc.Snapshot.load(str(_profile_path(profile_id, ".tracemalloc")))
+    out.write(f"Top {allocations} allocation sites still alive at the end of the request "
+              f"(whole process, concurrent requests included):\n")
+    for stat in snapshot.statistics("lineno")[:allocations]:
+        out.write(f"  {stat}\n")
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and render per-request profiles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list stored profiles, newest first")
+    show = commands.add_parser("show", help="render one profile")
+    show.add_argument("profile_id")
+    show.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, calls)")
+    show.add_argument("--limit", type=int, default=30, help="functions to show")
+    show.add_argument("--allocations", type=int, default=15, help="allocation sites to show")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for metadata in list_profiles():
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metadata.get("started_at", 0)))
+            print(f"{started}  {metadata['profile_id']}  {metadata.get('duration_seconds', 0):7.2f}s  "
+                  f"{metadata.get('trigger', '')}  request_id={metadata['request_id']}  "
+                  f"chat_id={metadata.get('chat_id', '')}")
+    else:
+        print(render_profile(args.profile_id, args.sort, args.limit, args.allocations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Prompt layout for provider-side prompt prefix caching.
+
+OpenAI caches the longest previously seen prompt prefix (in 128-token steps from 1024 tokens), so
+every model call should start with the same bytes: the system prompt, then the tool schemas, and
+only then anything that varies per turn (summary context, conversation). The agent already passes
+one system prompt and a fixed tool list, so PromptLayoutMiddleware mostly re-pins the same values
+(tools sorted by name, in case another middleware changes them) and records the composition of
+each prompt on its llm.chat span; the provider's cached-token count is recorded next to it by
+TracingMiddleware.
+
+The cache is kept per model, so every tier switch of ModelRoutingMiddleware starts from a cold
+prefix on the other model; that costs more cache hits than tool order does. The report therefore
+also breaks cache hits down per tier and model.
+
+Report prompt composition and cache hits per turn from the exported traces (TRACE_EXPORT_PATH):
+    python -m src.util.prompt_layout [--traces PATH] [--last N]
+"""
+import argparse
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.util.tracing import TRACE_EXPORT_PATH, current_span
+
+
+def _tool_name(tool) -> str:
+    return getattr(tool, "name", None) or getattr(tool, "__name__", None) or str(tool)
+
+
+def _message_chars(message) -> int:
+    content = message.content
+    return len(content) if isinstance(content, str) else len(json.dumps(content, ensure_ascii=False))
+
+
+class PromptLayoutMiddleware(AgentMiddleware):
+    """Pins the system prompt and name-sorted tools on each model call and records the prompt composition."""
+
+    def __init__(self, system_prompt: str):
+        super().__init__()
+        self.system_prompt = system_prompt
+        self._tool_schemas: Dict[Tuple[str, ...], str] = {}
+
+    def _schemas(self, tools) -> str:
+        names = tuple(_tool_name(tool) for tool in tools)
+        schemas = self._tool_schemas.get(names)
+        if schemas is None:
+            schemas = json.dumps([convert_to_openai_tool(tool) for tool in tools], ensure_ascii=False, sort_keys=True)
+            self._tool_schemas[names] = schemas
+        return schemas
+
+    def wrap_model_call(self, request, handler):
+        tools = sorted(request.tools or [], key=_tool_name)
+        schemas = self._schemas(tools)
+
+        messages = request.messages
+        context = 0
+        while context < len(messages) and isinstance(messages[context], SystemMessage):
+            context += 1
+        current_span().set_attributes(**{
+            "llm.prompt.prefix_hash": hashlib.sha1((self.system_prompt + schemas).encode()).hexdigest()[:12],
+            "llm.prompt.system_chars": len(self.system_prompt),
+            "llm.prompt.tools_chars": len(schemas),
+            "llm.prompt.context_chars": sum(_message_chars(m) for m in messages[:context]),
+            "llm.prompt.history_chars": sum(_message_chars(m) for m in messages[context:]),
+        })
+        return handler(request.override(system_prompt=self.system_prompt, tools=tools))
+
+
+def _attribute_value(value: dict):
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def load_llm_calls(path: str) -> List[dict]:
+    """llm.chat spans of exported OTLP/JSON traces, with their request and chat ids."""
+    calls = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for s in scope.get("spans", []):
+                        if s["name"] == "llm.chat":
+                            calls.append({a["key"]: _attribute_value(a["value"]) for a in s.get("attributes", [])})
+    return calls
+
+
+def render_report(calls: List[dict], last: Optional[int] = None) -> str:
+    """Per-call prompt composition and cache hits, then totals and cache hits per tier and model."""
+    shown = calls[-last:] if last else calls
+    lines = [f"{'request':<34} {'route':<18} {'prefix':<12} {'system':>7} {'tools':>7} {'context':>8} "
+             f"{'history':>8} {'input':>7} {'cached':>7} {'hit':>5}"]
+    for call in shown:
+        input_tokens = call.get("llm.usage.input_tokens") or 0
+        cached = call.get("llm.usage.cached_tokens") or 0
+        lines.append(
+            f"{str(call.get('request_id', '')):<34} {str(call.get('llm.route', '')):<18} "
+            f"{str(call.get('llm.prompt.prefix_hash', '')):<12} {call.get('llm.prompt.system_chars', 0):>7} "
+            f"{call.get('llm.prompt.tools_chars', 0):>7} {call.get('llm.prompt.context_chars', 0):>8} "
+            f"{call.get('llm.prompt.history_chars', 0):>8} {input_tokens:>7} {cached:>7} "
+            f"{(cached / input_tokens if input_tokens else 0):>5.0%}"
+        )
+
+    total_input = sum(c.get("llm.usage.input_tokens") or 0 for c in calls)
+    total_cached = sum(c.get("llm.usage.cached_tokens") or 0 for c in calls)
+    prefixes = {c.get("llm.prompt.prefix_hash") for c in calls if c.get("llm.prompt.prefix_hash")}
+    prompt_chars = sum(sum(c.get(f"llm.prompt.{part}_chars", 0) for part in ("system", "tools", "context", "history"))
+                       for c in calls)
+    prefix_chars = sum(c.get("llm.prompt.system_chars", 0) + c.get("llm.prompt.tools_chars", 0) for c in calls)
+    lines.append("")
+    lines.append(
+        f"{len(calls)} calls, {len(prefixes)} distinct prefixes, stable prefix {prefix_chars / max(prompt_chars, 1):.0%} "
+        f"of prompt characters, {total_cached}/{total_input} input tokens cached "
+        f"({total_cached / max(total_input, 1):.0%})"
+    )
+
+    tiers: Dict[Tuple[str, str], List[int]] = {}
+    for c in calls:
+        totals = tiers.setdefault((str(c.get("llm.tier", "")), str(c.get("llm.model", ""))), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += c.get("llm.usage.cached_tokens") or 0
+        totals[2] += c.get("llm.usage.input_tokens") or 0
+    for (tier, model), (count, cached, input_tokens) in sorted(tiers.items()):
+        lines.append(f"tier {tier or '-'} ({model or '-'}): {count} calls, {cached}/{input_tokens} input tokens cached "
+                     f"({cached / max(input_tokens, 1):.0%})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt composition and prompt cache hits per model call")
+    parser.add_argument("--traces", default=TRACE_EXPORT_PATH, help="OTLP/JSON lines file (TRACE_EXPORT_PATH)")
+    parser.add_argument("--last", type=int, default=50, help="model calls to list, 0 for all")
+    args = parser.parse_args()
+    if not args.traces:
+        raise SystemExit("No trace file, set TRACE_EXPORT_PATH or pass --traces")
+    print(render_report(load_llm_calls(args.traces), args.last or None))
+
+
+if __name__ == "__main__":
+    main()
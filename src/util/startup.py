@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from src.util.agent_utils import AgentTimer
+
+logger = logging.getLogger(__name__)
+
+# (name, function, required): a failing required step keeps the instance not ready
+WarmupStep = Tuple[str, Callable[[], object], bool]
+
+
+class StartupState:
+    """Warm-up progress and timings reported by the health endpoints."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.finished = False
+        self.timer = AgentTimer()
+        self.errors = {}
+        self._done = threading.Event()
+
+    def run(self, steps: List[WarmupStep]) -> bool:
+        """Run warm-up steps in order and mark the instance ready if every required step succeeded."""
+        for name, step, required in steps:
+            try:
+                with self.timer.time(name):
+                    step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.error(f"Warm-up step {name} failed: {e}")
+                if required:
+                    break
+
+        self.ready = not any(name in self.errors for name, _, required in steps if required)
+        self.finished = True
+        self._done.set()
+        self.log_summary()
+        return self.ready
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until warm-up finished, returns readiness."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def log_summary(self) -> None:
+        breakdown = ", ".join(f"{name}={duration:.2f}s" for name, duration in self.timer.timings.items())
+        logger.info(f"Startup {'ready' if self.ready else 'NOT ready'} in {self.uptime:.2f}s: {breakdown}")
+
+    @property
+    def uptime(self) -> float:
+        return time.time() - self.started_at
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warming_up": not self.finished,
+            "uptime_seconds": round(self.uptime, 2),
+            "timings": {name: round(duration, 3) for name, duration in self.timer.timings.items()},
+            "errors": self.errors,
+        }
@@ -0,0 +1,119 @@
+"""
+Per-tool timeouts for agent tool calls.
+
+Python threads cannot be interrupted, so a tool that times out keeps running in the background
+on the shared executor after the agent has moved on with "no data". To bound that, the tool runs
+inside an upstream deadline() of the same length: its HTTP timeouts, retries and backoff are cut
+to the time left, and it fails on its next upstream call once the timeout has passed.
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+
+from src.util import upstream
+from src.util.metrics import QUEUE_DEPTH
+from src.util.profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+# Tool calls of one model step already run concurrently in the agent's ToolNode;
+# this caps how many of them run at once for a single request.
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+TOOL_TIMEOUTS = {
+    "search_cruises": 45.0,
+    "search_cruises_batch": 60.0,
+    "get_current_date": 1.0,
+    "get_package_info": 5.0,
+}
+
+# Shared by all requests, bounds the total number of tool calls in flight per process
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TOOL_EXECUTOR_WORKERS", "32")),
+    thread_name_prefix="agent-tool"
+)
+
+
+class _ExecutorCounts:
+    """Tool calls submitted to, started and completed on the shared executor."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+
+    def submit(self):
+        with self._lock:
+            self.submitted += 1
+
+    def start(self):
+        with self._lock:
+            self.started += 1
+
+    def complete(self):
+        with self._lock:
+            self.completed += 1
+
+    @property
+    def waiting(self) -> int:
+        return self.submitted - self.started
+
+    @property
+    def running(self) -> int:
+        return self.started - self.completed
+
+
+_counts = _ExecutorCounts()
+QUEUE_DEPTH.labels("tool_executor").set_function(lambda: _counts.waiting)
+
+
+def _run_tool(timeout: float, handler, request):
+    _counts.start()
+    try:
+        with upstream.deadline(timeout):
+            return run_profiled(handler, request)
+    finally:
+        _counts.complete()
+
+
+class ToolExecutionMiddleware(AgentMiddleware):
+    """
+    Runs each tool call with a per-tool timeout on the shared tool executor.
+
+    A timed out call is answered with an error ToolMessage while its thread finishes in the
+    background, bounded by the upstream deadline of the same length.
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, default_timeout: float = DEFAULT_TOOL_TIMEOUT):
+        super().__init__()
+        self.timeouts = {**TOOL_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+
+    def wrap_tool_call(self, request, handler):
+        name = request.tool_call["name"]
+        timeout = self.timeouts.get(name, self.default_timeout)
+
+        _counts.submit()
+        future = _executor.submit(contextvars.copy_context().run, _run_tool, timeout, handler, request)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                # Never started, it will not run at all
+                _counts.start()
+                _counts.complete()
+            logger.warning(f"Tool {name} timed out after {timeout:.0f}s, {_counts.running} tool calls still running")
+            return ToolMessage(
+                content="no data",
+                tool_call_id=request.tool_call["id"],
+                name=name,
+                status="error"
+            )
@@ -0,0 +1,243 @@
+"""
+Per-request tracing.
+
+Spans cover request phases, LLM calls, tool calls, upstream HTTP requests, database queries and
+cache lookups. They are recorded only inside a trace opened with start_trace (one per /ask request),
+elsewhere span() is a no-op. Every finished trace is logged as a one-line latency breakdown and
+exported as OTLP/JSON, the OpenTelemetry collector format:
+- TRACE_EXPORT_PATH: append one OTLP/JSON document per trace to this file (JSON lines)
+- OTEL_EXPORTER_OTLP_ENDPOINT: POST every trace to {endpoint}/v1/traces
+"""
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "cruise-ai-agent")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_span_listeners: List[Callable[["Span"], None]] = []
+_file_lock = threading.Lock()
+_otlp_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+
+class Trace:
+    """Spans of one request, correlated by trace id and the request attributes (request_id, chat_id)."""
+
+    def __init__(self, attributes: Dict[str, Any]):
+        self.trace_id = secrets.token_hex(16)
+        self.attributes = attributes
+        self.spans: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class _NoopSpan:
+    """Returned by span() outside a trace."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def _activate(span: Span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        span.trace.add(span)
+        _current_span.reset(token)
+        for listener in _span_listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.warning(f"Span listener failed: {e}")
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Record a child span of the current span, a no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _activate(Span(parent.trace, name, parent.span_id, kind, attributes)) as current:
+        yield current
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Open a trace with a root span, export it when the block exits."""
+    trace = Trace({key: value for key, value in attributes.items() if value is not None})
+    try:
+        with _activate(Span(trace, name, None, KIND_SERVER, dict(trace.attributes))) as root:
+            yield root
+    finally:
+        export(trace)
+
+
+def add_span_listener(listener: Callable[[Span], None]) -> None:
+    """Call listener with every finished span (used to derive metrics)."""
+    if listener not in _span_listeners:
+        _span_listeners.append(listener)
+
+
+def current_span() -> "Span":
+    """The innermost open span, NOOP_SPAN outside a trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current else None
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """
+    Wrap fn to run in executor threads with the context variables of the caller at wrap time.
+
+    Spans it opens join the current trace, and the upstream deadline and request profile carry over.
+    Each call runs in its own copy, so calls can run in several threads at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def summarize(trace: Trace) -> str:
+    """One-line latency breakdown: total, then time and count per span name."""
+    root = next((s for s in trace.spans if s.parent_id is None), None)
+    totals: Dict[str, List[float]] = {}
+    for s in trace.spans:
+        if s is not root:
+            entry = totals.setdefault(s.name, [0.0, 0])
+            entry[0] += s.duration
+            entry[1] += 1
+    parts = [f"{name}={duration:.2f}s" + (f"x{count}" if count > 1 else "")
+             for name, (duration, count) in sorted(totals.items(), key=lambda item: -item[1][0])]
+    context = " ".join(f"{key}={value}" for key, value in trace.attributes.items())
+    total = root.duration if root else 0.0
+    return f"trace {trace.trace_id} {context} total={total:.2f}s: {', '.join(parts)}"
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(trace: Trace) -> dict:
+    """Convert a trace to an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": _otlp_attributes({**trace.attributes, **s.attributes}),
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "src.util.tracing"}, "spans": spans}],
+    }]}
+
+
+def _post_otlp(payload: str) -> None:
+    import requests
+
+    try:
+        requests.post(
+            OTLP_ENDPOINT.rstrip("/") + "/v1/traces",
+            data=payload, headers={"Content-Type": "application/json"}, timeout=5
+        )
+    except Exception as e:
+        logger.warning(f"Failed to export trace: {e}")
+
+
+def export(trace: Trace) -> None:
+    """Log the trace summary and send it to the configured exporters."""
+    logger.info(summarize(trace))
+    if not TRACE_EXPORT_PATH and not OTLP_ENDPOINT:
+        return
+
+    payload = json.dumps(to_otlp(trace), ensure_ascii=False)
+    if TRACE_EXPORT_PATH:
+        try:
+            with _file_lock, open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+                f.write(payload + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to write trace to {TRACE_EXPORT_PATH}: {e}")
+    if OTLP_ENDPOINT:
+        _otlp_executor.submit(_post_otlp, payload)
@@ -0,0 +1,36 @@
+import logging
+import os
+import urllib.parse
+
+from src.util import upstream
+from src.util.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single?client=gtx&sl=auto&tl=ru&dt=t&q={}"
+
+# Place names translate the same way every time, keep them for a week
+_translation_cache = TTLCache(
+    ttl_seconds=int(os.getenv("TRANSLATION_CACHE_TTL", str(7 * 24 * 3600))), max_entries=4096, name="translation"
+)
+
+
+def translate_to_russian(text: str) -> str:
+    """Translate text to Russian with Google Translate, returns text unchanged if that fails."""
+    key = text.strip().lower()
+    cached = _translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = upstream.get(TRANSLATE_URL.format(urllib.parse.quote(text)))
+        if response.status_code != 200:
+            return text
+        result = response.json()
+        translated = result[0][0][0] if result and result[0] and result[0][0] else text
+    except Exception as e:
+        logger.error(f"Error translating {text!r}: {e}")
+        return text
+
+    _translation_cache.set(key, translated)
+    return translated
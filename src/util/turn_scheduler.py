@@ -0,0 +1,115 @@
+"""
+Per-chat turn scheduling for /ask.
+
+Turns of the same chat_id run one at a time so they never read the same checkpoint and race on its
+writes (or summarise and delete the thread under each other); turns of different chats run in
+parallel on the ask executor. Messages that arrive while their chat is busy wait in the chat's
+queue, and with TURN_COALESCE (default) all of them are answered by a single run of the joined
+messages when the running turn finishes: the last of them gets the answer, the others get
+COALESCED so that the client shows the answer once.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from src.util.metrics import QUEUE_DEPTH, TURN_QUEUE_WAIT, TURNS_COALESCED
+
+logger = logging.getLogger(__name__)
+
+ASK_WORKERS = int(os.getenv("ASK_WORKERS", "32"))
+TURN_COALESCE = os.getenv("TURN_COALESCE", "1") == "1"
+
+# Result of a turn whose message was answered together with a later message of its chat
+COALESCED = object()
+
+
+@dataclass
+class _Turn:
+    message: str
+    run: Callable[[str], Any]
+    future: asyncio.Future
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class TurnScheduler:
+    """Serialises turns per chat on the event loop and runs them on a thread pool."""
+
+    def __init__(self, executor: Optional[Executor] = None, coalesce: bool = TURN_COALESCE):
+        self.executor = executor or ThreadPoolExecutor(max_workers=ASK_WORKERS, thread_name_prefix="ask")
+        self.coalesce = coalesce
+        self._queues: Dict[str, List[_Turn]] = {}
+        self._drains: Set[asyncio.Task] = set()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(turns) for turns in self._queues.values())
+
+    async def submit(self, chat_id: str, message: str, run: Callable[[str], Any]) -> Any:
+        """
+        Run run(message) once no other turn of chat_id is running and return its result.
+
+        run is called in a worker thread with the context of the submitting request, with the
+        joined messages if the turn was coalesced with others. Only the last turn of a coalesced
+        batch gets the result, the earlier ones get COALESCED.
+        """
+        turn = _Turn(message, run, asyncio.get_running_loop().create_future())
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            self._queues[chat_id] = [turn]
+            task = asyncio.create_task(self._drain(chat_id))
+            self._drains.add(task)
+            task.add_done_callback(self._drains.discard)
+        else:
+            queue.append(turn)
+        return await turn.future
+
+    async def _drain(self, chat_id: str) -> None:
+        queue = self._queues[chat_id]
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Callers that gave up while waiting are dropped before their turn runs
+                queue[:] = [turn for turn in queue if not turn.future.done()]
+                if not queue:
+                    return
+                batch = queue[:] if self.coalesce else queue[:1]
+                del queue[:len(batch)]
+
+                started = time.perf_counter()
+                for turn in batch:
+                    TURN_QUEUE_WAIT.observe(started - turn.enqueued_at)
+                if len(batch) > 1:
+                    TURNS_COALESCED.inc(len(batch) - 1)
+                    logger.info(f"Coalesced {len(batch)} messages of chat {chat_id} into one turn")
+
+                first = batch[0]
+                message = "\n".join(turn.message for turn in batch)
+                try:
+                    result = await loop.run_in_executor(self.executor, first.context.run, first.run, message)
+                except Exception as e:
+                    for turn in batch:
+                        if not turn.future.done():
+                            turn.future.set_exception(e)
+                else:
+                    for turn in batch:
+                        if not turn.future.done():
+                            turn.future.set_result(result if turn is batch[-1] else COALESCED)
+        finally:
+            self._queues.pop(chat_id, None)
+
+
+_scheduler: Optional[TurnScheduler] = None
+
+
+def get_turn_scheduler() -> TurnScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TurnScheduler()
+        QUEUE_DEPTH.labels("chat_turns").set_function(lambda: _scheduler.waiting)
+    return _scheduler
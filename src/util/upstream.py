@@ -0,0 +1,334 @@
+"""
+Client for the upstream HTTP APIs (center.cruises, Google Translate).
+
+Every GET goes through a circuit breaker of its endpoint (host and path), is retried with jittered
+backoff on connection errors, timeouts and 5xx responses, and once the endpoint has enough latency
+samples it is hedged: a duplicate request starts when the first one is slower than the endpoint's
+p95 and whichever answers first wins. Only duplicates use the bounded hedge pool, and none is sent
+while the pool is busy. Each attempt records an http.get span. Responses can be
+recorded to and replayed from a fixture store, see src.util.upstream_fixtures.
+
+Inside a deadline() block (tool calls, see src.util.tool_execution) request timeouts, backoff and
+retries are cut to the time left, so a call whose caller gave up stops soon after instead of
+holding its thread for every retry.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Deque, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+
+from src.util import upstream_fixtures
+from src.util.metrics import UPSTREAM_BREAKER_STATE, UPSTREAM_EVENTS
+from src.util.tracing import KIND_CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+# Search URLs carry every filter, keep enough of them to tell slow queries apart
+MAX_TRACED_URL_LENGTH = 1000
+
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2.0"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))
+UPSTREAM_HEDGING = os.getenv("UPSTREAM_HEDGING", "1") == "1"
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+LATENCY_WINDOW = 200
+
+# Largest page of the center.cruises filter API
+PAGE_SIZE = 100
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+UPSTREAM_HEDGE_WORKERS = int(os.getenv("UPSTREAM_HEDGE_WORKERS", "16"))
+_hedge_executor = ThreadPoolExecutor(max_workers=UPSTREAM_HEDGE_WORKERS, thread_name_prefix="upstream-hedge")
+# Taken before submitting a duplicate so that duplicates never queue behind each other
+_hedge_slots = threading.BoundedSemaphore(UPSTREAM_HEDGE_WORKERS)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, lets one probe through after reset_timeout."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int = UPSTREAM_BREAKER_FAILURES,
+                 reset_timeout: float = UPSTREAM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class Endpoint:
+    """Circuit breaker and recent latencies of one upstream host and path."""
+
+    def __init__(self, host: str, path: str):
+        self.labels = (host, path)
+        self.breaker = CircuitBreaker(f"{host}{path}")
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        UPSTREAM_BREAKER_STATE.labels(host, path).set_function(lambda: self.breaker.state)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent successful requests, None until there are enough samples."""
+        samples = sorted(self.latencies)
+        if len(samples) < UPSTREAM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(samples[int(0.95 * (len(samples) - 1))], UPSTREAM_HEDGE_MIN_DELAY)
+
+
+_endpoints: Dict[Tuple[str, str], Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(url: str) -> Endpoint:
+    parts = urlsplit(url)
+    key = (parts.hostname or "", parts.path)
+    endpoint = _endpoints.get(key)
+    if endpoint is None:
+        with _endpoints_lock:
+            endpoint = _endpoints.setdefault(key, Endpoint(*key))
+    return endpoint
+
+
+def _is_server_error(response: requests.Response) -> bool:
+    return isinstance(response.status_code, int) and response.status_code >= 500
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: a random delay up to the exponential backoff of this attempt."""
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _send(endpoint: Endpoint, url: str, kwargs: dict, attempt: int,
+          hedged: bool = False, record_latency: bool = False) -> requests.Response:
+    attributes = {
+        "http.request.method": "GET",
+        "server.address": endpoint.labels[0],
+        "url.full": url[:MAX_TRACED_URL_LENGTH],
+    }
+    if attempt:
+        attributes["http.request.resend_count"] = attempt
+    if hedged:
+        attributes["http.hedge"] = True
+    with span("http.get", kind=KIND_CLIENT, **attributes) as current:
+        started = time.perf_counter()
+        mode = upstream_fixtures.UPSTREAM_MODE
+        if mode == upstream_fixtures.REPLAY:
+            current.set_attribute("http.fixture", True)
+            response = upstream_fixtures.get_fixture_store().replay(url)
+            if response.status_code == 404:
+                UPSTREAM_EVENTS.labels(*endpoint.labels, "fixture_miss").inc()
+        else:
+            response = requests.get(url, **kwargs)
+        latency = time.perf_counter() - started
+        if mode == upstream_fixtures.RECORD:
+            upstream_fixtures.get_fixture_store().record(url, response, latency)
+        current.set_attribute("http.response.status_code", response.status_code)
+        if record_latency and not _is_server_error(response):
+            endpoint.latencies.append(latency)
+        return response
+
+
+def _start_primary(endpoint: Endpoint, url: str, kwargs: dict, attempt: int) -> Future:
+    """
+    Send the first request of a hedged attempt on a thread of its own.
+
+    A blocking request cannot be abandoned by the thread that sends it, so the caller only waits;
+    keeping it off the hedge pool means the pool bounds duplicates alone and queueing never delays it.
+    """
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(_send(endpoint, url, kwargs, attempt, False, True))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="upstream-request", daemon=True).start()
+    return future
+
+
+def _submit_hedge(endpoint: Endpoint, url: str, kwargs: dict, attempt: int) -> Optional[Future]:
+    """Send a duplicate on the hedge pool, None without sending while every hedge worker is busy."""
+    if not _hedge_slots.acquire(blocking=False):
+        UPSTREAM_EVENTS.labels(*endpoint.labels, "hedge_skipped").inc()
+        return None
+    UPSTREAM_EVENTS.labels(*endpoint.labels, "hedge").inc()
+
+    def run():
+        try:
+            return _send(endpoint, url, kwargs, attempt, True, True)
+        finally:
+            _hedge_slots.release()
+
+    return _hedge_executor.submit(contextvars.copy_context().run, run)
+
+
+def _send_hedged(endpoint: Endpoint, url: str, kwargs: dict, attempt: int) -> requests.Response:
+    """Send the request, and a duplicate if it is slower than the endpoint's p95; first answer wins."""
+    delay = endpoint.hedge_delay() if UPSTREAM_HEDGING else None
+    if delay is None or endpoint.breaker.state != CircuitBreaker.CLOSED:
+        return _send(endpoint, url, kwargs, attempt, record_latency=True)
+
+    futures = [_start_primary(endpoint, url, kwargs, attempt)]
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        hedge = _submit_hedge(endpoint, url, kwargs, attempt)
+        if hedge is not None:
+            futures.append(hedge)
+
+    error = None
+    for future in as_completed(futures):
+        try:
+            response = future.result()
+        except Exception as e:
+            error = e
+            continue
+        if future is not futures[0]:
+            UPSTREAM_EVENTS.labels(*endpoint.labels, "hedge_won").inc()
+        return response
+    raise error
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Bound every upstream call made in this context (and contexts copied from it) to seconds from now."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _time_left() -> Optional[float]:
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def _bounded_timeout(timeout: Union[float, Tuple[float, float]], left: float):
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+def get(url: str, hedge: bool = True, **kwargs) -> requests.Response:
+    """
+    GET an upstream URL with retries, hedging and a circuit breaker.
+
+    Pass hedge=False for large background downloads that should never be duplicated.
+    Raises CircuitOpenError without calling the upstream while its circuit is open, and
+    requests.Timeout without calling it once the deadline() of the context has passed.
+    """
+    kwargs.setdefault("timeout", (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+    timeout = kwargs["timeout"]
+    endpoint = get_endpoint(url)
+
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        if attempt:
+            UPSTREAM_EVENTS.labels(*endpoint.labels, "retry").inc()
+            backoff = _backoff(attempt)
+            left = _time_left()
+            time.sleep(backoff if left is None else max(min(backoff, left), 0))
+        left = _time_left()
+        if left is not None:
+            if left <= 0:
+                UPSTREAM_EVENTS.labels(*endpoint.labels, "deadline").inc()
+                raise requests.Timeout(f"Deadline passed before calling {endpoint.breaker.name}")
+            kwargs["timeout"] = _bounded_timeout(timeout, left)
+        if not endpoint.breaker.allow():
+            UPSTREAM_EVENTS.labels(*endpoint.labels, "short_circuit").inc()
+            raise CircuitOpenError(f"Circuit for {endpoint.breaker.name} is open")
+
+        try:
+            if hedge:
+                response = _send_hedged(endpoint, url, kwargs, attempt)
+            else:
+                response = _send(endpoint, url, kwargs, attempt)
+        except RETRY_EXCEPTIONS:
+            endpoint.breaker.record_failure()
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            continue
+        except Exception:
+            endpoint.breaker.record_failure()
+            raise
+
+        if _is_server_error(response):
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+        if response.status_code not in RETRY_STATUSES or attempt == UPSTREAM_RETRIES:
+            return response
+
+
+def get_pages(url: str, max_pages: int, page_size: int = PAGE_SIZE, **kwargs) -> list:
+    """
+    Records of every page of a center.cruises filter API search, read until a short page.
+
+    The filter API returns 10 records per page unless asked for more (at most 100).
+    """
+    records = []
+    separator = "&" if "?" in url else "?"
+    for page in range(1, max_pages + 1):
+        response = get(f"{url}{separator}control.countOnPage={page_size}&control.page={page}", **kwargs)
+        response.raise_for_status()
+        data = response.json().get("data") or []
+        records.extend(data)
+        if len(data) < page_size:
+            break
+    else:
+        logger.warning(f"Stopped reading {url} after {max_pages} pages")
+    return records
@@ -0,0 +1,172 @@
+"""
+Recorded upstream responses for offline benchmarks and equivalence tests.
+
+With UPSTREAM_MODE=record every upstream GET (batch-data searches, prices, catalog and filter
+JSONs, translations) is appended with its status, body and latency to a gzip-compressed JSON-lines
+store (UPSTREAM_FIXTURES). With UPSTREAM_MODE=replay the same requests are answered from the store
+after the recorded latency (scaled by UPSTREAM_REPLAY_LATENCY, 0 answers at once) and nothing goes
+to the network; a request that was never recorded gets a 404. Retries, circuit breakers and hedging
+in src.util.upstream run as usual on top of either mode.
+
+Searches without a start date ask for cruises from "today", so when an exact URL is missing the
+dates in it are shifted by the days since the recording and looked up again.
+
+Inspect a store:
+    python -m src.util.upstream_fixtures [--path PATH]
+"""
+import argparse
+import base64
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+LIVE, RECORD, REPLAY = "live", "record", "replay"
+UPSTREAM_MODE = os.getenv("UPSTREAM_MODE", LIVE)
+UPSTREAM_FIXTURES = os.getenv("UPSTREAM_FIXTURES", "data/upstream_fixtures.jsonl.gz")
+UPSTREAM_REPLAY_LATENCY = float(os.getenv("UPSTREAM_REPLAY_LATENCY", "1"))
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _shift_dates(url: str, days: int) -> str:
+    def shift(match):
+        try:
+            return (date.fromisoformat(match.group(0)) + timedelta(days=days)).isoformat()
+        except ValueError:
+            return match.group(0)
+
+    return _DATE.sub(shift, url)
+
+
+class FixtureStore:
+    """Recorded responses by URL; repeated requests for a URL cycle through its recordings."""
+
+    def __init__(self, path: str = UPSTREAM_FIXTURES):
+        self.path = path
+        self._entries: Optional[Dict[str, List[dict]]] = None
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self.recorded_on: Optional[date] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List[dict]]:
+        if self._entries is None:
+            entries = defaultdict(list)
+            if os.path.exists(self.path):
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries[entry["url"]].append(entry)
+            first = min((e["recorded_at"] for recorded in entries.values() for e in recorded), default=None)
+            self.recorded_on = date.fromtimestamp(first) if first else None
+            self._entries = entries
+            logger.info(f"Loaded {sum(map(len, entries.values()))} upstream fixtures from {self.path}")
+        return self._entries
+
+    def record(self, url: str, response: requests.Response, latency: float) -> None:
+        """Append a response to the store."""
+        content = response.content or b""
+        try:
+            body, encoding = content.decode("utf-8"), "text"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        entry = {
+            "url": url,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type"),
+            "body": body,
+            "encoding": encoding,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # every append is a gzip member of its own, gzip reads them back as one stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            if self._entries is not None:
+                self._entries[url].append(entry)
+
+    def lookup(self, url: str) -> Optional[dict]:
+        with self._lock:
+            entries = self._load()
+            recorded = entries.get(url)
+            if not recorded and self.recorded_on is not None:
+                url = _shift_dates(url, (self.recorded_on - date.today()).days)
+                recorded = entries.get(url)
+            if not recorded:
+                return None
+            cursor = self._cursors[url]
+            self._cursors[url] = cursor + 1
+            return recorded[cursor % len(recorded)]
+
+    def replay(self, url: str) -> requests.Response:
+        """The recorded response for url after its recorded latency, a 404 if it was never recorded."""
+        entry = self.lookup(url)
+        response = requests.Response()
+        response.url = url
+        if entry is None:
+            logger.warning(f"No upstream fixture for {url}")
+            response.status_code = 404
+            response._content = b""
+            return response
+
+        if UPSTREAM_REPLAY_LATENCY:
+            time.sleep(entry["latency"] * UPSTREAM_REPLAY_LATENCY)
+        response.status_code = entry["status"]
+        body = entry["body"]
+        response._content = base64.b64decode(body) if entry["encoding"] == "base64" else body.encode("utf-8")
+        response.encoding = "utf-8"
+        if entry.get("content_type"):
+            response.headers["Content-Type"] = entry["content_type"]
+        return response
+
+    def summary(self) -> str:
+        """Recorded responses, distinct URLs, body size and mean latency per endpoint."""
+        by_endpoint: Dict[str, List[dict]] = defaultdict(list)
+        for url, recorded in self._load().items():
+            parts = urlsplit(url)
+            by_endpoint[f"{parts.hostname}{parts.path}"].extend(recorded)
+
+        lines = [f"{self.path}: recorded on {self.recorded_on or '-'}",
+                 f"{'endpoint':<60} {'responses':>9} {'urls':>6} {'MB':>8} {'latency':>8}"]
+        for endpoint, recorded in sorted(by_endpoint.items()):
+            size = sum(len(e["body"]) for e in recorded) / 1e6
+            latency = sum(e["latency"] for e in recorded) / len(recorded)
+            urls = len({e["url"] for e in recorded})
+            lines.append(f"{endpoint:<60} {len(recorded):>9} {urls:>6} {size:>8.2f} {latency:>7.3f}s")
+        return "\n".join(lines)
+
+
+_store: Optional[FixtureStore] = None
+
+
+def get_fixture_store() -> FixtureStore:
+    global _store
+    if _store is None:
+        _store = FixtureStore()
+    return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary of a recorded upstream fixture store")
+    parser.add_argument("--path", default=UPSTREAM_FIXTURES)
+    args = parser.parse_args()
+    print(FixtureStore(args.path).summary())
+
+
+if __name__ == "__main__":
+    main()
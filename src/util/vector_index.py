@@ -0,0 +1,100 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.f32"
+PAYLOADS_FILE = "payloads.jsonl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+
+
+class VectorIndex:
+    """Read-only vector index: float32 rows memory-mapped from disk plus one JSON payload per row."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.manifest = json.loads((directory / MANIFEST_FILE).read_text(encoding="utf-8"))
+        self.count = self.manifest["count"]
+        self.dim = self.manifest["dim"]
+        self.vectors = (
+            np.memmap(directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            if self.count else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        with open(directory / PAYLOADS_FILE, encoding="utf-8") as f:
+            self.payloads = [json.loads(line) for line in f]
+
+    def search(self, query_vector: np.ndarray, limit: int = 10) -> List[Tuple[int, float]]:
+        """Return (row, cosine score) pairs for normalised vectors, best first."""
+        if not self.count:
+            return []
+        scores = self.vectors @ query_vector.astype(np.float32)
+        limit = min(limit, self.count)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+def write_vector_index(root: Path, vectors: np.ndarray, payloads: List[dict], meta: dict) -> Path:
+    """
+    Write a new index version under root and atomically make it current.
+
+    Writers (threads, workers or instances sharing root) take turns on a file lock. The version
+    being replaced is kept for readers that just opened it, only versions older than it are removed.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return _write_version(root, vectors, payloads, meta)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _version_number(name: str) -> int:
+    try:
+        return int(name[1:])
+    except ValueError:
+        return -1
+
+
+def _write_version(root: Path, vectors: np.ndarray, payloads: List[dict], meta: dict) -> Path:
+    try:
+        replaced = (root / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except OSError:
+        replaced = None
+    version = f"v{max(time.time_ns(), _version_number(replaced or 'v') + 1)}"
+    directory = root / version
+    directory.mkdir()
+
+    np.ascontiguousarray(vectors, dtype=np.float32).tofile(directory / VECTORS_FILE)
+    with open(directory / PAYLOADS_FILE, "w", encoding="utf-8") as f:
+        for payload in payloads:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    manifest = {**meta, "count": len(payloads), "dim": int(vectors.shape[1]), "built_at": time.time()}
+    (directory / MANIFEST_FILE).write_text(json.dumps(manifest), encoding="utf-8")
+
+    tmp = root / f"{CURRENT_FILE}.tmp"
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, root / CURRENT_FILE)
+
+    if replaced:
+        for old in root.glob("v*"):
+            if old.is_dir() and 0 <= _version_number(old.name) < _version_number(replaced):
+                shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def load_vector_index(root: Path) -> Optional[VectorIndex]:
+    """Open the current index version under root, or None if nothing was built yet."""
+    try:
+        version = (root / CURRENT_FILE).read_text(encoding="utf-8").strip()
+        return VectorIndex(root / version)
+    except (OSError, ValueError, KeyError):
+        return None
@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+
+from src.util.admission import AdmissionController, AdmissionRejected
+
+
+def _controller(**overrides):
+    settings = dict(max_in_flight=2, max_per_user=1, user_rate=100, user_burst=100, max_queue=2, queue_timeout=1)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_rate_limit(self):
+        """Test that a user over its token bucket is shed with a retry hint"""
+        controller = _controller(user_rate=0.5, user_burst=2)
+
+        async def scenario():
+            for _ in range(2):
+                async with controller.admit("u1"):
+                    pass
+            async with controller.admit("u1"):
+                pass
+
+        with self.assertRaises(AdmissionRejected) as raised:
+            asyncio.run(scenario())
+        self.assertEqual(raised.exception.reason, "rate_limited")
+        self.assertGreater(raised.exception.retry_after, 1)
+
+    def test_single_integration_can_use_the_global_limit(self):
+        """Test that by default one integration token is neither rate limited nor held below the global limit"""
+        controller = AdmissionController(max_in_flight=3, max_queue=0)
+
+        async def scenario():
+            for _ in range(20):
+                async with controller.admit("cruise_client"):
+                    pass
+            async with controller.admit("cruise_client"), controller.admit("cruise_client"), \
+                    controller.admit("cruise_client"):
+                return controller.in_flight
+
+        self.assertEqual(asyncio.run(scenario()), 3)
+
+    def test_user_limit_queues_without_blocking_others(self):
+        """Test that a user at its concurrency limit waits while another user is admitted"""
+        controller = _controller()
+        order = []
+
+        async def request(user_id, name, hold):
+            async with controller.admit(user_id):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        async def scenario():
+            first = asyncio.create_task(request("u1", "u1-first", 0.05))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(request("u1", "u1-second", 0))
+            await asyncio.sleep(0.01)
+            self.assertEqual(controller.waiting, 1)
+            await request("u2", "u2", 0)
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(order, ["u1-first", "u2", "u1-second"])
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_full_queue_and_timeout_are_shed(self):
+        """Test that requests are shed when the wait queue is full or the wait times out"""
+        controller = _controller(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        reasons = []
+
+        async def request(user_id):
+            try:
+                async with controller.admit(user_id):
+                    await asyncio.sleep(0.2)
+            except AdmissionRejected as e:
+                reasons.append(e.reason)
+
+        async def scenario():
+            await asyncio.gather(request("u1"), request("u2"), request("u3"))
+
+        asyncio.run(scenario())
+
+        self.assertEqual(sorted(reasons), ["queue_full", "queue_timeout"])
+        self.assertEqual((controller.in_flight, controller.waiting), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
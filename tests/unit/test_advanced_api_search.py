@@ -1,11 +1,16 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from src.agent_tools.advanced_api_search import search_cruises, _convert_to_request_params
+from src.agent_tools import advanced_api_search
+from src.util import upstream
+from src.agent_tools.advanced_api_search import search_cruises, search_cruises_batch, _convert_to_request_params
 
 
 class TestAdvancedApiSearch(unittest.TestCase):
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    def setUp(self):
+        advanced_api_search._search_cache.clear()
+
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_type_id')
     @patch('src.agent_tools.advanced_api_search.get_port_id')
@@ -25,7 +30,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_extract.assert_called_once_with([])
         self.assertEqual(result, [])
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_type_id')
     @patch('src.agent_tools.advanced_api_search.get_port_id')
@@ -45,7 +50,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_port_id.assert_any_call("Barcelona")
         mock_port_id.assert_any_call("Rome")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_river_id')
     def test_search_cruises_with_rivers(self, mock_river_id, mock_extract, mock_get):
@@ -62,7 +67,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_river_id.assert_any_call("Rhine")
         mock_river_id.assert_any_call("Danube")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_city_id')
     def test_search_cruises_with_cities(self, mock_city_id, mock_extract, mock_get):
@@ -80,7 +85,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_city_id.assert_any_call("Santorini")
         mock_city_id.assert_any_call("Dubrovnik")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_country_id')
     def test_search_cruises_with_countries(self, mock_country_id, mock_extract, mock_get):
@@ -97,7 +102,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_country_id.assert_any_call("Spain")
         mock_country_id.assert_any_call("Italy")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.datetime')
     def test_search_cruises_with_dates(self, mock_datetime, mock_extract, mock_get):
@@ -115,7 +120,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         self.assertIn("time.fromDate=2025-06-15", call_args)
         self.assertIn("time.toDate=2025-08-31", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_with_duration(self, mock_extract, mock_get):
         """Test search with duration parameter"""
@@ -129,7 +134,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         call_args = mock_get.call_args[0][0]
         self.assertIn("time.durations=3", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_with_price_range(self, mock_extract, mock_get):
         """Test search with price parameters"""
@@ -144,7 +149,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         self.assertIn("price.price=500", call_args)
         self.assertIn("price.maxPrice=2000", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_type_id')
     @patch('src.agent_tools.advanced_api_search.get_river_id')
@@ -193,7 +198,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         self.assertIn("price.price=1000", call_args)
         self.assertIn("price.maxPrice=3000", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_duration_categories(self, mock_extract, mock_get):
         """Test search with different duration categories"""
@@ -210,7 +215,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
                 call_args = mock_get.call_args[0][0]
                 self.assertIn(f"time.durations={duration}", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_type_id')
     def test_search_cruises_sea_vs_river(self, mock_type_id, mock_extract, mock_get):
@@ -230,7 +235,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         search_cruises(cruise_type="river")
         mock_type_id.assert_called_with("river")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_river_id')
     def test_search_cruises_multiple_rivers(self, mock_river_id, mock_extract, mock_get):
@@ -246,7 +251,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         call_args = mock_get.call_args[0][0]
         self.assertIn("rivers[]=201&rivers[]=202&rivers[]=203&rivers[]=204", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.get_city_id')
     def test_search_cruises_multiple_cities(self, mock_city_id, mock_extract, mock_get):
@@ -287,7 +292,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         result = _convert_to_request_params("test_param[]", [1, None, 3])
         self.assertEqual(result, "test_param[]=1&test_param[]=3")
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     @patch('src.agent_tools.advanced_api_search.datetime')
     def test_search_cruises_default_from_date(self, mock_datetime, mock_extract, mock_get):
@@ -303,7 +308,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         call_args = mock_get.call_args[0][0]
         self.assertIn("time.fromDate=2025-12-17", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_no_parameters(self, mock_extract, mock_get):
         """Test search with no parameters"""
@@ -317,7 +322,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         mock_get.assert_called_once()
         self.assertEqual(result, [])
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_url_construction(self, mock_extract, mock_get):
         """Test that URL is constructed correctly"""
@@ -332,7 +337,7 @@ class TestAdvancedApiSearch(unittest.TestCase):
         self.assertTrue(call_args.startswith('https://center.cruises/api/chatbot/cruises/batch-data?'))
         self.assertIn("price.price=1000", call_args)
 
-    @patch('src.agent_tools.advanced_api_search.requests.get')
+    @patch('src.util.upstream.requests.get')
     @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
     def test_search_cruises_edge_case_prices(self, mock_extract, mock_get):
         """Test search with edge case price values"""
@@ -354,5 +359,208 @@ class TestAdvancedApiSearch(unittest.TestCase):
         self.assertIn("price.maxPrice=100000", call_args)
 
 
+class TestDateWindowExpansion(unittest.TestCase):
+
+    def setUp(self):
+        advanced_api_search._search_cache.clear()
+
+    @staticmethod
+    def _cruise(cruise_id, *begin_dates):
+        return {
+            'cruise_id': cruise_id,
+            'text_chunk': '',
+            'metadata': {'date_ranges': [{'beginDate': d, 'endDate': d, 'url': ''} for d in begin_dates]}
+        }
+
+    @patch('src.util.upstream.requests.get')
+    @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
+    def test_expand_dates_fetches_widest_window_once(self, mock_extract, mock_get):
+        """Test that expansion mode requests the ±7 day window in a single call"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'data': []}
+        mock_get.return_value = mock_response
+        mock_extract.return_value = []
+
+        result = search_cruises(time_from_date="2099-06-15", time_to_date="2099-06-15", expand_dates=True)
+
+        self.assertEqual(mock_get.call_count, 1)
+        call_args = mock_get.call_args[0][0]
+        self.assertIn("time.fromDate=2099-06-08", call_args)
+        self.assertIn("time.toDate=2099-06-22", call_args)
+        self.assertEqual(result, {'requested_date': '2099-06-15', 'exact': [], 'within_3_days': [], 'within_7_days': []})
+
+    @patch('src.util.upstream.requests.get')
+    @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
+    def test_expand_dates_partitions_by_closest_departure(self, mock_extract, mock_get):
+        """Test that cruises are bucketed by their departure closest to the requested date"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'data': []}
+        mock_get.return_value = mock_response
+        mock_extract.return_value = [
+            self._cruise(1, "2099-06-15"),
+            self._cruise(2, "2099-06-21", "2099-06-13"),
+            self._cruise(3, "2099-06-09"),
+            self._cruise(4, "2099-07-30"),
+            None
+        ]
+
+        result = search_cruises(time_from_date="2099-06-15", expand_dates=True)
+
+        self.assertEqual([c['cruise_id'] for c in result['exact']], [1])
+        self.assertEqual([c['cruise_id'] for c in result['within_3_days']], [2])
+        self.assertEqual(result['within_3_days'][0]['closest_departure'], "2099-06-13")
+        self.assertEqual(result['within_3_days'][0]['days_from_requested'], 2)
+        self.assertEqual([c['cruise_id'] for c in result['within_7_days']], [3])
+
+    @patch('src.util.upstream.requests.get')
+    @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
+    def test_expand_dates_reads_every_page(self, mock_extract, mock_get):
+        """Test that exact-date cruises on a later page of the window still fill the exact bucket"""
+        pages = {
+            1: [{"record": i, "date": "2099-06-08"} for i in range(upstream.PAGE_SIZE)],
+            2: [{"record": "exact", "date": "2099-06-15"}],
+        }
+
+        def get(url, **kwargs):
+            response = MagicMock()
+            response.json.return_value = {'data': pages[int(url.rsplit("control.page=", 1)[1])]}
+            return response
+
+        mock_get.side_effect = get
+        mock_extract.side_effect = lambda records: [
+            self._cruise(record["record"], record["date"]) for record in records
+        ]
+
+        result = search_cruises(time_from_date="2099-06-15", expand_dates=True)
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertIn("control.countOnPage=100", mock_get.call_args[0][0])
+        self.assertEqual([c['cruise_id'] for c in result['exact']], ["exact"])
+        self.assertEqual(len(result['within_7_days']), upstream.PAGE_SIZE)
+
+    @patch('src.util.upstream.requests.get')
+    @patch('src.agent_tools.advanced_api_search.extract_cruise_summary')
+    def test_expand_dates_without_date_is_plain_search(self, mock_extract, mock_get):
+        """Test that expansion mode without a date falls back to the regular result list"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'data': []}
+        mock_get.return_value = mock_response
+        mock_extract.return_value = []
+
+        self.assertEqual(search_cruises(expand_dates=True), [])
+
+
+class TestDateValidation(unittest.TestCase):
+
+    @patch('src.util.upstream.requests.get')
+    def test_partial_date_is_reported_to_the_model(self, mock_get):
+        """Test that a date without a day is answered with the expected format instead of failing"""
+        for arguments in ({"time_from_date": "2025-07"}, {"time_from_date": "2025-07", "expand_dates": True},
+                          {"time_to_date": "end of July"}):
+            with self.subTest(**arguments):
+                result = search_cruises(**arguments)
+
+                self.assertIsInstance(result, str)
+                self.assertIn("YYYY-MM-DD", result)
+        mock_get.assert_not_called()
+
+    @patch('src.util.upstream.requests.get')
+    def test_batch_reports_the_invalid_date(self, mock_get):
+        """Test that one query with a bad date is reported while the batch still answers"""
+        result = search_cruises_batch([{"time_from_date": "July"}])
+
+        self.assertIn("YYYY-MM-DD", result['queries'][0]['error'])
+        self.assertEqual(result['cruises'], [])
+
+
+class TestSearchCruisesBatch(unittest.TestCase):
+
+    @staticmethod
+    def _cruise(cruise_id):
+        return {'cruise_id': cruise_id, 'text_chunk': '', 'metadata': {'date_ranges': []}}
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_merges_and_deduplicates_results(self, mock_search):
+        """Test that overlapping cruises are listed once with all matching queries"""
+        results = {"Italy": [self._cruise(1), self._cruise(2)], "Norway": [self._cruise(2), self._cruise(3)]}
+        mock_search.side_effect = lambda **query: results[query["country_to"]]
+
+        result = search_cruises_batch([{"country_to": "Italy"}, {"country_to": "Norway", "unknown": 1}])
+
+        self.assertEqual(mock_search.call_count, 2)
+        mock_search.assert_any_call(country_to="Norway")
+        self.assertEqual([c['cruise_id'] for c in result['cruises']], [1, 2, 3])
+        self.assertEqual(result['cruises'][1]['matched_queries'], [0, 1])
+        self.assertEqual(result['queries'][1]['cruise_ids'], [2, 3])
+        self.assertEqual(result['queries'][1]['ignored_filters'], ["unknown"])
+        self.assertNotIn('ignored_filters', result['queries'][0])
+        self.assertFalse(result['truncated'])
+        self.assertEqual(result['skipped'], [])
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_results_are_budgeted(self, mock_search):
+        """Test that per-query and total result budgets are applied"""
+        mock_search.side_effect = lambda **query: [
+            self._cruise(query["price_min"] + i) for i in range(advanced_api_search.MAX_RESULTS_PER_QUERY + 5)
+        ]
+
+        result = search_cruises_batch([{"price_min": i * 1000} for i in range(10)])
+
+        self.assertEqual(mock_search.call_count, advanced_api_search.MAX_BATCH_QUERIES)
+        self.assertEqual(len(result['cruises']), advanced_api_search.MAX_BATCH_RESULTS)
+        self.assertEqual(result['queries'][0]['total'], advanced_api_search.MAX_RESULTS_PER_QUERY + 5)
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['skipped'], [{"price_min": i * 1000}
+                                             for i in range(advanced_api_search.MAX_BATCH_QUERIES, 10)])
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_cut_queries_are_reported(self, mock_search):
+        """Test that queries over the per-call limit are reported as skipped even when all results fit"""
+        mock_search.return_value = [self._cruise(1)]
+        count = advanced_api_search.MAX_BATCH_QUERIES + 1
+
+        result = search_cruises_batch([{"country_to": f"C{i}"} for i in range(count)])
+
+        self.assertTrue(result['truncated'])
+        self.assertEqual(result['skipped'], [{"country_to": f"C{count - 1}"}])
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_failed_query_does_not_fail_batch(self, mock_search):
+        """Test that a failing query is reported while the others still return"""
+        def search(**query):
+            if query["country_to"] == "Norway":
+                raise Exception("boom")
+            return [self._cruise(1)]
+        mock_search.side_effect = search
+
+        result = search_cruises_batch([{"country_to": "Italy"}, {"country_to": "Norway"}])
+
+        self.assertEqual([c['cruise_id'] for c in result['cruises']], [1])
+        self.assertEqual(result['queries'][1]['error'], "search failed")
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_queries_see_the_caller_deadline(self, mock_search):
+        """Test that the upstream deadline of the tool call reaches the batch worker threads"""
+        seen = []
+        mock_search.side_effect = lambda **query: seen.append(upstream._time_left()) or []
+
+        with upstream.deadline(5):
+            search_cruises_batch([{"country_to": "Italy"}, {"country_to": "Norway"}])
+
+        self.assertEqual(len(seen), 2)
+        self.assertTrue(all(left is not None and 0 < left <= 5 for left in seen))
+
+    @patch('src.agent_tools.advanced_api_search.search_cruises')
+    def test_date_buckets_are_flattened(self, mock_search):
+        """Test that expanded date searches are merged with their bucket tag"""
+        mock_search.return_value = {'requested_date': '2099-06-15', 'exact': [self._cruise(1)],
+                                    'within_3_days': [self._cruise(2)], 'within_7_days': []}
+
+        result = search_cruises_batch([{"time_from_date": "2099-06-15", "expand_dates": True}])
+
+        self.assertEqual([(c['cruise_id'], c['date_bucket']) for c in result['cruises']],
+                         [(1, 'exact'), (2, 'within_3_days')])
+
+
 if __name__ == '__main__':
     unittest.main()
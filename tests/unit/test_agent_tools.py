@@ -0,0 +1,131 @@
+import unittest
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+from src.agent_tools import agent_tools
+from src.agent_tools.agent_tools import find_cruise_info, find_cruises_info
+
+
+def _record(cruise_id, begin_date="2030-06-15", range_id=900):
+    return {
+        'cruiseDateRangeId': range_id,
+        'ufl': f'cruise-{cruise_id}',
+        'cruiseInfoJson': {
+            'cruise': {'cruise_id': cruise_id, 'name': f'Cruise {cruise_id}'},
+            'itineraries': []
+        },
+        'cruiseDateRangeInfoJson': {
+            'dateRange': {'begin_date': begin_date},
+            'minPrice': {'2': 1000},
+            'minPriceInfo': [
+                {'cabin_category_id': 7, 'currency_id': 2, 'price_value': 1000},
+                {'cabin_category_id': 7, 'currency_id': 1, 'price_value': 90000}
+            ]
+        },
+        'vesselInfoJson': {
+            'vessel': {'name': 'Test Vessel'},
+            'cabinCategories': [{'category': {'cabin_category_id': 7, 'description': 'Balcony'}}]
+        }
+    }
+
+
+def _response(records):
+    response = MagicMock()
+    response.json.return_value = {'data': records}
+    return response
+
+
+class TestFindCruisesInfo(unittest.TestCase):
+
+    def setUp(self):
+        agent_tools._cruise_info_cache.clear()
+
+    @patch('src.util.upstream.requests.get')
+    def test_fetches_several_cruises_in_one_request(self, mock_get):
+        """Test that all ids are sent in a single batch-data request"""
+        mock_get.return_value = _response([_record(1), _record(2), _record(3)])
+
+        result = find_cruises_info(["1", "2", "3"], date(2030, 1, 1))
+
+        self.assertEqual(mock_get.call_count, 1)
+        url = mock_get.call_args[0][0]
+        self.assertIn("cruiseId[]=1&cruiseId[]=2&cruiseId[]=3", url)
+        self.assertEqual(list(result.keys()), ["1", "2", "3"])
+        self.assertEqual(result["2"]['cruise_name'], 'Cruise 2')
+        self.assertEqual(result["2"]['cabins_info'], [{'cabin_id': 7, 'price': 1000, 'description': 'Balcony'}])
+
+    @patch('src.util.upstream.requests.get')
+    def test_chunks_long_id_lists(self, mock_get):
+        """Test that long id lists are split into several requests"""
+        mock_get.side_effect = lambda url, **kwargs: _response([])
+
+        ids = [str(i) for i in range(agent_tools.CRUISE_INFO_CHUNK_SIZE + 5)]
+        result = find_cruises_info(ids, date(2030, 1, 1))
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertTrue(all(value == "no data" for value in result.values()))
+
+    @patch('src.util.upstream.requests.get')
+    def test_cached_per_cruise_and_date(self, mock_get):
+        """Test that repeated lookups for the same date are served from cache"""
+        mock_get.return_value = _response([_record(1)])
+
+        find_cruises_info(["1"], date(2030, 1, 1))
+        find_cruise_info("1", date(2030, 1, 1))
+        self.assertEqual(mock_get.call_count, 1)
+
+        find_cruise_info("1", date(2030, 2, 1))
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('src.util.upstream.requests.get')
+    def test_picks_first_range_after_desired_date(self, mock_get):
+        """Test that the first date range after the desired date is used"""
+        mock_get.return_value = _response([
+            _record(1, begin_date="2030-03-01", range_id=1),
+            _record(1, begin_date="2030-07-01", range_id=2)
+        ])
+
+        result = find_cruise_info("1", date(2030, 5, 1))
+
+        self.assertIn("cruise-2-cruise-1", result['website'])
+
+    @patch('src.util.upstream.requests.get')
+    def test_upstream_error_returns_no_data(self, mock_get):
+        """Test that upstream failures are reported as no data and not cached"""
+        mock_get.side_effect = Exception("boom")
+
+        self.assertEqual(find_cruise_info("1", date(2030, 1, 1)), "no data")
+        self.assertEqual(len(agent_tools._cruise_info_cache), 0)
+
+
+class TestCabinJoin(unittest.TestCase):
+
+    def setUp(self):
+        agent_tools._cruise_info_cache.clear()
+
+    @patch('src.util.upstream.requests.get')
+    def test_prices_joined_with_categories(self, mock_get):
+        """Test that every EUR price row is joined with its cabin category"""
+        record = _record(1)
+        record['cruiseDateRangeInfoJson']['minPriceInfo'] = [
+            {'cabin_category_id': 7, 'currency_id': 2, 'price_value': 1000},
+            {'cabin_category_id': 8, 'currency_id': 2, 'price_value': 1500},
+            {'cabin_category_id': 9, 'currency_id': 2, 'price_value': 2000}
+        ]
+        record['vesselInfoJson']['cabinCategories'] = [
+            {'category': {'cabin_category_id': 8, 'description': 'Suite'}},
+            {'category': {'cabin_category_id': 7, 'description': 'Balcony'}}
+        ]
+        mock_get.return_value = _response([record])
+
+        result = find_cruise_info("1", date(2030, 1, 1))
+
+        self.assertEqual(result['cabins_info'], [
+            {'cabin_id': 7, 'price': 1000, 'description': 'Balcony'},
+            {'cabin_id': 8, 'price': 1500, 'description': 'Suite'},
+            {'cabin_id': 'none', 'minimal_price': 'none', 'description': 'none'}
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
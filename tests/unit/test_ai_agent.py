@@ -0,0 +1,160 @@
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch, MagicMock
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.agent_tools.agent_tools import get_current_date
+from src.ai_agent import CruiseAgent
+from src.util.answer_cache import detect_language, normalize_question
+from src.util.model_routing import PACKAGE
+
+
+class _FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class TestPackageFastPath(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpointer = InMemorySaver()
+
+        @contextmanager
+        def from_conn_string(_):
+            yield self.checkpointer
+
+        patches = [
+            patch('src.ai_agent.ChatOpenAI'),
+            patch('src.ai_agent.TracedPostgresSaver.from_conn_string', side_effect=from_conn_string),
+            patch('src.ai_agent.MessageHistoryManager'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.agent = CruiseAgent()
+        # Package questions are answered by the model of the package route's tier
+        self.agent.llm = self.agent.router.model(PACKAGE)
+        self.agent.llm.invoke.return_value = AIMessage(content="Gratuities are added daily.")
+
+    def test_package_question_skips_agent_loop(self):
+        """Test that a confident package question is answered with one formatting call"""
+        with patch.object(self.agent, '_stream_agent_response') as mock_stream:
+            responses = self.agent.ask("Do I need to pay gratuities on NCL?", thread_id="t1")
+
+        mock_stream.assert_not_called()
+        self.assertEqual(self.agent.llm.invoke.call_count, 1)
+        prompt = self.agent.llm.invoke.call_args[0][0]
+        self.assertIn("greet the user", prompt[0].content)
+        self.assertIn("Do I need to pay gratuities on NCL?", prompt[1].content)
+        self.assertEqual(responses[-1].content, "Gratuities are added daily.")
+
+        state = self.checkpointer.get({"configurable": {"thread_id": "t1"}})
+        self.assertEqual(
+            [m.content for m in state['channel_values']['messages']],
+            ["Do I need to pay gratuities on NCL?", "Gratuities are added daily."]
+        )
+
+    def test_other_questions_use_agent_loop(self):
+        """Test that non-package questions still go through the agent"""
+        with patch.object(self.agent, '_stream_agent_response', return_value=[AIMessage(content="ok")]) as mock_stream:
+            self.agent.ask("Cruises from Barcelona in July", thread_id="t2")
+
+        mock_stream.assert_called_once()
+        self.agent.llm.invoke.assert_not_called()
+
+
+class TestWarmAgent(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            patch('src.ai_agent.ChatOpenAI'),
+            patch('src.ai_agent.MessageHistoryManager'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.agent = CruiseAgent()
+
+    def test_compile_requires_pool(self):
+        """Test that the graph cannot be compiled before the pool is open"""
+        with self.assertRaises(RuntimeError):
+            self.agent.compile_agent()
+
+    @patch('src.ai_agent.TracedPostgresSaver.from_conn_string')
+    def test_warm_agent_reuses_checkpointer_and_graph(self, mock_from_conn_string):
+        """Test that a warmed-up agent neither opens connections nor recompiles per request"""
+        self.agent.checkpointer = InMemorySaver()
+        self.agent.compile_agent()
+        compiled = self.agent.agent
+
+        with patch.object(self.agent, '_create_agent') as mock_create, \
+                patch.object(self.agent, '_stream_agent_response', return_value=[AIMessage(content="ok")]) as mock_stream:
+            self.agent.ask("Cruises from Barcelona in July", thread_id="t3")
+
+        mock_from_conn_string.assert_not_called()
+        mock_create.assert_not_called()
+        self.assertIs(mock_stream.call_args[0][0], compiled)
+
+
+class TestAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            patch('src.ai_agent.ChatOpenAI'),
+            patch('src.ai_agent.MessageHistoryManager'),
+            patch('src.util.answer_cache.get_catalog_store', return_value=MagicMock(version="100")),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.agent = CruiseAgent(tools=[get_current_date])
+        self.agent.llm = _FakeModel(messages=iter([
+            AIMessage(content="", tool_calls=[{"name": "get_current_date", "args": {}, "id": "c1"}]),
+            AIMessage(content="Here are cruises from Barcelona."),
+            AIMessage(content="The second one has a balcony."),
+        ]))
+        self.agent.checkpointer = InMemorySaver()
+        self.agent.compile_agent()
+
+    def _thread_messages(self, thread_id):
+        return self.agent.agent.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]
+
+    def test_first_question_is_answered_from_cache(self):
+        """Test that the same first question on a fresh thread replays the cached turn into its checkpoint"""
+        self.agent.ask("Cruises from Barcelona!", thread_id="t1")
+
+        with patch.object(self.agent, '_stream_agent_response') as mock_stream:
+            responses = self.agent.ask("cruises  from barcelona", thread_id="t2")
+
+        mock_stream.assert_not_called()
+        self.assertEqual(responses[-1].content, "Here are cruises from Barcelona.")
+        messages = self._thread_messages("t2")
+        self.assertEqual(messages[0].content, "cruises  from barcelona")
+        self.assertEqual([type(m).__name__ for m in messages], ["HumanMessage", "AIMessage", "ToolMessage", "AIMessage"])
+
+    def test_follow_up_turns_are_not_cached(self):
+        """Test that only first turns of fresh threads use the answer cache"""
+        self.agent.ask("Cruises from Barcelona", thread_id="t1")
+        responses = self.agent.ask("Cruises from Barcelona", thread_id="t1")
+
+        self.assertEqual(responses[-1].content, "The second one has a balcony.")
+
+    def test_key_normalisation(self):
+        """Test that the key ignores case, punctuation and ё but not the language or catalog version"""
+        self.assertEqual(normalize_question("  Круизы, по Средиземному морю?! "), "круизы по средиземному морю")
+        self.assertEqual(normalize_question("Всё"), "все")
+        self.assertEqual([detect_language(t) for t in ("Cruises", "Круизы", "Круїзи")], ["en", "ru", "uk"])
+
+        key = self.agent.answer_cache.key("Cruises from Barcelona")
+        self.assertIn("|100|", key)
+        self.assertTrue(key.startswith("en|"))
+
+
+if __name__ == '__main__':
+    unittest.main()
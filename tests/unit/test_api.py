@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import AsyncMock, patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+from src import api
+from src.util.admission import AdmissionController
+from src.util.turn_scheduler import COALESCED
+
+
+class TestHealthEndpoints(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            patch.object(api, 'startup', api.StartupState()),
+            patch.object(api, 'agent', MagicMock()),
+            patch.object(api, 'preload_knowledge'),
+            patch.object(api, 'preload_cruise_index'),
+            patch.object(api, 'start_popular_searches'),
+            patch('src.util.catalogs.get_catalog_store'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_not_ready_before_warm_up(self):
+        """Test that readiness fails while liveness passes before warm-up"""
+        client = TestClient(api.app)
+
+        self.assertEqual(client.get("/healthz").status_code, 200)
+        response = client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()["warming_up"])
+
+    def test_ready_after_warm_up(self):
+        """Test that the lifespan warm-up makes the instance ready and reports step timings"""
+        with TestClient(api.app) as client:
+            api.startup.wait(5)
+            response = client.get("/readyz")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("graph_compile", response.json()["timings"])
+        api.agent.open_pool.assert_called()
+
+    def test_required_step_failure_is_not_ready(self):
+        """Test that a failed database warm-up keeps the instance out of rotation"""
+        api.agent.open_pool.side_effect = RuntimeError("db down")
+
+        with TestClient(api.app) as client:
+            api.startup.wait(5)
+            response = client.get("/readyz")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["errors"], {"db_pool": "db down"})
+
+
+class TestAsk(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(api, 'agent', MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        api.app.dependency_overrides[api.verify_jwt] = lambda: {"user_id": "test"}
+        self.addCleanup(api.app.dependency_overrides.clear)
+
+    def test_ask_runs_agent_for_chat(self):
+        """Test that /ask answers from the agent on the worker pool and echoes the request id"""
+        api.agent.ask.return_value = ["answer"]
+
+        response = TestClient(api.app).post(
+            "/ask", json={"question": "hi", "chat_id": "c1"}, headers={"X-Request-ID": "r1"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ["answer"])
+        self.assertEqual(response.headers["X-Request-ID"], "r1")
+        api.agent.ask.assert_called_once_with(user_message="hi", thread_id="c1")
+
+    def test_malformed_request_id_is_replaced(self):
+        """Test that a request id unsafe for logs and file names is replaced by a generated one"""
+        api.agent.ask.return_value = ["answer"]
+
+        response = TestClient(api.app).post(
+            "/ask", json={"question": "hi", "chat_id": "c1"}, headers={"X-Request-ID": "../../etc/x"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response.headers["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_coalesced_turn_answers_empty(self):
+        """Test that a message answered with a later one gets an empty list and the coalesced header"""
+        scheduler = MagicMock()
+        scheduler.submit = AsyncMock(return_value=COALESCED)
+
+        with patch.object(api, 'get_turn_scheduler', return_value=scheduler):
+            response = TestClient(api.app).post("/ask", json={"question": "hi", "chat_id": "c1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertEqual(response.headers["X-Turn-Coalesced"], "1")
+
+    def test_overloaded_user_gets_429(self):
+        """Test that a request shed by admission control is answered with 429 and Retry-After"""
+        api.agent.ask.return_value = ["answer"]
+        controller = AdmissionController(user_rate=0.1, user_burst=1)
+        client = TestClient(api.app)
+
+        with patch.object(api, 'get_admission_controller', return_value=controller):
+            first = client.post("/ask", json={"question": "hi", "chat_id": "c1"})
+            second = client.post("/ask", json={"question": "hi", "chat_id": "c1"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(second.headers["Retry-After"], "10")
+
+
+if __name__ == '__main__':
+    unittest.main()
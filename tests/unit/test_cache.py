@@ -0,0 +1,211 @@
+import fnmatch
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from src.util.cache import ACQUIRE_SCRIPT, CacheBackend, RedisBackend, SQLiteBackend, TTLCache
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Speaks enough of the Redis protocol for RedisBackend: GET, PTTL, SET, DEL, SCAN and its lease script."""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        data = self.server.data
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            now = time.time()
+            if command == b"GET":
+                value, expires_at = data.get(args[1], (None, 0))
+                reply = self._bulk(value if expires_at > now else None)
+            elif command == b"SET":
+                options = [arg.upper() for arg in args[3:]]
+                exists = data.get(args[1], (None, 0))[1] > now
+                if (b"NX" in options and exists) or (b"XX" in options and not exists):
+                    reply = self._bulk(None)
+                else:
+                    data[args[1]] = (args[2], now + int(options[options.index(b"PX") + 1]) / 1000)
+                    reply = b"+OK\r\n"
+            elif command == b"PTTL":
+                value, expires_at = data.get(args[1], (None, 0))
+                reply = b":%d\r\n" % (int((expires_at - now) * 1000) if expires_at > now else -2)
+            elif command == b"EVAL" and args[1] == ACQUIRE_SCRIPT.encode():
+                key, owner, ttl_ms = args[3], args[4], int(args[5])
+                value, expires_at = data.get(key, (None, 0))
+                acquired = expires_at <= now or value == owner
+                if acquired:
+                    data[key] = (owner, now + ttl_ms / 1000)
+                reply = b":%d\r\n" % acquired
+            elif command == b"DEL":
+                deleted = sum(data.pop(key, None) is not None for key in args[1:])
+                reply = b":%d\r\n" % deleted
+            elif command == b"SCAN":
+                pattern = args[3].decode().replace("\\", "")
+                keys = [key for key in data if fnmatch.fnmatchcase(key.decode(), pattern)]
+                reply = b"*2\r\n" + self._bulk(b"0") + b"*%d\r\n" % len(keys) + b"".join(map(self._bulk, keys))
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class _RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.data = {}
+
+
+class _BrokenBackend(CacheBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        raise ConnectionError("down")
+
+    def set(self, key, value, ttl_seconds):
+        self.calls += 1
+        raise ConnectionError("down")
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = SQLiteBackend(Path(directory.name) / "cache.sqlite3")
+
+    def test_workers_share_the_far_tier(self):
+        """Test that an entry written by one worker is read by another and kept in its near tier"""
+        writer = TTLCache(60, name="price_quote", far=self.backend)
+        reader = TTLCache(60, name="price_quote", far=self.backend)
+
+        writer.set((100, 2, 1), {"price": 1500})
+
+        self.assertEqual(reader.get((100, 2, 1)), {"price": 1500})
+        self.assertEqual(len(reader), 1)
+
+    def test_keys_are_namespaced_and_versioned(self):
+        """Test that caches with another name or version do not see each other's entries"""
+        TTLCache(60, name="search", far=self.backend).set("url", ["cruise"])
+
+        self.assertIsNone(TTLCache(60, name="search", version=2, far=self.backend).get("url"))
+        self.assertIsNone(TTLCache(60, name="cruise_info", far=self.backend).get("url"))
+        self.assertEqual(TTLCache(60, name="search", far=self.backend).get("url"), ["cruise"])
+
+    def test_far_entries_expire(self):
+        """Test that far tier entries expire with the cache ttl"""
+        TTLCache(0.01, name="search", far=self.backend).set("url", ["cruise"])
+        time.sleep(0.02)
+
+        self.assertIsNone(TTLCache(60, name="search", far=self.backend).get("url"))
+
+    def test_far_hit_keeps_the_far_expiry(self):
+        """Test that an entry copied from the far tier expires with the far entry, not a full ttl later"""
+        TTLCache(0.2, name="search", far=self.backend).set("url", ["cruise"])
+        time.sleep(0.1)
+        reader = TTLCache(0.2, name="search", far=self.backend)
+
+        self.assertEqual(reader.get("url"), ["cruise"])
+        time.sleep(0.15)
+        self.assertIsNone(reader.get("url"))
+
+    def test_clear_drops_only_own_namespace(self):
+        """Test that clearing a cache removes its far entries and keeps other caches"""
+        search = TTLCache(60, name="search", far=self.backend)
+        prices = TTLCache(60, name="price_quote", far=self.backend)
+        search.set("url", [])
+        prices.set("quote", 1)
+
+        search.clear()
+
+        self.assertIsNone(TTLCache(60, name="search", far=self.backend).get("url"))
+        self.assertEqual(TTLCache(60, name="price_quote", far=self.backend).get("quote"), 1)
+
+    def test_far_outage_falls_back_to_near_tier(self):
+        """Test that a failing far tier is skipped and the near tier keeps working"""
+        broken = _BrokenBackend()
+        cache = TTLCache(60, name="search", far=broken)
+
+        cache.set("url", ["cruise"])
+        self.assertEqual(cache.get("url"), ["cruise"])
+        self.assertIsNone(cache.get("other"))
+        self.assertEqual(broken.calls, 1)
+
+    def test_lease(self):
+        """Test that a lease is renewed by its owner and only taken over once it expired"""
+        self.assertTrue(self.backend.acquire("lease", b"a", 60))
+        self.assertTrue(self.backend.acquire("lease", b"a", 0.01))
+        self.assertFalse(self.backend.acquire("lease", b"b", 60))
+        time.sleep(0.02)
+        self.assertTrue(self.backend.acquire("lease", b"b", 60))
+        self.assertFalse(self.backend.acquire("lease", b"a", 60))
+
+
+class TestRedisBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _RespServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        self.backend = RedisBackend(f"redis://{host}:{port}/0")
+
+    def test_round_trip_through_resp(self):
+        """Test get, set with expiry, delete and prefix clear over the Redis protocol"""
+        cache = TTLCache(60, name="cruise_info", far=self.backend)
+        cache.set(("1", "2030-06"), {"name": "Круиз"})
+
+        self.assertEqual(TTLCache(60, name="cruise_info", far=self.backend).get(("1", "2030-06")), {"name": "Круиз"})
+
+        self.backend.set("other:key", b"x", 60)
+        cache.clear()
+        self.assertEqual(list(self.server.data), [b"other:key"])
+
+        self.backend.delete("other:key")
+        self.assertIsNone(self.backend.get("other:key"))
+
+    def test_far_hit_keeps_the_far_expiry(self):
+        """Test that the remaining ttl of a far entry is read along with it"""
+        self.backend.set("key", b"x", 60)
+
+        value, ttl_seconds = self.backend.get_with_ttl("key")
+
+        self.assertEqual(value, b"x")
+        self.assertTrue(59 < ttl_seconds <= 60)
+        self.assertEqual(self.backend.get_with_ttl("missing"), (None, None))
+
+    def test_lease(self):
+        """Test that a lease is renewed by its owner and only taken over once it expired"""
+        self.assertTrue(self.backend.acquire("lease", b"a", 60))
+        self.assertTrue(self.backend.acquire("lease", b"a", 0.01))
+        self.assertFalse(self.backend.acquire("lease", b"b", 60))
+        time.sleep(0.02)
+        self.assertTrue(self.backend.acquire("lease", b"b", 60))
+        self.assertFalse(self.backend.acquire("lease", b"a", 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from src.util.catalogs import CATALOG_ENDPOINTS, CatalogSnapshot, CatalogStore, build_catalog, write_snapshot
+
+CATALOG_ITEMS = {
+    "cities": [{"id": 1, "text": "Барселона"}, {"id": 2, "text": "Рим"}],
+    "ports": [{"id": 10, "text": "Доха"}],
+    "countries": [{"id": 20, "text": "Италия"}],
+    "rivers": [{"id": 30, "text": "Рейн"}],
+    "vessels": [{"id": 40, "text": "Celebrity Ascent"}, {"id": 41, "text": "Icon of the Seas"}],
+    "companies": [{"id": 50, "text": "MSC Cruises"}],
+    "directions": [{"id": 60, "text": "Средиземное море"}],
+}
+
+
+def _catalog_response(url, *args, **kwargs):
+    response = MagicMock()
+    response.status_code = 200
+    for name, endpoint in CATALOG_ENDPOINTS.items():
+        if url.endswith(endpoint):
+            response.json.return_value = CATALOG_ITEMS[name]
+    return response
+
+
+class TestCatalogSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / "catalogs.snapshot"
+
+    def test_write_and_read_snapshot(self):
+        """Test that catalogs survive a snapshot round trip"""
+        write_snapshot(self.path, {name: build_catalog(items) for name, items in CATALOG_ITEMS.items()})
+
+        snapshot = CatalogSnapshot(self.path)
+
+        self.assertCountEqual(snapshot.names(), CATALOG_ITEMS)
+        self.assertEqual(snapshot.load("cities")["items"], CATALOG_ITEMS["cities"])
+        self.assertEqual(snapshot.load("vessels")["index"]["icon of the seas"], 41)
+        self.assertIsNone(snapshot.load("unknown"))
+
+    def test_rejects_foreign_file(self):
+        """Test that a file without the snapshot header is rejected"""
+        self.path.write_bytes(b"not a snapshot" * 4)
+
+        with self.assertRaises(ValueError):
+            CatalogSnapshot(self.path)
+
+
+class TestCatalogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / "catalogs.snapshot"
+
+    @patch('src.util.upstream.requests.get')
+    def test_cold_start_from_snapshot_skips_downloads(self, mock_get):
+        """Test that a store opened on a snapshot answers without any API call"""
+        mock_get.side_effect = _catalog_response
+        CatalogStore(self.path).refresh()
+        mock_get.reset_mock()
+
+        store = CatalogStore(self.path)
+
+        self.assertEqual(store.get("ports"), CATALOG_ITEMS["ports"])
+        self.assertEqual(store.lookup("vessels", " celebrity ascent "), 40)
+        self.assertIsNotNone(store.version)
+        mock_get.assert_not_called()
+
+    @patch('src.util.upstream.requests.get')
+    def test_falls_back_to_api_without_snapshot(self, mock_get):
+        """Test that a missing snapshot loads the catalog from the API once"""
+        mock_get.side_effect = _catalog_response
+        store = CatalogStore(self.path)
+
+        self.assertEqual(store.get("companies"), CATALOG_ITEMS["companies"])
+        self.assertEqual(store.get("companies"), CATALOG_ITEMS["companies"])
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIsNone(store.version)
+
+    @patch('src.util.upstream.requests.get')
+    def test_failed_refresh_keeps_previous_catalog(self, mock_get):
+        """Test that a catalog failing to download keeps its snapshot copy"""
+        mock_get.side_effect = _catalog_response
+        CatalogStore(self.path).refresh()
+
+        def partial_outage(url, *args, **kwargs):
+            if url.endswith(CATALOG_ENDPOINTS["rivers"]):
+                return MagicMock(status_code=500)
+            return _catalog_response(url)
+
+        mock_get.side_effect = partial_outage
+        counts = CatalogStore(self.path).refresh()
+
+        self.assertNotIn("rivers", counts)
+        self.assertEqual(CatalogSnapshot(self.path).load("rivers")["items"], CATALOG_ITEMS["rivers"])
+
+    @patch('src.util.upstream.requests.get')
+    def test_unavailable_catalog(self, mock_get):
+        """Test that an unavailable catalog returns None"""
+        mock_get.return_value = MagicMock(status_code=503)
+        store = CatalogStore(self.path)
+
+        self.assertIsNone(store.get("cities"))
+        self.assertIsNone(store.lookup("vessels", "Icon of the Seas"))
+
+
+if __name__ == '__main__':
+    unittest.main()
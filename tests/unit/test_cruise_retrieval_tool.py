@@ -0,0 +1,153 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from src.agent_tools import cruise_retrieval_tool
+from src.agent_tools.cruise_retrieval_tool import CruiseRetriever, find_cruises_by_description
+from src.util import upstream
+from src.util.embeddings import HashingEmbedder
+from src.util.vector_index import load_vector_index
+
+CRUISES = {
+    1: "The cruise is named Rhine Castles. A slow river journey past medieval castles, vineyards and "
+       "historic old towns with museums and cathedrals. The cruise goes along the following rivers: Rhine.",
+    2: "The cruise is named Caribbean Party. Non-stop pool parties, water slides, casino nights and "
+       "beach bars across the Bahamas and Jamaica.",
+    3: "The cruise is named Norwegian Fjords. Dramatic fjords, glaciers and hiking in Geiranger and "
+       "Flam with scenic cruising.",
+    4: "The cruise is named Past Sailing. Cultural cruise with museums and historic cities.",
+}
+
+
+def _cruise(cruise_id, begin_date="2099-06-01"):
+    return {
+        'cruise_id': cruise_id,
+        'text_chunk': CRUISES[cruise_id],
+        'metadata': {'date_ranges': [{'beginDate': begin_date, 'endDate': begin_date, 'url': ''}]}
+    }
+
+
+class TestCruiseRetriever(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.retriever = CruiseRetriever(Path(self.directory.name), embedder=HashingEmbedder())
+
+    def test_empty_index_is_stale(self):
+        """Test that a missing index is reported as stale and returns nothing"""
+        self.assertTrue(self.retriever.is_stale())
+        self.assertEqual(self.retriever.search("castles"), [])
+
+    def test_build_and_search(self):
+        """Test that descriptive queries find the matching cruise"""
+        self.retriever.build([_cruise(1), _cruise(2), _cruise(3), None, _cruise(1)])
+
+        self.assertEqual(self.retriever.size, 3)
+        self.assertFalse(self.retriever.is_stale())
+        self.assertEqual(self.retriever.search("historic culture and museums", limit=1)[0]['cruise_id'], 1)
+        self.assertEqual(self.retriever.search("party with pools and beaches", limit=1)[0]['cruise_id'], 2)
+        self.assertEqual(self.retriever.search("glacier hikes", limit=1)[0]['cruise_id'], 3)
+
+    def test_index_is_persisted(self):
+        """Test that a rebuilt index replaces the previous version, which is kept until the next rebuild"""
+        self.retriever.build([_cruise(1)])
+        self.retriever.build([_cruise(4)])
+        self.retriever.build([_cruise(2), _cruise(3)])
+
+        index = load_vector_index(Path(self.directory.name))
+        self.assertEqual(index.count, 2)
+        self.assertEqual(len(list(Path(self.directory.name).glob("v*"))), 2)
+
+        reopened = CruiseRetriever(Path(self.directory.name), embedder=HashingEmbedder())
+        self.assertEqual(reopened.size, 2)
+
+    def test_other_embedder_index_is_ignored(self):
+        """Test that an index built with another embedder is not used"""
+        self.retriever.build([_cruise(1)])
+
+        reopened = CruiseRetriever(Path(self.directory.name), embedder=HashingEmbedder(dim=64))
+        self.assertTrue(reopened.is_stale())
+
+    @patch('src.util.upstream.requests.get')
+    def test_refresh_mirrors_upstream(self, mock_get):
+        """Test that refresh parses upstream batch-data into the index"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {'data': ['raw']}
+        mock_get.return_value = mock_response
+
+        with patch('src.agent_tools.cruise_retrieval_tool.extract_cruise_summary', return_value=[_cruise(2)]):
+            self.assertEqual(self.retriever.refresh(), 1)
+        self.assertIn("batch-data?time.fromDate=", mock_get.call_args[0][0])
+
+    @patch('src.util.upstream.requests.get')
+    def test_refresh_reads_every_page(self, mock_get):
+        """Test that refresh mirrors all pages of upcoming cruises, not only the first"""
+        pages = {1: ['raw'] * upstream.PAGE_SIZE, 2: ['raw'] * upstream.PAGE_SIZE, 3: ['raw']}
+
+        def get(url, **kwargs):
+            response = MagicMock()
+            response.json.return_value = {'data': pages[int(url.rsplit("control.page=", 1)[1])]}
+            return response
+
+        mock_get.side_effect = get
+        with patch('src.agent_tools.cruise_retrieval_tool.extract_cruise_summary',
+                   return_value=[_cruise(2)]) as mock_extract:
+            self.retriever.refresh()
+
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(len(mock_extract.call_args[0][0]), 2 * upstream.PAGE_SIZE + 1)
+
+    def test_concurrent_rebuilds_keep_current_version(self):
+        """Test that rebuilds racing on one directory never remove the version CURRENT points to"""
+        root = Path(self.directory.name)
+        retrievers = [CruiseRetriever(root, embedder=HashingEmbedder()) for _ in range(4)]
+        threads = [threading.Thread(target=r.build, args=([_cruise(1 + i % 3)],)) for i, r in enumerate(retrievers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        index = load_vector_index(root)
+        self.assertIsNotNone(index)
+        self.assertEqual(index.count, 1)
+        self.assertLessEqual(len(list(root.glob("v*"))), 2)
+
+
+class TestFindCruisesByDescription(unittest.TestCase):
+
+    def test_returns_upcoming_matches_only(self):
+        """Test that cruises without upcoming departures are skipped"""
+        with tempfile.TemporaryDirectory() as directory:
+            retriever = CruiseRetriever(Path(directory), embedder=HashingEmbedder())
+            retriever.build([_cruise(1), _cruise(4, begin_date="2000-01-01")])
+
+            with patch.object(cruise_retrieval_tool, '_retriever', retriever):
+                result = find_cruises_by_description("cultural cruise with museums", limit=5)
+
+        self.assertEqual([c['cruise_id'] for c in result], [1])
+
+    def test_ranks_a_plain_search_while_the_index_is_empty(self):
+        """Test that without an index the description ranks upcoming cruises from search_cruises"""
+        with tempfile.TemporaryDirectory() as directory:
+            retriever = CruiseRetriever(Path(directory), embedder=HashingEmbedder())
+
+            with patch.object(cruise_retrieval_tool, '_retriever', retriever), \
+                    patch.object(retriever, 'refresh_in_background') as refresh, \
+                    patch('src.agent_tools.advanced_api_search.search_cruises',
+                          return_value=[_cruise(2), _cruise(3), _cruise(1)]):
+                result = find_cruises_by_description("fjords and glaciers", limit=5)
+
+        refresh.assert_called_once()
+        self.assertEqual(result[0]['cruise_id'], 3)
+
+    def test_hashing_embedder_is_logged(self):
+        """Test that running without a semantic embedding model is reported"""
+        with tempfile.TemporaryDirectory() as directory, self.assertLogs(cruise_retrieval_tool.logger, "WARNING"):
+            CruiseRetriever(Path(directory), embedder=HashingEmbedder())
+
+
+if __name__ == '__main__':
+    unittest.main()
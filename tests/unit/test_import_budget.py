@@ -0,0 +1,15 @@
+import unittest
+
+from benchmarks.bench_import_time import HEAVY_MODULES, imported_packages, measure_import
+
+
+class TestApiImportBudget(unittest.TestCase):
+    # The import time itself is checked by benchmarks.bench_import_time, wall-clock budgets are flaky here
+
+    def test_heavy_dependencies_are_not_imported(self):
+        """Test that importing the API leaves LangChain, the OpenAI client, numpy and the DB drivers to the warm-up"""
+        self.assertEqual(imported_packages(measure_import("src.api")) & set(HEAVY_MODULES), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from src import api
+from src.util import metrics, tracing
+from src.util.metrics import Counter, Gauge, Histogram, Registry
+from src.util.tracing import span, start_trace
+
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+class TestMetricTypes(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets, sum and count follow the exposition format"""
+        histogram = Histogram("latency_seconds", "Latency", ["tool"], buckets=(0.1, 1.0), registry=self.registry)
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.labels("search_cruises").observe(value)
+
+        text = self.registry.render()
+
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertEqual(_sample(text, 'latency_seconds_bucket{tool="search_cruises",le="0.1"}'), 1)
+        self.assertEqual(_sample(text, 'latency_seconds_bucket{tool="search_cruises",le="1"}'), 3)
+        self.assertEqual(_sample(text, 'latency_seconds_bucket{tool="search_cruises",le="+Inf"}'), 4)
+        self.assertEqual(_sample(text, 'latency_seconds_count{tool="search_cruises"}'), 4)
+        self.assertAlmostEqual(_sample(text, 'latency_seconds_sum{tool="search_cruises"}'), 4.05)
+
+    def test_counter_gauge_and_label_escaping(self):
+        """Test counters, function gauges and escaping of label values"""
+        counter = Counter("requests_total", "Requests", ["path"], registry=self.registry)
+        counter.labels('/a"b').inc()
+        counter.labels('/a"b').inc(2)
+        gauge = Gauge("queue_depth", "Depth", ["queue"], registry=self.registry)
+        gauge.labels("tools").set_function(lambda: 7)
+
+        text = self.registry.render()
+
+        self.assertEqual(_sample(text, 'requests_total{path="/a\\"b"}'), 3)
+        self.assertEqual(_sample(text, 'queue_depth{queue="tools"}'), 7)
+
+    def test_wrong_label_count(self):
+        """Test that a label count mismatch is rejected"""
+        counter = Counter("requests_total", "Requests", ["path"], registry=self.registry)
+
+        with self.assertRaises(ValueError):
+            counter.labels("a", "b")
+
+
+class TestSpanMetrics(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(tracing, 'export')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_spans_feed_metrics(self):
+        """Test that finished spans update the latency, token and cache metrics"""
+        before = metrics.REGISTRY.render()
+
+        with start_trace("POST /ask", chat_id="c1"):
+            with span("tool.search_cruises", **{"tool.name": "search_cruises"}):
+                with span("http.get", **{"url.full": "https://center.cruises/api/chatbot/cruises/batch-data?x=1",
+                                         "http.response.status_code": 200}):
+                    pass
+            with span("llm.chat", **{"llm.model": "test-model", "llm.usage.input_tokens": 1200,
+                                     "llm.usage.output_tokens": 40, "llm.usage.cached_tokens": 1024}):
+                pass
+            with span("cache.get", **{"cache.name": "price_quote", "cache.hit": True}):
+                pass
+            with span("db.checkpoint.get"):
+                pass
+
+        after = metrics.REGISTRY.render()
+
+        def delta(line_prefix):
+            return (_sample(after, line_prefix) or 0) - (_sample(before, line_prefix) or 0)
+
+        self.assertEqual(delta('ask_request_duration_seconds_count{status="ok"}'), 1)
+        self.assertEqual(delta('tool_call_duration_seconds_count{tool="search_cruises",status="ok"}'), 1)
+        self.assertEqual(delta(
+            'upstream_request_duration_seconds_count'
+            '{host="center.cruises",path="/api/chatbot/cruises/batch-data",status="200"}'
+        ), 1)
+        self.assertEqual(delta('llm_tokens_total{model="test-model",kind="input"}'), 1200)
+        self.assertEqual(delta('llm_tokens_total{model="test-model",kind="cached"}'), 1024)
+        self.assertEqual(delta('llm_prompt_cache_ratio_bucket{model="test-model",le="0.9"}'), 1)
+        self.assertEqual(delta('llm_prompt_cache_ratio_bucket{model="test-model",le="0.75"}'), 0)
+        self.assertEqual(delta('cache_requests_total{cache="price_quote",result="hit"}'), 1)
+        self.assertEqual(delta('db_operation_duration_seconds_count{operation="checkpoint.get"}'), 1)
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics serves the registry in the Prometheus text format"""
+        response = TestClient(api.app).get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE ask_requests_in_flight gauge", response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
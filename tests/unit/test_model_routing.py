@@ -0,0 +1,102 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from src.util import tracing
+from src.util.agent_tracing import TracingMiddleware
+from src.util.model_routing import (
+    COMPARISON, PACKAGE, SEARCH, SMALL_TALK, SUMMARISATION, ModelRouter, ModelRoutingMiddleware, classify_step
+)
+from src.util.tracing import start_trace
+
+
+class _FakeModel(GenericFakeChatModel):
+    model_name: str = ""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class TestClassifyStep(unittest.TestCase):
+
+    def test_routes(self):
+        """Test that steps are classified from the turn's question and the step's last message"""
+        cases = [
+            ([HumanMessage("Hello!")], SMALL_TALK),
+            ([HumanMessage("Спасибо")], SMALL_TALK),
+            ([HumanMessage("thanks, bye!")], SMALL_TALK),
+            ([HumanMessage("ok")], SEARCH),
+            ([HumanMessage("Нет")], SEARCH),
+            ([AIMessage("Shall I check prices for the MSC Euribia?"), HumanMessage("yes")], SEARCH),
+            ([AIMessage("Shall I check prices for the MSC Euribia?"), HumanMessage("great!")], SEARCH),
+            ([AIMessage("Here are the prices."), HumanMessage("great, thank you!")], SMALL_TALK),
+            ([HumanMessage("Hi, cruises from Barcelona in July?")], SEARCH),
+            ([HumanMessage("yes, Norway in June please")], SEARCH),
+            ([HumanMessage("Да, на 7 ночей")], SEARCH),
+            ([HumanMessage("Do I need to pay gratuities on NCL?")], SEARCH),
+            ([HumanMessage("Gratuities on NCL and cruises from Miami"), AIMessage(""),
+              ToolMessage("...", tool_call_id="1", name="get_package_info")], PACKAGE),
+            ([HumanMessage("Gratuities on NCL and cruises from Miami"), AIMessage(""),
+              ToolMessage("...", tool_call_id="1", name="get_package_info"),
+              ToolMessage("[]", tool_call_id="2", name="search_cruises")], SEARCH),
+            ([HumanMessage("Cruises from Barcelona in July")], SEARCH),
+            ([HumanMessage("Compare MSC Euribia and Icon of the Seas")], COMPARISON),
+            ([HumanMessage("Что лучше для семьи?")], COMPARISON),
+            ([HumanMessage("hi"), AIMessage(""), SystemMessage("Summarize this conversation")], SUMMARISATION),
+            ([HumanMessage("yes"), AIMessage(""), ToolMessage("[]", tool_call_id="1")], SEARCH),
+        ]
+        for messages, route in cases:
+            with self.subTest(messages[0].content):
+                self.assertEqual(classify_step(messages), route)
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def test_tiers_and_overrides(self):
+        """Test that routes map to configured tiers and each model is created once"""
+        created = []
+
+        def factory(name):
+            created.append(name)
+            return name
+
+        with patch.dict(os.environ, {"MODEL_ROUTES": "comparison=large", "MODEL_TIER_FAST": "tiny"}):
+            router = ModelRouter(factory, standard_model="gpt-5-mini")
+
+        self.assertEqual(router.model(SMALL_TALK), "tiny")
+        self.assertEqual(router.model(PACKAGE), "tiny")
+        self.assertEqual(router.model(SEARCH), "gpt-5-mini")
+        self.assertEqual(router.model(COMPARISON), "gpt-5")
+        self.assertEqual(created, ["tiny", "gpt-5-mini", "gpt-5"])
+
+    def test_middleware_dispatches_per_step(self):
+        """Test that the agent answers small talk on the fast tier and records the tier on the llm span"""
+        models = {
+            "fast-model": _FakeModel(model_name="fast-model", messages=iter([AIMessage("Hello! How can I help?")])),
+            "std-model": _FakeModel(model_name="std-model", messages=iter([AIMessage("Here are cruises.")])),
+        }
+        with patch.dict(os.environ, {"MODEL_TIER_FAST": "fast-model"}):
+            router = ModelRouter(models.__getitem__, standard_model="std-model")
+        agent = create_agent(
+            models["std-model"], tools=[], middleware=[TracingMiddleware(), ModelRoutingMiddleware(router)]
+        )
+
+        with patch.object(tracing, 'export'):
+            with start_trace("POST /ask") as root:
+                greeting = agent.invoke({"messages": [HumanMessage("hi")]})
+                search = agent.invoke({"messages": [HumanMessage("Cruises from Barcelona")]})
+
+        self.assertEqual(greeting["messages"][-1].content, "Hello! How can I help?")
+        self.assertEqual(search["messages"][-1].content, "Here are cruises.")
+        llm_spans = [s.attributes for s in root.trace.spans if s.name == "llm.chat"]
+        self.assertEqual([(a["llm.route"], a["llm.tier"], a["llm.model"]) for a in llm_spans], [
+            (SMALL_TALK, "fast", "fast-model"), (SEARCH, "standard", "std-model")
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.agent_tools.packages_knowledge_tool import (
+    PackageKnowledgeBase, _detect_line, _detect_topic, _expand_query, classify_package_question,
+    get_packages_knowledge
+)
+
+# (query, cruise line, heading expected in the returned snippet)
+RETRIEVAL_CASES = [
+    ("What drink packages are there?", "celebrity", "## Classic Drinks Package"),
+    ("premium drinks", "celebrity", "## Premium Drinks Package"),
+    ("bottled water", "celebrity", "## Bottled Water Package"),
+    ("gratuities", "celebrity", "## Gratuities"),
+    ("Is Wi-Fi included?", "celebrity", "## Internet Packages"),
+    ("coffee", "royal caribbean", "## Café Select Coffee Card"),
+    ("what is not included", "royal caribbean", "## Not Included in the Cruise Fare"),
+    ("internet streaming", "royal caribbean", "## Internet Packages"),
+    ("what is included in the base fare", "ncl", "## What Is Included in the Base Cruise Fare"),
+    ("streaming wifi", "ncl", "## Wi-Fi Packages"),
+    ("Do I need to pay tips?", "costa", "## Service Charge (Gratuities)"),
+    ("Какие напитки входят в пакет?", "costa", "## My Drinks Package"),
+    ("Есть ли вайфай?", "royal caribbean", "## Internet Packages"),
+    ("Сколько стоит интернет?", "celebrity", "## Internet Packages"),
+    ("Чи потрібно платити чайові?", "ncl", "## Gratuities"),
+    ("Що входить у вартість?", "costa", "## My Cruise Fare"),
+]
+
+
+class TestDetectLine(unittest.TestCase):
+
+    def test_line_keys_match_whole_words(self):
+        """Test that short line keys do not match inside other words"""
+        self.assertEqual(_detect_line("What drinks are included on Costa?", None), "costa")
+        self.assertIsNone(_detect_line("What is included in the fare?", None))
+
+    def test_explicit_cruise_line_wins(self):
+        """Test that the cruise_line argument takes priority over the text"""
+        self.assertEqual(_detect_line("drinks on celebrity", "Norwegian Cruise Line"), "norwegian")
+
+
+class TestClassifyPackageQuestion(unittest.TestCase):
+
+    def test_package_questions(self):
+        """Test standalone package questions with an explicit cruise line"""
+        cases = {
+            "Do I need to pay gratuities on NCL?": ("ncl", "gratuities"),
+            "Costa drinks package": ("costa", "drinks"),
+            "Which internet plans does Celebrity have?": ("celebrity", "wifi"),
+        }
+        for question, expected in cases.items():
+            with self.subTest(question=question):
+                self.assertEqual(classify_package_question(question), expected)
+
+    def test_not_confident(self):
+        """Test that searches, vague or line-less questions go to the full agent"""
+        questions = [
+            "What is included?",
+            "Celebrity cruise from Barcelona with drinks package",
+            "Find NCL cruises with a drinks package",
+            "Royal Caribbean drinks package for the 15 June sailing",
+            "Hello!",
+            "Does Royal Caribbean have waterslides?",
+            "",
+        ]
+        for question in questions:
+            with self.subTest(question=question):
+                self.assertIsNone(classify_package_question(question))
+
+
+class TestDetectTopic(unittest.TestCase):
+
+    def test_keywords_match_whole_words(self):
+        """Test that topic keywords and translated stems do not match inside longer words"""
+        self.assertEqual(_detect_topic("bottled water"), "drinks")
+        self.assertIsNone(_detect_topic("does royal caribbean have waterslides?"))
+        self.assertEqual(_expand_query("бутилированная вода"), ["water"])
+        self.assertEqual(_expand_query("водные горки и винтажный декор"), [])
+
+
+class TestPackageKnowledgeRetrieval(unittest.TestCase):
+
+    def test_retrieval_quality(self):
+        """Test that the expected section is among the returned sections"""
+        for query, line, heading in RETRIEVAL_CASES:
+            with self.subTest(query=query, line=line):
+                self.assertIn(heading, get_packages_knowledge(query, line))
+
+    def test_unknown_line_asks_for_confirmation(self):
+        """Test that a missing cruise line asks the user to confirm it"""
+        self.assertIn("please confirm the cruise line", get_packages_knowledge("drinks"))
+
+    def test_no_topic_returns_menu(self):
+        """Test that a question without a package topic returns the menu"""
+        self.assertIn("What exactly would you like to know?", get_packages_knowledge("hello", "ncl"))
+
+
+class TestPackageKnowledgeBase(unittest.TestCase):
+
+    def test_reloads_changed_files(self):
+        """Test that edited knowledge files are re-indexed"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "ncl.md"
+            path.write_text("# NCL\n\n## Gratuities\nTips are $20 per day.\n", encoding="utf-8")
+            knowledge_base = PackageKnowledgeBase(Path(directory), reload_interval=0)
+
+            hits = knowledge_base.search({"tip": 1.0}, "ncl.md")
+            self.assertIn("$20", hits[0][0])
+
+            path.write_text("# NCL\n\n## Gratuities\nTips are $25 per day.\n", encoding="utf-8")
+            stat = path.stat()
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+            hits = knowledge_base.search({"tip": 1.0}, "ncl.md")
+            self.assertIn("$25", hits[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
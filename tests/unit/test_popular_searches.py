@@ -0,0 +1,112 @@
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent_tools import advanced_api_search
+from src.util import popular_searches
+from src.util.cache import SQLiteBackend
+from src.util.popular_searches import PopularSearchWarmer, mine_search_shapes, search_arguments, search_shape
+
+DAY = date(2026, 10, 1)
+
+
+def _search(call_id, **arguments):
+    return {"name": "search_cruises", "args": arguments, "id": call_id}
+
+
+def _write(thread_id, day, *tool_calls):
+    return thread_id, f"{day.isoformat()}T12:00:00+00:00", [AIMessage(content="", tool_calls=list(tool_calls))]
+
+
+class TestSearchShapes(unittest.TestCase):
+
+    def test_dates_are_relative_to_the_call(self):
+        """Test that shapes keep filters, store dates as offsets and re-materialise them for another day"""
+        shape = search_shape({"port_from": "Barcelona", "time_from_date": "2026-10-01", "time_to_date": "2026-12-30",
+                              "price_max": None, "unknown": 1}, DAY)
+
+        self.assertEqual(shape, search_shape({"time_to_date": "2026-12-31", "time_from_date": "2026-10-02",
+                                              "port_from": "Barcelona"}, DAY + timedelta(days=1)))
+        self.assertEqual(search_arguments(shape, date(2027, 1, 1)), {
+            "port_from": "Barcelona", "time_from_date": "2027-01-01", "time_to_date": "2027-04-01"
+        })
+        self.assertIsNone(search_shape({"time_to_date": "2026-09-01"}, DAY))
+        self.assertIsNone(search_shape({"time_from_date": "July"}, DAY))
+
+    def test_mine_counts_tool_calls_of_recent_writes(self):
+        """Test that search and batch calls of the newest message writes are counted once per call"""
+        checkpointer = MagicMock()
+        checkpointer.recent_writes.return_value = [
+            _write("t1", DAY, _search("2", port_from="Miami")),
+            _write("t1", DAY, _search("1", country_to="Italy")),
+            ("t1", f"{DAY.isoformat()}T12:00:00+00:00", HumanMessage("Cruises please")),
+            _write("t2", DAY, {"name": "search_cruises_batch", "id": "3", "args": {"queries": [
+                {"country_to": "Italy"}, {"country_to": "Norway"}
+            ]}}),
+            _write("t3", DAY, {"name": "get_current_date", "id": "4", "args": {}}),
+        ]
+
+        counts = mine_search_shapes(checkpointer, scan=100)
+
+        checkpointer.recent_writes.assert_called_once_with("messages", 100)
+        self.assertEqual(counts.most_common(), [
+            ('{"country_to": "Italy"}', 2), ('{"port_from": "Miami"}', 1), ('{"country_to": "Norway"}', 1)
+        ])
+
+
+class TestPopularSearchWarmer(unittest.TestCase):
+
+    def setUp(self):
+        advanced_api_search._search_cache.clear()
+
+    def test_refresh_warms_top_shapes_for_today(self):
+        """Test that the top shapes are fetched for today's dates into the search cache"""
+        checkpointer = MagicMock()
+        yesterday = date.today() - timedelta(days=1)
+        checkpointer.recent_writes.return_value = [
+            _write("t1", yesterday, _search("1", country_to="Italy", time_from_date=yesterday.isoformat())),
+            _write("t2", yesterday, _search("2", country_to="Italy", time_from_date=yesterday.isoformat())),
+            _write("t3", yesterday, _search("3", country_to="Norway")),
+        ]
+        warmer = PopularSearchWarmer(lambda: checkpointer, top_n=1)
+
+        with patch('src.agent_tools.advanced_api_search.get_country_id', return_value=7), \
+                patch('src.agent_tools.advanced_api_search.extract_cruise_summary', return_value=[{"cruise_id": 1}]), \
+                patch('src.util.upstream.requests.get') as mock_get:
+            mock_get.return_value.json.return_value = {"data": []}
+            found = warmer.refresh()
+            cached = advanced_api_search.search_cruises(country_to="Italy", time_from_date=date.today().isoformat())
+
+        self.assertEqual(found, {f'{{"country_to": "Italy", "time_from_date": {{"days": 0}}}}': 1})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIn(f"time.fromDate={date.today().isoformat()}", mock_get.call_args[0][0])
+        self.assertEqual(cached, [{"cruise_id": 1}])
+
+    def test_mining_waits_for_the_checkpointer(self):
+        """Test that nothing is refreshed while the checkpointer is not open, and mining is retried"""
+        warmer = PopularSearchWarmer(lambda: None)
+
+        self.assertEqual(warmer.refresh(), {})
+        self.assertIsNone(warmer.mined_at)
+
+    def test_one_refresher_per_shared_backend(self):
+        """Test that only the lease holder refreshes when instances share a cache backend"""
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteBackend(Path(tmp) / "cache.sqlite3")
+            first, second = PopularSearchWarmer(lambda: None), PopularSearchWarmer(lambda: None)
+
+            with patch.object(popular_searches, 'get_shared_backend', return_value=backend):
+                self.assertTrue(first.is_refresher(60))
+                self.assertFalse(second.is_refresher(60))
+                self.assertTrue(first.is_refresher(60))
+
+            with patch.object(popular_searches, 'get_shared_backend', return_value=None):
+                self.assertTrue(second.is_refresher(60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from src.agent_tools import price_calculator_tool
+from src.agent_tools.price_calculator_tool import calculate_price, calculate_prices
+from src.util import upstream
+
+
+def _price_response(url, **kwargs):
+    response = MagicMock()
+    response.json.return_value = {'data': {'url': url}}
+    return response
+
+
+class TestCalculatePrice(unittest.TestCase):
+
+    def setUp(self):
+        price_calculator_tool._quote_cache.clear()
+
+    @patch('src.util.upstream.requests.get')
+    def test_quote_is_cached(self, mock_get):
+        """Test that repeated quotes for the same configuration hit the cache"""
+        mock_get.side_effect = _price_response
+
+        first = calculate_price(100, 2, 1)
+        second = calculate_price(100, 2, 1)
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIn("cruiseDateRangeId=100&adultCount=2&childCount=1", mock_get.call_args[0][0])
+
+    @patch('src.util.upstream.requests.get')
+    def test_failed_quote_is_not_cached(self, mock_get):
+        """Test that failed quotes are retried on the next call"""
+        mock_get.side_effect = Exception("boom")
+
+        self.assertEqual(calculate_price(100, 2, 0), -1)
+        self.assertEqual(calculate_price(100, 2, 0), -1)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_missing_range_id(self):
+        """Test that a missing range id is rejected without an upstream call"""
+        self.assertEqual(calculate_price(None, 2, 0), -1)
+
+    @patch('src.util.upstream.requests.get')
+    def test_price_matrix(self, mock_get):
+        """Test pricing several ranges and passenger configurations in one call"""
+        mock_get.side_effect = _price_response
+
+        result = calculate_prices(
+            [100, 200],
+            [{"adults_count": 2, "children_count": 1}, {"adults_count": 3}, {"adults_count": 2, "children_count": 1}]
+        )
+
+        matrix = result["prices"]
+        self.assertEqual(mock_get.call_count, 4)
+        self.assertFalse(result["truncated"])
+        self.assertEqual(result["skipped"], [])
+        self.assertEqual(set(matrix.keys()), {"100", "200"})
+        self.assertEqual(set(matrix["200"].keys()), {"2A+1C", "3A+0C"})
+        self.assertIn("cruiseDateRangeId=200&adultCount=3&childCount=0", matrix["200"]["3A+0C"]['url'])
+
+    @patch('src.util.upstream.requests.get')
+    def test_price_matrix_is_capped(self, mock_get):
+        """Test that the number of quotes per call is bounded and the quotes left out are reported"""
+        mock_get.side_effect = _price_response
+
+        result = calculate_prices(list(range(50)), [{"adults_count": 2}])
+
+        self.assertEqual(mock_get.call_count, price_calculator_tool.MAX_PRICE_QUOTES)
+        self.assertEqual(len(result["prices"]), price_calculator_tool.MAX_PRICE_QUOTES)
+        self.assertTrue(result["truncated"])
+        self.assertEqual(len(result["skipped"]), 50 - price_calculator_tool.MAX_PRICE_QUOTES)
+        self.assertEqual(result["skipped"][0], {"range_id": str(price_calculator_tool.MAX_PRICE_QUOTES),
+                                                "passengers": "2A+0C"})
+
+
+    @patch('src.util.upstream.requests.get')
+    def test_invalid_passenger_configs_are_skipped(self, mock_get):
+        """Test that a bad passenger configuration is reported while the valid ones are priced"""
+        mock_get.side_effect = _price_response
+
+        result = calculate_prices([100], [{"adults_count": None}, {"adults_count": "two"}, "2 adults",
+                                          {"adults_count": "2", "children_count": 1}])
+
+        self.assertEqual(list(result["prices"]["100"]), ["2A+1C"])
+        self.assertFalse(result["truncated"])
+        self.assertEqual([s["passenger_config"] for s in result["skipped"]],
+                         [{"adults_count": None}, {"adults_count": "two"}, "2 adults"])
+        self.assertEqual(result["skipped"][0]["error"], price_calculator_tool.INVALID_PASSENGERS)
+
+    def test_quotes_see_the_caller_deadline(self):
+        """Test that the upstream deadline of the tool call reaches the quote worker threads"""
+        seen = []
+
+        def quote(range_id, adults, children):
+            seen.append(upstream._time_left())
+            return 1000
+
+        with patch.object(price_calculator_tool, 'calculate_price', side_effect=quote), upstream.deadline(5):
+            calculate_prices([100, 200], [{"adults_count": 2}])
+
+        self.assertEqual(len(seen), 2)
+        self.assertTrue(all(left is not None and 0 < left <= 5 for left in seen))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import contextvars
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.util import profiling
+from src.util.profiling import profile_request, run_profiled, should_profile
+
+
+def busy_tool(n):
+    return sum(i * i for i in range(n))
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = patch.object(profiling, 'PROFILE_DIR', Path(self.directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_triggers(self):
+        """Test that only the configured token or the sample rate enable profiling"""
+        with patch.object(profiling, 'PROFILE_TOKEN', "secret"), patch.object(profiling, 'PROFILE_SAMPLE_RATE', 0):
+            self.assertEqual(should_profile("secret"), "header")
+            self.assertIsNone(should_profile("guess"))
+            self.assertIsNone(should_profile(None))
+        with patch.object(profiling, 'PROFILE_TOKEN', None), patch.object(profiling, 'PROFILE_SAMPLE_RATE', 1.0):
+            self.assertEqual(should_profile(""), "sample")
+
+    def test_disabled_request_stores_nothing(self):
+        """Test that an unprofiled request runs normally and writes no files"""
+        with profile_request("r1", None) as profiled:
+            self.assertFalse(profiled)
+            self.assertEqual(run_profiled(busy_tool, 10), 285)
+
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_profile_includes_worker_threads(self):
+        """Test that tool threads are merged into the stored profile and the report renders"""
+        results = []
+        with profile_request("r1", "header", chat_id="c1") as profiled:
+            ctx = contextvars.copy_context()
+            worker = threading.Thread(target=lambda: results.append(ctx.run(run_profiled, busy_tool, 1000)))
+            worker.start()
+            worker.join()
+
+        self.assertTrue(profiled)
+        self.assertEqual(results, [332833500])
+        [metadata] = profiling.list_profiles()
+        self.assertEqual((metadata["request_id"], metadata["chat_id"], metadata["trigger"]), ("r1", "c1", "header"))
+
+        report = profiling.render_profile(profiled)
+        self.assertIn("busy_tool", report)
+        self.assertIn("allocation sites", report)
+
+    def test_one_request_at_a_time(self):
+        """Test that a request arriving while another is profiled is not profiled"""
+        with profile_request("r1", "sample") as first:
+            with profile_request("r2", "sample") as second:
+                pass
+
+        self.assertTrue(first)
+        self.assertFalse(second)
+        self.assertEqual([p["request_id"] for p in profiling.list_profiles()], ["r1"])
+
+    def test_old_profiles_are_pruned(self):
+        """Test that only the newest PROFILE_MAX_FILES profiles are kept"""
+        with patch.object(profiling, 'PROFILE_MAX_FILES', 2):
+            for request_id in ("r1", "r2", "r3"):
+                with profile_request(request_id, "sample"):
+                    pass
+
+        self.assertEqual([p["request_id"] for p in profiling.list_profiles()], ["r3", "r2"])
+        self.assertEqual(len(list(Path(self.directory.name).glob("*.prof"))), 2)
+
+    def test_client_request_id_is_not_a_file_name(self):
+        """Test that profile files are named by a server-generated id whatever the request id"""
+        with profile_request("../../etc/x", "header") as profile_id:
+            pass
+
+        self.assertRegex(profile_id, r"^[0-9a-f]{32}$")
+        [metadata] = profiling.list_profiles()
+        self.assertEqual((metadata["profile_id"], metadata["request_id"]), (profile_id, "../../etc/x"))
+        self.assertEqual(metadata["tracemalloc_scope"], "process")
+        self.assertEqual({p.name for p in Path(self.directory.name).iterdir()},
+                         {f"{profile_id}{suffix}" for suffix in (".json", ".prof", ".tracemalloc")})
+        with self.assertRaises(ValueError):
+            profiling.render_profile("../r1")
+
+
+if __name__ == '__main__':
+    unittest.main()
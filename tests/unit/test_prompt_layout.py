@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import tool
+
+from src.util import tracing
+from src.util.agent_tracing import TracingMiddleware
+from src.util.prompt_layout import PromptLayoutMiddleware, load_llm_calls, render_report
+from src.util.tracing import start_trace, to_otlp
+
+
+class _RecordingModel(GenericFakeChatModel):
+    """Fake chat model that records the tools and system prompt of every call."""
+    calls: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        self.calls.append({"tools": [t.name for t in tools]})
+        return self
+
+    def _generate(self, messages, *args, **kwargs):
+        self.calls[-1]["messages"] = messages
+        return super()._generate(messages, *args, **kwargs)
+
+
+@tool
+def search_cruises(query: str) -> str:
+    """Search cruises."""
+    return "[]"
+
+
+@tool
+def get_cruise_info(cruise_id: str) -> str:
+    """Cruise details."""
+    return "{}"
+
+
+class TestPromptLayoutMiddleware(unittest.TestCase):
+
+    def _run(self, tools, messages):
+        model = _RecordingModel(messages=iter([AIMessage("answer")]), calls=[])
+        agent = create_agent(
+            model, tools=tools, system_prompt="You are a cruise assistant.",
+            middleware=[TracingMiddleware(), PromptLayoutMiddleware("You are a cruise assistant.")]
+        )
+        with patch.object(tracing, 'export'):
+            with start_trace("POST /ask") as root:
+                agent.invoke({"messages": messages})
+        llm_span = next(s for s in root.trace.spans if s.name == "llm.chat")
+        return model.calls[0], llm_span.attributes
+
+    def test_prefix_is_stable(self):
+        """Test that tool order and conversation do not change the prompt prefix"""
+        first_call, first = self._run([search_cruises, get_cruise_info], [HumanMessage("Cruises from Barcelona")])
+        second_call, second = self._run(
+            [get_cruise_info, search_cruises],
+            [SystemMessage("Summary: user likes MSC"), HumanMessage("And from Rome?")]
+        )
+
+        self.assertEqual(first_call["tools"], ["get_cruise_info", "search_cruises"])
+        self.assertEqual(second_call["tools"], first_call["tools"])
+        self.assertEqual(first_call["messages"][0].content, "You are a cruise assistant.")
+        self.assertEqual(first["llm.prompt.prefix_hash"], second["llm.prompt.prefix_hash"])
+        self.assertEqual(first["llm.prompt.tools_chars"], second["llm.prompt.tools_chars"])
+        self.assertEqual(first["llm.prompt.context_chars"], 0)
+        self.assertEqual(second["llm.prompt.context_chars"], len("Summary: user likes MSC"))
+        self.assertEqual(second["llm.prompt.history_chars"], len("And from Rome?"))
+
+    def test_prefix_changes_with_tools(self):
+        """Test that a different tool set is reported as a different prefix"""
+        _, both = self._run([search_cruises, get_cruise_info], [HumanMessage("hi")])
+        _, one = self._run([search_cruises], [HumanMessage("hi")])
+
+        self.assertNotEqual(both["llm.prompt.prefix_hash"], one["llm.prompt.prefix_hash"])
+
+
+class TestPromptReport(unittest.TestCase):
+
+    def test_report_from_exported_traces(self):
+        """Test that the report reads llm spans from OTLP/JSON lines and totals cached tokens"""
+        with patch.object(tracing, 'export'):
+            with start_trace("POST /ask", request_id="r1") as root:
+                for cached in (0, 1024):
+                    with tracing.span("llm.chat", **{
+                        "llm.route": "structured_search", "llm.tier": "standard", "llm.model": "gpt-5-mini",
+                        "llm.prompt.prefix_hash": "abc123",
+                        "llm.prompt.system_chars": 7000, "llm.prompt.tools_chars": 3000,
+                        "llm.prompt.context_chars": 0, "llm.prompt.history_chars": 500,
+                        "llm.usage.input_tokens": 2048, "llm.usage.cached_tokens": cached,
+                    }):
+                        pass
+                with tracing.span("llm.chat", **{
+                    "llm.route": "small_talk", "llm.tier": "fast", "llm.model": "gpt-5-nano",
+                    "llm.prompt.prefix_hash": "abc123", "llm.prompt.system_chars": 7000, "llm.prompt.tools_chars": 3000,
+                    "llm.prompt.context_chars": 0, "llm.prompt.history_chars": 500,
+                    "llm.usage.input_tokens": 2048, "llm.usage.cached_tokens": 0,
+                }):
+                    pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(to_otlp(root.trace)) + "\n")
+            calls = load_llm_calls(path)
+
+        self.assertEqual([c["llm.usage.cached_tokens"] for c in calls], [0, 1024, 0])
+        self.assertEqual(calls[0]["request_id"], "r1")
+        report = render_report(calls)
+        self.assertIn("50%", report.splitlines()[2])
+        self.assertIn("3 calls, 1 distinct prefixes, stable prefix 95% of prompt characters, "
+                      "1024/6144 input tokens cached (17%)", report)
+        self.assertIn("tier fast (gpt-5-nano): 1 calls, 0/2048 input tokens cached (0%)", report)
+        self.assertIn("tier standard (gpt-5-mini): 2 calls, 1024/4096 input tokens cached (25%)", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from benchmarks.replay import Replay, anonymise, build_conversations, render_report, stub_llm, stub_upstream_get
+
+
+class _AskHandler(BaseHTTPRequestHandler):
+    """Answers /ask with 200, or 429 for questions containing "busy"."""
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.received.append((body, self.headers["Authorization"]))
+        status = 429 if "busy" in body["question"] else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExtract(unittest.TestCase):
+
+    def test_anonymise(self):
+        """Test that contact details and names are replaced while dates and prices stay"""
+        text = anonymise("My name is John Smith, mail john.smith@gmail.com or call +44 20 7946 0958. "
+                         "Card 4111 1111 1111 1111. Cruise 2026-07-01 under 1500 EUR")
+
+        self.assertEqual(text, "My name is Alex, mail user@example.com or call +000 000 0000. "
+                               "Card 0000 0000 0000 0000. Cruise 2026-07-01 under 1500 EUR")
+        self.assertEqual(anonymise("Меня зовут Ольга"), "Меня зовут Alex")
+
+    def test_build_conversations(self):
+        """Test that user messages are grouped per thread with start and turn offsets"""
+        rows = [
+            {"msg_type": 1, "thread_id": "b", "message": "Cruises from Rome", "created_at": "2026-10-01T10:00:30"},
+            {"msg_type": 1, "thread_id": "a", "message": "Hi", "created_at": "2026-10-01T10:00:00"},
+            {"msg_type": 2, "thread_id": "a", "message": "Hello! How can I help?", "created_at": "2026-10-01T10:00:05"},
+            {"msg_type": "1", "thread_id": "a", "message": "Barcelona in July", "created_at": "2026-10-01T10:01:00"},
+        ]
+
+        conversations = build_conversations(rows)
+
+        self.assertEqual(conversations, [
+            {"conversation": "conv-00000", "start": 0.0, "turns": [
+                {"offset": 0.0, "message": "Hi"}, {"offset": 60.0, "message": "Barcelona in July"}
+            ]},
+            {"conversation": "conv-00001", "start": 30.0, "turns": [{"offset": 0.0, "message": "Cruises from Rome"}]},
+        ])
+        self.assertEqual([c["conversation"] for c in build_conversations(rows, min_turns=2)], ["conv-00000"])
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        _AskHandler.received = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _AskHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_replay_and_report(self):
+        """Test that conversations replay in order per chat and the report counts steps and shed turns"""
+        conversations = [
+            {"conversation": "c1", "start": 0, "turns": [{"offset": 0, "message": "Hi"},
+                                                         {"offset": 5, "message": "busy day"}]},
+            {"conversation": "c2", "start": 1, "turns": [{"offset": 0, "message": "Cruises"}]},
+        ]
+        replay = Replay(f"http://127.0.0.1:{self.server.server_port}", concurrency=2, speedup=0, token="t")
+
+        wall_time = replay.run(conversations)
+
+        c1 = [body["question"] for body, _ in _AskHandler.received if body["chat_id"].endswith("-c1")]
+        self.assertEqual(c1, ["Hi", "busy day"])
+        self.assertEqual({auth for _, auth in _AskHandler.received}, {"Bearer t"})
+        self.assertEqual(sorted((r["step"], r["status"]) for r in replay.results), [(1, 200), (1, 200), (2, 429)])
+
+        report = render_report(replay.results, wall_time).splitlines()
+        self.assertTrue(report[0].startswith("3 turns in"))
+        self.assertEqual(report[2].split()[:2], ["1", "2"])
+        self.assertEqual(report[3].split()[-2:], ["100.0%", "1"])
+        self.assertEqual(report[-1], "statuses: 200=2, 429=1")
+
+
+class TestStubs(unittest.TestCase):
+
+    def test_stub_llm_searches_then_answers(self):
+        """Test that the stub model calls search_cruises for a search turn and answers after the tool result"""
+        model = stub_llm(latency=0)(model="gpt-5-mini")
+
+        first = model.invoke([HumanMessage("Cruises from Barcelona")])
+        answer = model.invoke([HumanMessage("Cruises from Barcelona"), first,
+                               ToolMessage("[]", tool_call_id=first.tool_calls[0]["id"])])
+
+        self.assertEqual(model.model_name, "gpt-5-mini")
+        self.assertEqual(first.tool_calls[0]["name"], "search_cruises")
+        self.assertFalse(answer.tool_calls)
+        self.assertTrue(answer.usage_metadata["input_tokens"])
+
+    def test_stub_upstream(self):
+        """Test that stubbed upstreams return empty search results and echo translations"""
+        get = stub_upstream_get(latency=0)
+
+        self.assertEqual(get("https://center.cruises/api/chatbot/cruises/batch-data?x=1").json(), {"data": []})
+        translated = get("https://translate.googleapis.com/translate_a/single?client=gtx&q=Rome%20port").json()
+        self.assertEqual(translated[0][0][0], "Rome port")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from src.util.startup import StartupState
+
+
+class TestStartupState(unittest.TestCase):
+
+    def test_ready_after_all_steps(self):
+        """Test that the instance is ready once every step ran, with a timing per step"""
+        calls = []
+        state = StartupState()
+
+        self.assertFalse(state.ready)
+        ready = state.run([
+            ("db_pool", lambda: calls.append("db_pool"), True),
+            ("catalogs", lambda: calls.append("catalogs"), False),
+        ])
+
+        self.assertTrue(ready)
+        self.assertEqual(calls, ["db_pool", "catalogs"])
+        report = state.report()
+        self.assertTrue(report["ready"])
+        self.assertFalse(report["warming_up"])
+        self.assertEqual(list(report["timings"]), ["db_pool", "catalogs"])
+
+    def test_optional_step_failure_keeps_ready(self):
+        """Test that a failing optional step is reported but does not block readiness"""
+        state = StartupState()
+
+        def fail():
+            raise ConnectionError("offline")
+
+        self.assertTrue(state.run([("llm_connection", fail, False), ("graph_compile", lambda: None, True)]))
+        self.assertEqual(state.errors, {"llm_connection": "offline"})
+
+    def test_required_step_failure_stops_warm_up(self):
+        """Test that a failing required step leaves the instance not ready and skips the rest"""
+        calls = []
+        state = StartupState()
+
+        def fail():
+            raise RuntimeError("db down")
+
+        ready = state.run([("db_pool", fail, True), ("graph_compile", lambda: calls.append(1), True)])
+
+        self.assertFalse(ready)
+        self.assertEqual(calls, [])
+        self.assertIn("db_pool", state.report()["errors"])
+
+
+if __name__ == '__main__':
+    unittest.main()
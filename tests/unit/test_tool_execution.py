@@ -0,0 +1,93 @@
+import time
+import unittest
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+
+from src.util import tool_execution, upstream
+from src.util.tool_execution import ToolExecutionMiddleware
+
+
+class _ToolCallingModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def slow_tool(seconds: float) -> str:
+    """Sleep for the given number of seconds."""
+    time.sleep(seconds)
+    return "done"
+
+
+def deadline_tool() -> str:
+    """Report the time left to upstream calls."""
+    return f"{upstream._time_left():.1f}"
+
+
+def _agent(tool_calls, middleware):
+    messages = iter([AIMessage(content="", tool_calls=tool_calls), AIMessage(content="answer")])
+    return create_agent(
+        _ToolCallingModel(messages=messages), tools=[slow_tool, deadline_tool], middleware=middleware
+    )
+
+
+def _call(call_id, seconds):
+    return {"name": "slow_tool", "args": {"seconds": seconds}, "id": call_id}
+
+
+class TestToolExecutionMiddleware(unittest.TestCase):
+
+    def test_tool_calls_of_one_step_run_concurrently(self):
+        """Test that a multi-tool step costs the slowest tool, not the sum"""
+        agent = _agent([_call("a", 0.3), _call("b", 0.3), _call("c", 0.3)], [ToolExecutionMiddleware()])
+
+        start = time.monotonic()
+        result = agent.invoke({"messages": [("user", "hi")]}, {"max_concurrency": 4})
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.8)
+        tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+        self.assertEqual([m.content for m in tool_messages], ["done", "done", "done"])
+
+    def test_concurrency_cap(self):
+        """Test that max_concurrency bounds tool calls running at once"""
+        agent = _agent([_call("a", 0.2), _call("b", 0.2), _call("c", 0.2)], [ToolExecutionMiddleware()])
+
+        start = time.monotonic()
+        agent.invoke({"messages": [("user", "hi")]}, {"max_concurrency": 1})
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+    def test_slow_tool_times_out(self):
+        """Test that a tool exceeding its timeout returns an error message"""
+        middleware = ToolExecutionMiddleware(timeouts={"slow_tool": 0.1})
+        agent = _agent([_call("a", 1.0), _call("b", 0.01)], [middleware])
+
+        start = time.monotonic()
+        result = agent.invoke({"messages": [("user", "hi")]})
+
+        self.assertLess(time.monotonic() - start, 0.8)
+        tool_messages = {m.tool_call_id: m for m in result["messages"] if isinstance(m, ToolMessage)}
+        self.assertEqual(tool_messages["a"].status, "error")
+        self.assertEqual(tool_messages["a"].content, "no data")
+        self.assertEqual(tool_messages["b"].content, "done")
+        self.assertEqual(tool_execution._counts.running, 1)
+        time.sleep(1.0)
+        self.assertEqual(tool_execution._counts.running, 0)
+        self.assertEqual(tool_execution._counts.waiting, 0)
+
+    def test_upstream_calls_share_the_tool_deadline(self):
+        """Test that a tool's upstream calls are bounded by the tool's own timeout"""
+        middleware = ToolExecutionMiddleware(timeouts={"deadline_tool": 5.0})
+        agent = _agent([{"name": "deadline_tool", "args": {}, "id": "a"}], [middleware])
+
+        result = agent.invoke({"messages": [("user", "hi")]})
+
+        tool_message = next(m for m in result["messages"] if isinstance(m, ToolMessage))
+        self.assertEqual(tool_message.content, "5.0")
+        self.assertIsNone(upstream._time_left())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import json
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.util import tracing, upstream
+from src.util.agent_tracing import TracingMiddleware
+from src.util.cache import TTLCache
+from src.util.tool_execution import ToolExecutionMiddleware
+from src.util.tracing import in_current_context, span, start_trace
+
+
+class _ToolCallingModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def lookup_cruise(cruise_id: str) -> str:
+    """Look up a cruise."""
+    return f"cruise {cruise_id}"
+
+
+def _spans_by_name(root):
+    return {s.name: s for s in root.trace.spans}
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(tracing, 'export')
+        self.mock_export = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_span_outside_trace_is_noop(self):
+        """Test that spans outside a request trace record nothing"""
+        with span("agent.stream") as current:
+            current.set_attribute("ignored", True)
+
+        self.assertIs(current, tracing.NOOP_SPAN)
+        self.assertIsNone(tracing.current_trace_id())
+
+    def test_nested_spans_share_trace(self):
+        """Test that child spans link to their parent and the trace is exported once"""
+        with start_trace("POST /ask", request_id="r1", chat_id="c1") as root:
+            with span("agent.stream") as stream:
+                with span("tool.search_cruises", **{"tool.name": "search_cruises"}) as tool:
+                    pass
+
+        self.assertEqual(stream.parent_id, root.span_id)
+        self.assertEqual(tool.parent_id, stream.span_id)
+        self.assertEqual(len(root.trace.spans), 3)
+        self.mock_export.assert_called_once_with(root.trace)
+
+    def test_error_is_recorded(self):
+        """Test that an exception marks the span as failed and propagates"""
+        with self.assertRaises(ValueError):
+            with start_trace("POST /ask") as root:
+                with span("http.get"):
+                    raise ValueError("boom")
+
+        spans = _spans_by_name(root)
+        self.assertEqual(spans["http.get"].error, "ValueError: boom")
+        self.assertIsNotNone(spans["POST /ask"].end_ns)
+
+    def test_executor_threads_join_trace(self):
+        """Test that work submitted to a thread pool is traced under the submitting span"""
+        def work(i):
+            with span("price.quote", index=i):
+                return i
+
+        with start_trace("POST /ask") as root:
+            with span("tool.calculate_prices") as tool:
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    list(executor.map(in_current_context(work), range(3)))
+
+        quotes = [s for s in root.trace.spans if s.name == "price.quote"]
+        self.assertEqual(len(quotes), 3)
+        self.assertTrue(all(s.parent_id == tool.span_id for s in quotes))
+
+    @patch('src.util.upstream.requests.get')
+    def test_upstream_and_cache_spans(self, mock_get):
+        """Test that upstream requests and named cache lookups record spans"""
+        mock_get.return_value = MagicMock(status_code=200)
+        cache = TTLCache(ttl_seconds=60, name="cruise_info")
+        cache.set("1", "cached")
+
+        with start_trace("POST /ask") as root:
+            upstream.get("https://center.cruises/api/chatbot/cruises/prices?cruiseDateRangeId=1")
+            cache.get("1")
+            cache.get("2")
+
+        http = _spans_by_name(root)["http.get"]
+        self.assertEqual(http.attributes["server.address"], "center.cruises")
+        self.assertEqual(http.attributes["http.response.status_code"], 200)
+        self.assertEqual(
+            [s.attributes["cache.hit"] for s in root.trace.spans if s.name == "cache.get"],
+            [True, False]
+        )
+
+    def test_tracing_middleware_records_llm_and_tool_calls(self):
+        """Test that model calls carry token counts and tool calls get their own span"""
+        messages = iter([
+            AIMessage(
+                content="", tool_calls=[{"name": "lookup_cruise", "args": {"cruise_id": "1"}, "id": "a"}],
+                usage_metadata={"input_tokens": 1200, "output_tokens": 30, "total_tokens": 1230,
+                                "input_token_details": {"cache_read": 1024}}
+            ),
+            AIMessage(content="answer", usage_metadata={"input_tokens": 1300, "output_tokens": 80, "total_tokens": 1380}),
+        ])
+        agent = create_agent(
+            _ToolCallingModel(messages=messages), tools=[lookup_cruise],
+            middleware=[TracingMiddleware(), ToolExecutionMiddleware()]
+        )
+
+        with start_trace("POST /ask") as root:
+            agent.invoke({"messages": [("user", "hi")]})
+
+        llm_spans = [s for s in root.trace.spans if s.name == "llm.chat"]
+        self.assertEqual([s.attributes["llm.usage.input_tokens"] for s in llm_spans], [1200, 1300])
+        self.assertEqual(llm_spans[0].attributes["llm.usage.cached_tokens"], 1024)
+        self.assertEqual(llm_spans[0].attributes["llm.tool_calls"], 1)
+        self.assertIn("tool.lookup_cruise", _spans_by_name(root))
+
+
+class TestExport(unittest.TestCase):
+
+    def test_otlp_json_file_export(self):
+        """Test that a trace is appended to the export file as OTLP/JSON"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "traces.jsonl"
+            with patch.object(tracing, 'TRACE_EXPORT_PATH', str(path)):
+                with start_trace("POST /ask", request_id="r1", chat_id="c1"):
+                    with span("llm.chat", **{"llm.usage.input_tokens": 10}):
+                        pass
+
+            document = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+
+        spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = next(s for s in spans if "parentSpanId" not in s)
+        child = next(s for s in spans if s["name"] == "llm.chat")
+        attributes = {a["key"]: a["value"] for a in child["attributes"]}
+
+        self.assertEqual(child["parentSpanId"], root["spanId"])
+        self.assertEqual(child["traceId"], root["traceId"])
+        self.assertEqual(attributes["chat_id"], {"stringValue": "c1"})
+        self.assertEqual(attributes["request_id"], {"stringValue": "r1"})
+        self.assertEqual(attributes["llm.usage.input_tokens"], {"intValue": "10"})
+
+    def test_summary_line(self):
+        """Test that the logged summary breaks the request down by span name"""
+        with patch.object(tracing, 'export'):
+            with start_trace("POST /ask", chat_id="c1") as root:
+                for _ in range(2):
+                    with span("http.get"):
+                        pass
+
+        summary = tracing.summarize(root.trace)
+        self.assertIn("chat_id=c1", summary)
+        self.assertIn("http.get=", summary)
+        self.assertIn("x2", summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
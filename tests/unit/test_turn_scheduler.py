@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.util.turn_scheduler import COALESCED, TurnScheduler
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class TestTurnScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+
+    def _blocking_run(self, release, calls):
+        def run(message):
+            calls.append(message)
+            if len(calls) == 1:
+                release.wait(5)
+            return [f"answer to {message}"]
+        return run
+
+    def test_same_chat_turns_are_coalesced(self):
+        """Test that messages arriving while a turn runs are answered once, to the last of them"""
+        scheduler = TurnScheduler(self.executor, coalesce=True)
+        release, calls = threading.Event(), []
+        run = self._blocking_run(release, calls)
+
+        async def scenario():
+            first = asyncio.create_task(scheduler.submit("chat", "a", run))
+            while not calls:
+                await asyncio.sleep(0.01)
+            later = [asyncio.create_task(scheduler.submit("chat", message, run)) for message in ("b", "c")]
+            await asyncio.sleep(0.05)
+            release.set()
+            return await first, await asyncio.gather(*later)
+
+        first, later = asyncio.run(scenario())
+
+        self.assertEqual(calls, ["a", "b\nc"])
+        self.assertEqual(first, ["answer to a"])
+        self.assertEqual(later, [COALESCED, ["answer to b\nc"]])
+        self.assertEqual(scheduler.waiting, 0)
+
+    def test_same_chat_turns_are_queued(self):
+        """Test that without coalescing turns of one chat run one at a time in arrival order"""
+        scheduler = TurnScheduler(self.executor, coalesce=False)
+        running, overlaps, order = [], [], []
+        lock = threading.Lock()
+
+        def run(message):
+            with lock:
+                running.append(message)
+                overlaps.append(len(running))
+            threading.Event().wait(0.02)
+            with lock:
+                running.remove(message)
+            order.append(message)
+            return message
+
+        async def scenario():
+            return await asyncio.gather(*(scheduler.submit("chat", m, run) for m in ("a", "b", "c")))
+
+        self.assertEqual(asyncio.run(scenario()), ["a", "b", "c"])
+        self.assertEqual(order, ["a", "b", "c"])
+        self.assertEqual(max(overlaps), 1)
+
+    def test_different_chats_run_in_parallel(self):
+        """Test that turns of different chats do not wait for each other"""
+        scheduler = TurnScheduler(self.executor)
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(message):
+            barrier.wait()
+            return message
+
+        async def scenario():
+            return await asyncio.gather(scheduler.submit("chat-1", "a", run), scheduler.submit("chat-2", "b", run))
+
+        self.assertEqual(asyncio.run(scenario()), ["a", "b"])
+
+    def test_errors_and_context_reach_the_caller(self):
+        """Test that the turn runs in the caller's context and its error is raised to the caller"""
+        scheduler = TurnScheduler(self.executor)
+
+        def run(message):
+            raise RuntimeError(f"{request_id.get()} failed")
+
+        async def scenario():
+            request_id.set("r1")
+            return await scheduler.submit("chat", "a", run)
+
+        with self.assertRaisesRegex(RuntimeError, "r1 failed"):
+            asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from src.util import upstream, upstream_fixtures
+from src.util.upstream import CircuitBreaker, CircuitOpenError
+from src.util.upstream_fixtures import FixtureStore
+
+URL = "https://center.cruises/api/chatbot/cruises/prices?cruiseDateRangeId=1"
+
+
+def _response(status_code=200, body=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = body
+    return response
+
+
+class TestUpstreamResilience(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            patch.dict(upstream._endpoints, clear=True),
+            patch.object(upstream, '_backoff', return_value=0),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    @patch('src.util.upstream.requests.get')
+    def test_connection_error_is_retried(self, mock_get):
+        """Test that a transient connection error is retried with a default timeout"""
+        mock_get.side_effect = [requests.ConnectionError("reset"), _response(body="ok")]
+
+        response = upstream.get(URL)
+
+        self.assertEqual(response.json(), "ok")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args.kwargs["timeout"],
+                         (upstream.UPSTREAM_CONNECT_TIMEOUT, upstream.UPSTREAM_READ_TIMEOUT))
+
+    @patch('src.util.upstream.requests.get')
+    def test_server_errors_retried_client_errors_not(self, mock_get):
+        """Test that 5xx responses are retried up to the limit and 4xx are returned at once"""
+        mock_get.return_value = _response(503)
+        self.assertEqual(upstream.get(URL).status_code, 503)
+        self.assertEqual(mock_get.call_count, upstream.UPSTREAM_RETRIES + 1)
+
+        mock_get.reset_mock()
+        mock_get.return_value = _response(404)
+        self.assertEqual(upstream.get(URL).status_code, 404)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('src.util.upstream.requests.get')
+    def test_circuit_opens_and_recovers(self, mock_get):
+        """Test that an endpoint failing repeatedly is short-circuited until a probe succeeds"""
+        mock_get.side_effect = requests.Timeout("slow")
+        with patch.object(upstream, 'UPSTREAM_RETRIES', 0):
+            for _ in range(upstream.UPSTREAM_BREAKER_FAILURES):
+                with self.assertRaises(requests.Timeout):
+                    upstream.get(URL)
+            with self.assertRaises(CircuitOpenError):
+                upstream.get(URL)
+        self.assertEqual(mock_get.call_count, upstream.UPSTREAM_BREAKER_FAILURES)
+
+        breaker = upstream.get_endpoint(URL).breaker
+        breaker.opened_at -= breaker.reset_timeout
+        mock_get.side_effect = None
+        mock_get.return_value = _response()
+
+        self.assertEqual(upstream.get(URL).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_one_probe(self):
+        """Test that only one request probes a half-open circuit and a failed probe reopens it"""
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    @patch('src.util.upstream.requests.get')
+    def test_slow_request_is_hedged(self, mock_get):
+        """Test that a request slower than the endpoint's p95 is duplicated and the first answer wins"""
+        endpoint = upstream.get_endpoint(URL)
+        endpoint.latencies.extend([0.01] * upstream.UPSTREAM_HEDGE_MIN_SAMPLES)
+        release = threading.Event()
+        calls = []
+
+        def get(url, **kwargs):
+            calls.append(threading.current_thread().name)
+            if len(calls) == 1:
+                release.wait(5)
+                return _response(body="slow")
+            return _response(body="fast")
+
+        mock_get.side_effect = get
+        try:
+            response = upstream.get(URL)
+        finally:
+            release.set()
+
+        self.assertEqual(response.json(), "fast")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0], "upstream-request")
+        self.assertTrue(calls[1].startswith("upstream-hedge"))
+
+    @patch('src.util.upstream.requests.get')
+    def test_no_hedge_while_the_hedge_pool_is_busy(self, mock_get):
+        """Test that a slow request waits for its own answer when no hedge worker is free"""
+        upstream.get_endpoint(URL).latencies.extend([0.01] * upstream.UPSTREAM_HEDGE_MIN_SAMPLES)
+
+        def get(url, **kwargs):
+            time.sleep(0.1)
+            return _response(body="slow")
+
+        mock_get.side_effect = get
+        with patch.object(upstream, '_hedge_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = upstream.get(URL)
+
+        self.assertEqual(response.json(), "slow")
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('src.util.upstream.requests.get')
+    def test_background_downloads_are_not_hedged(self, mock_get):
+        """Test that hedge=False neither duplicates requests nor feeds the latency window"""
+        mock_get.return_value = _response()
+
+        upstream.get(URL, hedge=False)
+
+        self.assertEqual(len(upstream.get_endpoint(URL).latencies), 0)
+
+    @patch('src.util.upstream.requests.get')
+    def test_deadline_bounds_timeouts_and_retries(self, mock_get):
+        """Test that timeouts are cut to the deadline and no attempt starts after it passed"""
+        def slow_failure(url, **kwargs):
+            time.sleep(0.15)
+            raise requests.ConnectionError("reset")
+        mock_get.side_effect = slow_failure
+
+        with upstream.deadline(0.1):
+            with self.assertRaises(requests.Timeout):
+                upstream.get(URL)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(all(t <= 0.1 for t in mock_get.call_args.kwargs["timeout"]))
+
+
+def _real_response(status_code=200, content=b'{"data": []}'):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+class TestUpstreamFixtures(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = FixtureStore(os.path.join(tmp.name, "fixtures.jsonl.gz"))
+        patches = [
+            patch.dict(upstream._endpoints, clear=True),
+            patch.object(upstream_fixtures, '_store', self.store),
+            patch.object(upstream_fixtures, 'UPSTREAM_REPLAY_LATENCY', 0),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    @patch('src.util.upstream.requests.get')
+    def test_record_then_replay(self, mock_get):
+        """Test that recorded responses are replayed in order without touching the network"""
+        mock_get.side_effect = [_real_response(content=b'{"data": [1]}'), _real_response(content=b'{"data": [2]}'),
+                                _real_response(content="Привет".encode())]
+        with patch.object(upstream_fixtures, 'UPSTREAM_MODE', upstream_fixtures.RECORD):
+            upstream.get(URL)
+            upstream.get(URL)
+            upstream.get(URL + "&lang=ru", hedge=False)
+
+        mock_get.reset_mock()
+        replayed = FixtureStore(self.store.path)
+        with patch.object(upstream_fixtures, 'UPSTREAM_MODE', upstream_fixtures.REPLAY), \
+                patch.object(upstream_fixtures, '_store', replayed):
+            bodies = [upstream.get(URL).json() for _ in range(3)]
+            text = upstream.get(URL + "&lang=ru").text
+            missing = upstream.get(URL + "&other=1")
+
+        mock_get.assert_not_called()
+        self.assertEqual(bodies, [{"data": [1]}, {"data": [2]}, {"data": [1]}])
+        self.assertEqual(text, "Привет")
+        self.assertEqual(missing.status_code, 404)
+        self.assertRegex(replayed.summary(), r"center.cruises/api/chatbot/cruises/prices +3 +2 ")
+
+    def test_replay_shifts_dates_to_the_recording_day(self):
+        """Test that a search for "today" finds the recording made for the recording day"""
+        recorded_on = date.today() - timedelta(days=3)
+        url = "https://center.cruises/api/chatbot/cruises/batch-data?time.fromDate={}"
+        with patch('src.util.upstream_fixtures.time.time', return_value=time.time() - 3 * 86400):
+            self.store.record(url.format(recorded_on.isoformat()), _real_response(content=b'{"data": [7]}'), 0.01)
+        with open(self.store.path, "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+
+        replayed = FixtureStore(self.store.path)
+
+        self.assertEqual(replayed.replay(url.format(date.today().isoformat())).json(), {"data": [7]})
+
+
+if __name__ == '__main__':
+    unittest.main()